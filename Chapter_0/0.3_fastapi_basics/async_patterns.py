@@ -4,7 +4,7 @@ Common Async Patterns in FastAPI
 
 Demonstrates:
 - Async/await patterns
-- Background tasks
+- Background tasks (on a bounded job queue, see job_queue.py)
 - Streaming responses
 - Dependency injection
 
@@ -13,11 +13,52 @@ Run with:
 """
 
 import asyncio
-from fastapi import FastAPI, BackgroundTasks, Depends
+import json
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Header, HTTPException
 from pydantic import BaseModel
-import time
+from typing import Literal, Optional
 
-app = FastAPI(title="Async Patterns Demo")
+from fast_json import default_response_class
+from coalescing import CoalescingMiddleware, coalesce
+from deadlines import DeadlineMiddleware, bounded, remaining, request_timeout
+from fanout import fan_out
+from job_queue import JobQueue, QueueFull
+from providers import Registry
+from streaming import Event, stream_records
+
+# Background jobs get their own bounded queue and workers instead of
+# Starlette's shared threadpool (see job_queue.py)
+jobs = JobQueue(maxsize=100, workers=4)
+
+# Application-scoped dependencies (see providers.py)
+registry = Registry()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start workers and providers; on shutdown, finish queued jobs first"""
+    await jobs.start()
+    await registry.start()
+    yield
+    await registry.stop()
+    await jobs.drain(timeout=30)
+
+
+app = FastAPI(
+    title="Async Patterns Demo",
+    lifespan=lifespan,
+    default_response_class=default_response_class()  # FAST_JSON=1 to opt in
+)
+
+# Identical concurrent requests to @coalesce routes share one handler run
+# (see coalescing.py). Added first so it runs inside the deadline middleware.
+app.add_middleware(CoalescingMiddleware)
+
+# Every request gets a deadline: X-Request-Timeout header, a route's
+# @request_timeout, or this default - whichever is shortest (see deadlines.py)
+app.add_middleware(DeadlineMiddleware, default_timeout=30.0)
 
 
 # ============================================================================
@@ -41,36 +82,70 @@ async def simulate_work(seconds: int = 2):
 # 2. BACKGROUND TASKS
 # ============================================================================
 
-def log_task(task_id: int, action: str):
-    """Background task - runs after response is sent"""
-    time.sleep(2)  # Simulate work
+async def log_task(task_id: int, action: str):
+    """Background task - runs on a job queue worker"""
+    await asyncio.sleep(2)  # Simulate work without holding a thread
     print(f"[Background] Task {task_id}: {action} completed")
 
 
+def get_jobs() -> JobQueue:
+    """Dependency that provides the background job queue"""
+    return jobs
+
+
+def submit_job(jobs: JobQueue, func, *args, **kwargs):
+    """Queue a background job, answering 503 when the queue is full"""
+    try:
+        jobs.submit(func, *args, **kwargs)
+    except QueueFull as exc:
+        raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "1"})
+
+
 @app.post("/task")
-async def create_task(background_tasks: BackgroundTasks):
+async def create_task(jobs: JobQueue = Depends(get_jobs)):
     """
     Endpoint that returns immediately while background task runs.
-    The task runs AFTER the response is sent to the client.
+    The task is queued and a worker picks it up; if the queue is
+    full the client gets 503 and should retry later.
     """
-    background_tasks.add_task(log_task, task_id=1, action="processing")
+    submit_job(jobs, log_task, task_id=1, action="processing")
     return {"message": "Task queued", "status": "submitted"}
 
 
+@app.get("/metrics/jobs")
+async def job_metrics(jobs: JobQueue = Depends(get_jobs)):
+    """Queue depth, counters and latency of background jobs"""
+    return jobs.metrics()
+
+
 # ============================================================================
 # 3. DEPENDENCY INJECTION
 # ============================================================================
 
 class Config:
     """Configuration dependency"""
-    def __init__(self):
-        self.api_key = "secret-key-123"
-        self.timeout = 30
-
-
-def get_config():
-    """Dependency that provides config"""
-    return Config()
+    def __init__(self, api_key: str = "secret-key-123", timeout: int = 30):
+        self.api_key = api_key
+        self.timeout = timeout
+    
+    @classmethod
+    def load(cls) -> "Config":
+        """Read config from CONFIG_FILE (JSON), then env vars on top"""
+        values = {}
+        path = os.environ.get("CONFIG_FILE")
+        if path and os.path.exists(path):
+            with open(path) as f:
+                values.update(json.load(f))
+        if "AGENT_API_KEY" in os.environ:
+            values["api_key"] = os.environ["AGENT_API_KEY"]
+        if "AGENT_TIMEOUT" in os.environ:
+            values["timeout"] = int(os.environ["AGENT_TIMEOUT"])
+        return cls(**values)
+
+
+# Loaded once at startup, not per request. Reloaded when CONFIG_FILE
+# changes or on SIGHUP (kill -HUP <pid>).
+get_config = registry.singleton(Config.load, watch=os.environ.get("CONFIG_FILE"))
 
 
 @app.get("/config")
@@ -86,22 +161,28 @@ async def get_api_config(config: Config = Depends(get_config)):
 # 4. STREAMING RESPONSES
 # ============================================================================
 
+class StreamItem(BaseModel):
+    index: int
+    message: str
+
+
 async def generate_items():
     """Async generator for streaming"""
     for i in range(5):
         await asyncio.sleep(0.5)  # Simulate work
-        yield f'{{"index": {i}, "message": "chunk {i}"}}\n'
+        yield StreamItem(index=i, message=f"chunk {i}")
 
 
 @app.get("/stream")
-async def stream_endpoint():
-    """Stream responses line by line"""
-    from fastapi.responses import StreamingResponse
+async def stream_endpoint(format: Literal["ndjson", "sse"] = "ndjson"):
+    """
+    Stream records as NDJSON (one JSON object per line) or SSE
     
-    return StreamingResponse(
-        generate_items(),
-        media_type="application/json"
-    )
+    Records are batched into larger writes, the generator is cancelled
+    if the client disconnects, and heartbeats keep idle streams open.
+    See streaming.py.
+    """
+    return stream_records(generate_items(), format=format)
 
 
 # ============================================================================
@@ -110,23 +191,50 @@ async def stream_endpoint():
 
 async def fetch_data(endpoint: str, delay: int):
     """Simulate fetching data from external service"""
-    await asyncio.sleep(delay)
+    # A real HTTP client would get timeout=remaining() instead
+    await bounded(asyncio.sleep(delay))
     return {"endpoint": endpoint, "data": f"data from {endpoint}"}
 
 
 @app.get("/concurrent")
-async def concurrent_fetch():
+async def concurrent_fetch(
+    timeout: float = 5.0,
+    deadline: float = 5.0,
+    quorum: Optional[int] = None
+):
     """
     Fetch from multiple endpoints concurrently.
     Without concurrency: 3 + 2 + 1 = 6 seconds
     With concurrency: max(3, 2, 1) = 3 seconds
+    
+    With fan_out (see fanout.py) the response time is also capped:
+    try ?timeout=2.5 (service1 times out) or ?quorum=2 (answer as soon
+    as two services have replied). Failed calls show up in "errors"
+    instead of failing the whole request.
     """
-    results = await asyncio.gather(
-        fetch_data("service1", 3),
-        fetch_data("service2", 2),
-        fetch_data("service3", 1),
+    services = [("service1", 3), ("service2", 2), ("service3", 1)]
+    
+    # Never wait past the request's own deadline; keep a little time
+    # back to return partial results instead of a 504
+    budget = remaining(reserve=0.1)
+    if budget is not None:
+        deadline = min(deadline, budget)
+    
+    outcomes = await fan_out(
+        [lambda name=name, delay=delay: fetch_data(name, delay) for name, delay in services],
+        limit=10,
+        timeout=timeout,
+        deadline=deadline,
+        quorum=quorum
     )
-    return {"results": results}
+    
+    results, errors = [], []
+    for (name, _), outcome in zip(services, outcomes):
+        if isinstance(outcome, BaseException):
+            errors.append({"endpoint": name, "error": type(outcome).__name__})
+        else:
+            results.append(outcome)
+    return {"results": results, "errors": errors}
 
 
 # ============================================================================
@@ -138,30 +246,98 @@ class AgentTask(BaseModel):
     model: str = "llama2"
 
 
-async def run_agent(prompt: str, model: str, background_tasks: BackgroundTasks):
+class AgentEvent(BaseModel):
+    """One streamed step of an agent run"""
+    type: Literal["tool_call", "tool_result", "token", "done"]
+    text: str = ""
+
+
+async def generate_tokens(prompt: str, model: str):
+    """Simulated LLM that produces its answer one token at a time"""
+    for token in f"Agent ({model}) response to: {prompt}".split(" "):
+        await asyncio.sleep(0.05)  # Simulate per-token generation time
+        yield token + " "
+
+
+async def agent_events(prompt: str, model: str):
+    """
+    Run the agent as a stream of events: a tool call, its result, then
+    the answer token by token.
+    
+    If the client disconnects, streaming.py cancels this generator and
+    the `finally` stops the upstream generation with it.
+    """
+    tokens = generate_tokens(prompt, model)
+    try:
+        yield AgentEvent(type="tool_call", text=f"search: {prompt}")
+        await bounded(asyncio.sleep(0.2))  # Simulate the tool
+        yield AgentEvent(type="tool_result", text=f"3 results for {prompt!r}")
+        
+        answer = []
+        async for token in tokens:
+            answer.append(token)
+            yield AgentEvent(type="token", text=token)
+        yield AgentEvent(type="done", text="".join(answer).strip())
+    finally:
+        await tokens.aclose()
+
+
+async def named_events(events):
+    """Give each SSE message the event's type as its name"""
+    try:
+        async for event in events:
+            yield Event(event.type, event)
+    finally:
+        await events.aclose()
+
+
+async def run_agent(prompt: str, model: str, jobs: JobQueue):
     """
     Simulate running an AI agent:
     1. Start immediately
     2. Return result
     3. Log in background
     """
-    # Simulate agent execution
-    await asyncio.sleep(1)
-    result = f"Agent ({model}) response to: {prompt}"
+    # Simulate agent execution (stops if the request deadline passes)
+    result = None
+    async for event in agent_events(prompt, model):
+        if event.type == "done":
+            result = event.text
     
     # Log in background
-    background_tasks.add_task(log_task, task_id=1, action="agent run")
+    submit_job(jobs, log_task, task_id=1, action="agent run")
     
     return {"result": result}
 
 
 @app.post("/agent")
-async def run_agent_endpoint(task: AgentTask, background_tasks: BackgroundTasks):
+@coalesce()
+async def run_agent_endpoint(
+    task: AgentTask,
+    stream: bool = True,
+    accept: Optional[str] = Header(None),
+    jobs: JobQueue = Depends(get_jobs)
+):
     """
     Agent endpoint with streaming capability
+    
+    Streams tool events and tokens as they are produced, so the first
+    token arrives after ~0.25s instead of after the whole answer.
+    Send `Accept: text/event-stream` for SSE (NDJSON otherwise), or
+    `?stream=false` for a single JSON response.
     """
-    result = await run_agent(task.prompt, task.model, background_tasks)
-    return result
+    if not stream:
+        return await run_agent(task.prompt, task.model, jobs)
+    
+    # Queue the log job before streaming starts: once the response has
+    # begun there is no way to answer 503
+    submit_job(jobs, log_task, task_id=1, action="agent run")
+    format = "sse" if accept and "text/event-stream" in accept else "ndjson"
+    events = agent_events(task.prompt, task.model)
+    if format == "sse":
+        events = named_events(events)
+    # Flush each token right away instead of batching for 50ms
+    return stream_records(events, format=format, max_delay=0.0)
 
 
 # ============================================================================
@@ -175,16 +351,16 @@ async def long_running_operation():
 
 
 @app.get("/with-timeout")
+@request_timeout(2.0)  # 2 second timeout
 async def endpoint_with_timeout():
-    """Endpoint with timeout protection"""
-    try:
-        result = await asyncio.wait_for(
-            long_running_operation(),
-            timeout=2.0  # 2 second timeout
-        )
-        return {"result": result}
-    except asyncio.TimeoutError:
-        return {"error": "Operation timed out", "status": 408}
+    """
+    Endpoint with timeout protection
+    
+    DeadlineMiddleware cancels the operation after 2 seconds (or sooner,
+    if the client sends X-Request-Timeout) and answers 504.
+    """
+    result = await long_running_operation()
+    return {"result": result}
 
 
 if __name__ == "__main__":
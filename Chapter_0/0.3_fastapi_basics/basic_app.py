@@ -13,27 +13,44 @@ Then visit: http://localhost:8000/docs
 from fastapi import FastAPI
 from fastapi.responses import JSONResponse
 
+from coalescing import CoalescingMiddleware, coalesce
+from fast_json import default_response_class
+from response_cache import ResponseCacheMiddleware, cache_response
+
 # Create FastAPI app
 app = FastAPI(
     title="Basic Agent API",
     description="A minimal FastAPI application",
-    version="0.1.0"
+    version="0.1.0",
+    default_response_class=default_response_class()  # FAST_JSON=1 to opt in
 )
 
+# Identical concurrent requests to @coalesce routes share one handler run
+# (see coalescing.py)
+app.add_middleware(CoalescingMiddleware)
+
+# GET responses of @cache_response routes are reused and get ETags, so
+# pollers get 304s (see response_cache.py). Added last: it runs first.
+app.add_middleware(ResponseCacheMiddleware)
+
 
 @app.get("/")
+@cache_response(ttl=300, max_age=60)
 async def read_root():
     """Root endpoint"""
     return {"message": "Welcome to AgenticAI!"}
 
 
 @app.get("/health")
+@cache_response(ttl=1)  # short: a cached health check must not hide an outage
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
 
 @app.get("/items/{item_id}")
+@cache_response(ttl=30)
+@coalesce()
 async def get_item(item_id: int, query: str = None):
     """
     Get an item by ID
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Single-Item vs Batch Task Creation
+
+Creates the same number of tasks with one POST /tasks per task and
+with POST /tasks:batch, then reports tasks/sec and the speedup.
+
+Run with:
+    uv run python bench_batch.py
+    uv run python bench_batch.py --tasks 20000 --batch-size 1000
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+import with_pydantic_models
+from task_store import InMemoryTaskStore
+
+
+async def create_single(client: httpx.AsyncClient, tasks: list[dict]):
+    for task in tasks:
+        response = await client.post("/tasks", json=task)
+        response.raise_for_status()
+
+
+async def create_batched(client: httpx.AsyncClient, tasks: list[dict], batch_size: int):
+    for start in range(0, len(tasks), batch_size):
+        response = await client.post("/tasks:batch", json=tasks[start:start + batch_size])
+        response.raise_for_status()
+
+
+async def timed(create, *args) -> float:
+    """Run one ingest strategy against a fresh store and return tasks/sec"""
+    app = with_pydantic_models.app
+    store = InMemoryTaskStore(with_pydantic_models.Task)
+    app.dependency_overrides[with_pydantic_models.get_store] = lambda: store
+    transport = httpx.ASGITransport(app=app)
+
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            start = time.perf_counter()
+            await create(client, *args)
+            elapsed = time.perf_counter() - start
+    finally:
+        app.dependency_overrides.clear()
+
+    return len(args[0]) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    tasks = [{"title": f"task {i}", "description": "ingested"} for i in range(args.tasks)]
+
+    single = asyncio.run(timed(create_single, tasks))
+    batched = asyncio.run(timed(create_batched, tasks, args.batch_size))
+
+    print(f"{'mode':<22} {'tasks/s':>10}")
+    print(f"{'POST /tasks':<22} {single:>10.0f}")
+    print(f"{'POST /tasks:batch':<22} {batched:>10.0f}")
+    print(f"\nspeedup: {batched / single:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark: JSON Serialization Share of GET /tasks
+
+Loads 1k tasks, times a full GET /tasks?limit=1000 request, and times
+each way of turning that page into response bytes on its own:
+
+- jsonable_encoder + JSONResponse  (FastAPI's classic path)
+- response_model dump + JSONResponse (validate, dump to dict, json.dumps)
+- FastJSONResponse                  (one native pass, used by /tasks with FAST_JSON=1)
+
+Run with:
+    uv run python bench_serialization.py
+    uv run python bench_serialization.py --tasks 1000 --rounds 200
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import List
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+import with_pydantic_models
+from fast_json import FastJSONResponse, orjson
+from task_store import InMemoryTaskStore
+from with_pydantic_models import Task
+
+
+def per_call(func, rounds: int) -> float:
+    """Average seconds per call"""
+    func()  # warm up
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds
+
+
+async def request_time(store, count: int, rounds: int) -> float:
+    """Average seconds for a full in-process GET /tasks round trip"""
+    app = with_pydantic_models.app
+    app.dependency_overrides[with_pydantic_models.get_store] = lambda: store
+    transport = httpx.ASGITransport(app=app)
+
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.get(f"/tasks?limit={count}")  # warm up
+            start = time.perf_counter()
+            for _ in range(rounds):
+                response = await client.get(f"/tasks?limit={count}")
+                assert len(response.json()) == count
+            return (time.perf_counter() - start) / rounds
+    finally:
+        app.dependency_overrides.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=100)
+    args = parser.parse_args()
+
+    store = InMemoryTaskStore(Task)
+    store.create_tasks([(f"task {i}", "serialization benchmark") for i in range(args.tasks)])
+    page = store.list_tasks(limit=args.tasks)
+    response_model = TypeAdapter(List[Task])
+
+    encoders = {
+        "jsonable_encoder + JSONResponse": lambda: JSONResponse(jsonable_encoder(page)),
+        "response_model + JSONResponse": lambda: JSONResponse(
+            response_model.dump_python(response_model.validate_python(page), mode="json")
+        ),
+        "FastJSONResponse": lambda: FastJSONResponse(page),
+    }
+
+    os.environ["FAST_JSON"] = "1"  # the request should encode like FastJSONResponse
+    request = asyncio.run(request_time(store, args.tasks, args.rounds))
+
+    timings = {name: per_call(encode, args.rounds) for name, encode in encoders.items()}
+    # Everything in the request except serialization (which /tasks does
+    # with FastJSONResponse); each serializer's share is then estimated
+    # as if it were swapped in.
+    other_work = request - timings["FastJSONResponse"]
+
+    print(f"GET /tasks with {args.tasks} tasks: {request * 1000:.2f} ms/request")
+    print(f"(orjson {'installed' if orjson else 'not installed'})\n")
+    print(f"{'serializer':<34} {'ms':>8} {'share of request':>18}")
+    for name, seconds in timings.items():
+        share = seconds / (other_work + seconds)
+        print(f"{name:<34} {seconds * 1000:>8.2f} {share:>18.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark: In-Memory vs SQLite Task Store
+
+Drives the Agent Task API in-process (no network) and reports
+requests/sec for each storage backend, then checks that several
+processes writing to one SQLite file do not lose writes.
+
+Run with:
+    uv run python bench_task_store.py
+    uv run python bench_task_store.py --requests 5000 --processes 8
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+import httpx
+
+import with_pydantic_models
+from task_store import InMemoryTaskStore, SQLiteTaskStore
+
+
+# ============================================================================
+# 1. HTTP THROUGHPUT PER BACKEND
+# ============================================================================
+
+async def drive(store, requests: int) -> float:
+    """Send a create/get/update mix through the app and return requests/sec"""
+    app = with_pydantic_models.app
+    app.dependency_overrides[with_pydantic_models.get_store] = lambda: store
+    transport = httpx.ASGITransport(app=app)
+
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            start = time.perf_counter()
+            for i in range(requests // 3):
+                created = await client.post("/tasks", json={"title": f"task {i}"})
+                task_id = created.json()["id"]
+                await client.get(f"/tasks/{task_id}")
+                await client.put(f"/tasks/{task_id}", json={"completed": True})
+            elapsed = time.perf_counter() - start
+    finally:
+        app.dependency_overrides.clear()
+
+    return (requests // 3) * 3 / elapsed
+
+
+# ============================================================================
+# 2. MULTI-PROCESS WRITE SAFETY
+# ============================================================================
+
+def write_tasks(path: str, count: int):
+    """Worker process: create tasks through its own store instance"""
+    store = SQLiteTaskStore(with_pydantic_models.Task, path)
+    for i in range(count):
+        store.create_task(f"pid {os.getpid()} task {i}", None)
+    store.close()
+
+
+def check_concurrent_writers(path: str, processes: int, per_process: int) -> int:
+    """Run several writer processes against one file and count the rows"""
+    workers = [
+        multiprocessing.Process(target=write_tasks, args=(path, per_process))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    store = SQLiteTaskStore(with_pydantic_models.Task, path)
+    total = len(store.list_tasks())
+    store.close()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--per-process", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = InMemoryTaskStore(with_pydantic_models.Task)
+        sqlite = SQLiteTaskStore(with_pydantic_models.Task, os.path.join(tmp, "http.db"))
+
+        print(f"{'backend':<10} {'req/s':>10}")
+        for name, store in [("memory", memory), ("sqlite", sqlite)]:
+            rps = asyncio.run(drive(store, args.requests))
+            print(f"{name:<10} {rps:>10.0f}")
+        sqlite.close()
+
+        expected = args.processes * args.per_process
+        total = check_concurrent_writers(
+            os.path.join(tmp, "shared.db"), args.processes, args.per_process
+        )
+        status = "OK" if total == expected else "LOST WRITES"
+        print(f"\n{args.processes} writer processes: {total}/{expected} rows ({status})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: Task Update Paths
+
+Compares the original update path (Pydantic v1-style .dict() plus
+.copy(update=...), which allocates a whole new Task per PUT) with the
+in-place update the in-memory store does now.
+
+Run with:
+    uv run python bench_update.py
+    uv run python bench_update.py --ops 500000
+"""
+
+import argparse
+import time
+import warnings
+from datetime import datetime
+
+from with_pydantic_models import Task, TaskUpdate
+from task_store import InMemoryTaskStore
+
+
+def copy_updates(ops: int) -> float:
+    """The old path: dump the update, copy the whole task, replace it"""
+    tasks_db = {1: Task(id=1, title="task", description="benchmark", created_at=datetime.now())}
+    task_update = TaskUpdate(completed=True)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        start = time.perf_counter()
+        for _ in range(ops):
+            update_data = task_update.dict(exclude_unset=True)
+            tasks_db[1] = tasks_db[1].copy(update={**update_data})
+        return ops / (time.perf_counter() - start)
+
+
+def in_place_updates(ops: int) -> float:
+    """The new path: write only the changed fields and bump the version"""
+    store = InMemoryTaskStore(Task)
+    task = store.create_task("task", "benchmark")
+    task_update = TaskUpdate(completed=True)
+
+    start = time.perf_counter()
+    for _ in range(ops):
+        store.update_task(task.id, task_update.model_dump(exclude_unset=True), task.version)
+    return ops / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ops", type=int, default=200_000)
+    args = parser.parse_args()
+
+    before = copy_updates(args.ops)
+    after = in_place_updates(args.ops)
+
+    print(f"{'path':<28} {'updates/s':>12}")
+    print(f"{'.dict() + .copy(update=)':<28} {before:>12.0f}")
+    print(f"{'in-place + version check':<28} {after:>12.0f}")
+    print(f"\nspeedup: {after / before:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Request Coalescing for Identical Concurrent Requests
+
+When a hot key gets a burst of traffic, every request runs the same
+handler and computes the same answer. CoalescingMiddleware runs the
+handler once per burst: requests with the same method, path, query,
+body (and Accept, Authorization and If-None-Match headers) that arrive
+while one is already running subscribe to it and get a copy of its
+response.
+
+- Only routes marked with @coalesce are affected
+- The response is broadcast live, so followers of a streaming response
+  get each chunk as the handler sends it
+- The handler runs in its own task: one client disconnecting (or
+  hitting its deadline) doesn't cut off the others. Each subscriber
+  watches its own connection, and the run is cancelled as soon as the
+  last one has gone, so a streaming handler stops like it would
+  without coalescing
+- The shared run starts from an empty context, so context variables of
+  whichever request came first (e.g. its deadline, see deadlines.py)
+  don't apply to everyone; each subscriber's own deadline still ends
+  its own response
+- A request that arrives after the handler finished starts a new run;
+  nothing is cached (see the response cache for that)
+
+Usage:
+    app.add_middleware(CoalescingMiddleware)
+
+    @app.get("/items/{item_id}")
+    @coalesce()
+    async def get_item(item_id: int): ...
+"""
+
+import asyncio
+import contextvars
+import hashlib
+from typing import Any, Optional
+
+from route_options import lookup, route_option
+
+
+def coalesce():
+    """Decorator: merge identical concurrent requests to this route"""
+    return route_option("coalesce", True)
+
+
+class _Flight:
+    """One shared handler run and the messages it has sent so far"""
+
+    def __init__(self):
+        self.messages: list[dict] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+
+    async def publish(self, message: dict):
+        async with self.changed:
+            self.messages.append(message)
+            self.changed.notify_all()
+
+    async def finish(self, error: Optional[BaseException] = None):
+        async with self.changed:
+            self.done = True
+            self.error = error
+            self.changed.notify_all()
+
+
+class CoalescingMiddleware:
+    """ASGI middleware that shares one handler run between identical requests"""
+
+    def __init__(
+        self,
+        app,
+        # If-None-Match too: a handler may answer it with an empty 304,
+        # which is no use to a client that didn't send it
+        vary: tuple[str, ...] = ("accept", "authorization", "if-none-match")
+    ):
+        self.app = app
+        self.vary = {name.encode() for name in vary}
+        self.flights: dict[str, _Flight] = {}
+        self.stats = {"executions": 0, "coalesced": 0}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not lookup(scope, "coalesce", False):
+            return await self.app(scope, receive, send)
+
+        body = await self._read_body(receive)
+        key = self.key(scope, body)
+
+        # No await from here until the subscriber is counted, so a flight
+        # can't be cancelled between being found and being joined
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = self.flights[key] = _Flight()
+            flight.task = asyncio.create_task(
+                self._run(key, flight, scope, body), context=contextvars.Context()
+            )
+            self.stats["executions"] += 1
+        else:
+            self.stats["coalesced"] += 1
+        flight.subscribers += 1
+        await self._subscribe(key, flight, send, receive)
+
+    def key(self, scope: dict, body: bytes) -> str:
+        digest = hashlib.sha256()
+        for part in (scope["method"], scope["path"], scope.get("query_string", b"")):
+            digest.update(part if isinstance(part, bytes) else part.encode())
+            digest.update(b"\0")
+        for name, value in sorted(scope.get("headers", [])):
+            if name in self.vary:
+                digest.update(name + b":" + value + b"\0")
+        digest.update(body)
+        return digest.hexdigest()
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    async def _run(self, key: str, flight: _Flight, scope: dict, body: bytes):
+        """Run the handler once, publishing every message it sends"""
+        body_sent = False
+
+        async def receive() -> dict[str, Any]:
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # The shared run has no single client to disconnect; it is
+            # cancelled when its last subscriber leaves
+            await asyncio.Future()
+
+        try:
+            await self.app(scope, receive, flight.publish)
+        except BaseException as exc:
+            await flight.finish(exc)
+            if not isinstance(exc, Exception):
+                raise
+        else:
+            await flight.finish()
+        finally:
+            # Later requests start a fresh run instead of joining this one
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+
+    async def _subscribe(self, key: str, flight: _Flight, send, receive):
+        """Relay the shared run to one client until it finishes or the client goes"""
+        relay = asyncio.create_task(self._relay(flight, send))
+        disconnect = asyncio.create_task(self._wait_for_disconnect(receive))
+        try:
+            await asyncio.wait({relay, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            relay.cancel()
+            disconnect.cancel()
+            self._leave(key, flight)
+            await asyncio.gather(relay, disconnect, return_exceptions=True)
+        if relay.done() and not relay.cancelled():
+            relay.result()  # re-raise a handler error nobody has seen yet
+
+    def _leave(self, key: str, flight: _Flight):
+        flight.subscribers -= 1
+        if flight.subscribers == 0 and not flight.done:
+            # Forget the flight now, not when the task gets round to
+            # finishing: a request arriving meanwhile starts a new run
+            # instead of joining one that is being cancelled
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+            flight.task.cancel()
+
+    @staticmethod
+    async def _relay(flight: _Flight, send):
+        """Replay the shared run's messages to one client as they arrive"""
+        sent = 0
+        while True:
+            async with flight.changed:
+                await flight.changed.wait_for(
+                    lambda: len(flight.messages) > sent or flight.done
+                )
+                pending = flight.messages[sent:]
+                done = flight.done
+            for message in pending:
+                await send(message)
+            sent += len(pending)
+            if done and sent == len(flight.messages):
+                break
+        if flight.error is not None and sent == 0:
+            raise flight.error  # nothing sent yet: fail like the handler did
+
+    @staticmethod
+    async def _wait_for_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
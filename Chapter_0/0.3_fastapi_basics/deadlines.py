@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Request-Scoped Deadlines
+
+Every request gets a deadline. It comes from the client's
+X-Request-Timeout header (seconds), a per-route @request_timeout(...),
+or the middleware default - whichever is shortest. The deadline lives in
+a context variable, so dependencies and downstream calls can read it
+without passing it around:
+
+    remaining()          # seconds left, or None if there is no deadline
+    await bounded(call)  # await something, but give up at the deadline
+
+When the deadline passes, DeadlineMiddleware cancels the handler (and
+everything it is awaiting) and answers 504 Gateway Timeout, so no work
+keeps running for a client that has already given up.
+
+Usage:
+    app.add_middleware(DeadlineMiddleware, default_timeout=30.0)
+
+    @app.get("/slow")
+    @request_timeout(2.0)
+    async def slow(): ...
+"""
+
+import asyncio
+import json
+import math
+from contextvars import ContextVar
+from typing import Any, Awaitable, Optional
+
+from route_options import lookup, route_option
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExpired(asyncio.TimeoutError):
+    """The request's deadline passed"""
+
+
+def request_timeout(seconds: float):
+    """Decorator: give this route its own time budget"""
+    return route_option("timeout", seconds)
+
+
+def remaining(reserve: float = 0.0) -> Optional[float]:
+    """
+    Seconds until the current request's deadline (None if unbounded).
+
+    `reserve` keeps some time back, e.g. to build a partial response
+    before the middleware gives up on the request.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - asyncio.get_running_loop().time() - reserve)
+
+
+async def bounded(awaitable: Awaitable[Any]) -> Any:
+    """Await something, raising DeadlineExpired when the deadline passes"""
+    try:
+        return await asyncio.wait_for(awaitable, remaining())
+    except asyncio.TimeoutError:
+        raise DeadlineExpired("Request deadline exceeded") from None
+
+
+class DeadlineMiddleware:
+    """ASGI middleware that enforces a deadline on every HTTP request"""
+
+    def __init__(
+        self,
+        app,
+        default_timeout: Optional[float] = 30.0,
+        max_timeout: float = 300.0,
+        header: str = "x-request-timeout"
+    ):
+        self.app = app
+        self.default_timeout = default_timeout
+        self.max_timeout = max_timeout
+        self.header = header.lower().encode()
+
+    def timeout_for(self, scope: dict) -> Optional[float]:
+        """Shortest of: client header, route option, default"""
+        candidates = [lookup(scope, "timeout", self.default_timeout)]
+        for name, value in scope.get("headers", []):
+            if name == self.header:
+                try:
+                    seconds = float(value)
+                except ValueError:
+                    continue  # ignore a malformed header rather than reject the request
+                # nan, inf and "no time at all" are malformed too: a
+                # negative value would otherwise be an instant 504
+                if math.isfinite(seconds) and seconds > 0:
+                    candidates.append(min(seconds, self.max_timeout))
+        candidates = [c for c in candidates if c is not None]
+        return min(candidates) if candidates else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timeout = self.timeout_for(scope)
+        if timeout is None:
+            return await self.app(scope, receive, send)
+
+        loop = asyncio.get_running_loop()
+        token = _deadline.set(loop.time() + timeout)
+        response_started = False
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        deadline = asyncio.timeout_at(_deadline.get())
+        try:
+            async with deadline:
+                await self.app(scope, receive, send_wrapper)
+        except asyncio.TimeoutError as exc:
+            # Only the request deadline is a 504. A TimeoutError the handler
+            # raised for its own reasons (say, an upstream call's timeout)
+            # is an ordinary error and goes on to the server error handling
+            if not (deadline.expired() or isinstance(exc, DeadlineExpired)):
+                raise
+            if response_started:
+                return  # mid-stream: all we can do is stop sending
+            body = json.dumps({"detail": "Request deadline exceeded"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 504,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+        finally:
+            _deadline.reset(token)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Bounded Fan-Out for Concurrent Calls
+
+asyncio.gather() over every backend has three problems: it starts all
+calls at once, the slowest call decides the response time, and one
+failure fails everything. fan_out() fixes each of them:
+
+- limit:       at most this many calls (or hedges) run at once
+- timeout:     per-call time limit, counted from when the call gets a
+               slot (waiting behind `limit` doesn't use it up)
+- deadline:    time limit for the whole fan-out
+- hedge_after: if a call hasn't answered after this long, start a second
+               copy and take whichever answers first
+- quorum:      stop once this many calls have succeeded and cancel the rest
+
+Results come back in call order, like gather(return_exceptions=True):
+each slot holds a value or the exception that call ended with.
+
+Usage:
+    results = await fan_out(
+        [lambda: fetch("a"), lambda: fetch("b"), lambda: fetch("c")],
+        limit=10, timeout=1.0, deadline=2.0, quorum=2
+    )
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Optional, Sequence
+
+Call = Callable[[], Awaitable[Any]]
+
+
+class CallTimeout(asyncio.TimeoutError):
+    """A call took longer than its per-call timeout"""
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The fan-out deadline passed before this call finished"""
+
+
+class NotNeeded(Exception):
+    """The call was cancelled because the quorum had already answered"""
+
+
+async def _hedged(
+    call: Call,
+    semaphore: Optional[asyncio.Semaphore],
+    hedge_after: Optional[float]
+) -> Any:
+    """Run a call, starting a second copy if the first is slow"""
+
+    async def hedge():
+        if semaphore is None:
+            return await call()
+        async with semaphore:  # hedges count against the limit too
+            return await call()
+
+    # The first attempt runs in the slot _call() already holds
+    attempts = [asyncio.create_task(call())]
+    try:
+        if hedge_after is not None:
+            done, _ = await asyncio.wait(attempts, timeout=hedge_after)
+            if not done:
+                attempts.append(asyncio.create_task(hedge()))
+
+        error: Optional[BaseException] = None
+        pending = set(attempts)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in attempts:
+            task.cancel()
+
+
+async def _call(
+    call: Call,
+    semaphore: Optional[asyncio.Semaphore],
+    timeout: Optional[float],
+    hedge_after: Optional[float]
+) -> Any:
+    # Take a slot before starting the clock: a call queued behind the
+    # limit hasn't started, so it can't have been slow yet
+    if semaphore is not None:
+        await semaphore.acquire()
+    try:
+        return await asyncio.wait_for(_hedged(call, semaphore, hedge_after), timeout)
+    except asyncio.TimeoutError as exc:
+        if isinstance(exc, (CallTimeout, DeadlineExceeded)):
+            raise
+        raise CallTimeout(f"call did not finish within {timeout}s") from None
+    finally:
+        if semaphore is not None:
+            semaphore.release()
+
+
+async def fan_out(
+    calls: Sequence[Call],
+    limit: Optional[int] = None,
+    timeout: Optional[float] = None,
+    deadline: Optional[float] = None,
+    hedge_after: Optional[float] = None,
+    quorum: Optional[int] = None
+) -> list[Any]:
+    """Run calls concurrently and return values or exceptions in call order"""
+    semaphore = asyncio.Semaphore(limit) if limit else None
+    tasks = [
+        asyncio.create_task(_call(call, semaphore, timeout, hedge_after))
+        for call in calls
+    ]
+    needed = len(calls) if quorum is None else min(quorum, len(calls))
+    expires = None if deadline is None else time.monotonic() + deadline
+
+    successes = 0
+    pending = set(tasks)
+    try:
+        while pending and successes < needed:
+            remaining = None if expires is None else max(0.0, expires - time.monotonic())
+            done, pending = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                break  # deadline
+            successes += sum(1 for task in done if task.exception() is None)
+    finally:
+        # Stragglers: past the deadline, not needed, or we were cancelled
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    results = []
+    for task in tasks:
+        if task in pending:
+            if successes >= needed:
+                results.append(NotNeeded("quorum reached"))
+            else:
+                results.append(DeadlineExceeded(f"fan-out deadline of {deadline}s passed"))
+        elif task.exception() is not None:
+            results.append(task.exception())
+        else:
+            results.append(task.result())
+    return results
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Fast-Path JSON Responses
+
+By default FastAPI turns a return value into JSON in two walks:
+jsonable_encoder() builds a JSON-friendly copy (datetimes become
+strings in Python), then JSONResponse runs json.dumps() over it.
+FastJSONResponse does it in one walk, in native code:
+
+- Pydantic models (and lists of them) go through pydantic-core,
+  which encodes datetimes without touching Python
+- Plain dicts/lists use orjson when it is installed
+
+Opt in app-wide with:
+    FAST_JSON=1 uv run uvicorn with_pydantic_models:app
+"""
+
+import os
+from typing import Any
+
+import pydantic_core
+from fastapi.datastructures import Default
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional: pydantic-core handles everything on its own
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content (models, dicts, lists, datetimes...) to JSON bytes"""
+    if isinstance(content, BaseModel):
+        return content.__pydantic_serializer__.to_json(content)
+    if orjson is not None and not (
+        isinstance(content, list) and content and isinstance(content[0], BaseModel)
+    ):
+        try:
+            return orjson.dumps(content)
+        except TypeError:
+            pass  # something orjson doesn't know, e.g. a nested model
+    return pydantic_core.to_json(content)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse that accepts models directly and encodes in one pass"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def fast_json_enabled() -> bool:
+    return os.environ.get("FAST_JSON", "0") == "1"
+
+
+def default_response_class():
+    """
+    Value for FastAPI(default_response_class=...).
+
+    Returned as a Default() placeholder so that FastAPI versions which
+    already dump response_model routes straight to bytes keep doing so;
+    FastJSONResponse then handles every other route.
+    """
+    return Default(FastJSONResponse if fast_json_enabled() else JSONResponse)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Bounded Background Job Queue
+
+FastAPI's BackgroundTasks run sync functions in Starlette's shared
+threadpool - the same pool that runs sync endpoints and dependencies.
+A burst of slow background jobs can fill it and stall everything else.
+
+JobQueue gives background work its own bounded lane:
+- A fixed-size queue: submit() raises QueueFull instead of piling up
+  (endpoints turn that into 503 Service Unavailable)
+- A fixed number of workers: async jobs run on the event loop,
+  sync jobs in the queue's own thread pool
+- submit() may be called from any thread (e.g. a sync endpoint in the
+  threadpool); the job is handed over to the event loop
+- drain() on shutdown finishes queued jobs before the process exits
+- metrics() reports depth and queue/run latency
+
+Usage:
+    jobs = JobQueue(maxsize=100, workers=4)
+    await jobs.start()            # in the app lifespan
+    jobs.submit(send_email, user_id=1)
+    await jobs.drain(timeout=30)  # on shutdown
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import inspect
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+
+class QueueFull(Exception):
+    """Raised by submit() when the queue is at capacity"""
+
+
+@dataclass
+class Job:
+    func: Callable
+    args: tuple
+    kwargs: dict
+    submitted_at: float = field(default_factory=time.perf_counter)
+
+
+def percentile(samples, fraction: float) -> float:
+    """Nearest-rank percentile of a sequence (0.0 when empty)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class JobQueue:
+    """Bounded queue with a fixed worker pool for background jobs"""
+
+    def __init__(self, maxsize: int = 100, workers: int = 4, history: int = 1000):
+        self.maxsize = maxsize
+        self.workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: list[asyncio.Task] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._accepting = False
+
+        # Metrics
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._wait_times: deque[float] = deque(maxlen=history)
+        self._run_times: deque[float] = deque(maxlen=history)
+
+    async def start(self):
+        """Start the workers (call from the app lifespan)"""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="job-worker"
+        )
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._accepting = True
+
+    def submit(self, func: Callable, *args: Any, **kwargs: Any):
+        """Queue a job without waiting for it; raises QueueFull when full"""
+        if not self._accepting:
+            raise QueueFull("Job queue is not accepting work")
+        job = Job(func, args, kwargs)
+        if self._on_loop():
+            return self._put(job)
+
+        # asyncio.Queue is not thread-safe: from another thread, let the
+        # loop do the put and wait (briefly) to learn whether it fitted
+        done: concurrent.futures.Future = concurrent.futures.Future()
+
+        def put():
+            try:
+                self._put(job)
+            except QueueFull as exc:
+                done.set_exception(exc)
+            else:
+                done.set_result(None)
+
+        self._loop.call_soon_threadsafe(put)
+        done.result()
+
+    def _on_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _put(self, job: Job):
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFull(f"Job queue is full ({self.maxsize} jobs)") from None
+        self.submitted += 1
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Stop accepting jobs, finish queued ones, then stop the workers"""
+        self._accepting = False
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass  # give up on what's left; workers are cancelled below
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            started = time.perf_counter()
+            self._wait_times.append(started - job.submitted_at)
+            try:
+                if inspect.iscoroutinefunction(job.func):
+                    await job.func(*job.args, **job.kwargs)
+                else:
+                    await loop.run_in_executor(
+                        self._executor, functools.partial(job.func, *job.args, **job.kwargs)
+                    )
+                self.completed += 1
+            except Exception as exc:
+                self.failed += 1
+                print(f"[JobQueue] {getattr(job.func, '__name__', job.func)} failed: {exc!r}")
+            finally:
+                self._run_times.append(time.perf_counter() - started)
+                self._queue.task_done()
+
+    def metrics(self) -> dict:
+        """Snapshot of queue depth, counters and latency (in milliseconds)"""
+        return {
+            "depth": self._queue.qsize() if self._queue else 0,
+            "maxsize": self.maxsize,
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "queue_wait_ms": {
+                "p50": percentile(self._wait_times, 0.50) * 1000,
+                "p95": percentile(self._wait_times, 0.95) * 1000,
+            },
+            "run_time_ms": {
+                "p50": percentile(self._run_times, 0.50) * 1000,
+                "p95": percentile(self._run_times, 0.95) * 1000,
+            },
+        }
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Load Test: Throughput and Tail Latency of the Example Apps
+
+Starts an app in-process (ASGI, no network) or under uvicorn on
+localhost, drives it with `--concurrency` async clients for
+`--duration` seconds using a weighted request mix, and reports
+requests/sec plus p50/p95/p99/p99.9 latency, overall and per endpoint.
+
+Results can be written as JSON and compared against a stored baseline;
+the exit code is 1 when throughput drops or p99 grows by more than
+`--tolerance`, so this can gate a CI job.
+
+Run with:
+    uv run python loadtest.py basic_app:app
+    uv run python loadtest.py with_pydantic_models:app async_patterns:app --mode uvicorn
+    uv run python loadtest.py basic_app:app --mix "GET /=1,GET /items/{n}=3"
+    uv run python loadtest.py basic_app:app --output results.json
+    uv run python loadtest.py basic_app:app --baseline results.json --tolerance 0.2
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Optional
+
+import httpx
+
+from job_queue import percentile
+
+# (weight, method, path, JSON body). "{n}" in a path becomes a random
+# id between 1 and SEED_ITEMS, which the setup requests create.
+SEED_ITEMS = 10
+
+MIXES = {
+    "basic_app:app": {
+        "setup": [],
+        "requests": [
+            (2, "GET", "/", None),
+            (1, "GET", "/health", None),
+            (4, "GET", "/items/{n}?query=load", None),
+            (1, "POST", "/echo?message=hello", None),
+        ],
+    },
+    "with_pydantic_models:app": {
+        "setup": [("POST", "/tasks", {"title": f"seed task {i}"}) for i in range(SEED_ITEMS)],
+        "requests": [
+            (3, "GET", "/tasks?limit=10", None),
+            (5, "GET", "/tasks/{n}", None),
+            (1, "POST", "/tasks", {"title": "load test", "description": "created under load"}),
+            (1, "PUT", "/tasks/{n}", {"completed": True}),
+        ],
+    },
+    "async_patterns:app": {
+        "setup": [],
+        "requests": [
+            (5, "GET", "/fast", None),
+            (2, "GET", "/config", None),
+            (1, "GET", "/metrics/jobs", None),
+        ],
+    },
+}
+
+PERCENTILES = {"p50": 0.50, "p95": 0.95, "p99": 0.99, "p99.9": 0.999}
+
+
+# ============================================================================
+# 1. REQUEST MIX
+# ============================================================================
+
+def parse_mix(text: str) -> list[tuple]:
+    """Parse "GET /=3,POST /echo?message=x=1" into weighted requests"""
+    mix = []
+    for part in text.split(","):
+        request, _, weight = part.strip().rpartition("=")
+        if not request or not weight.isdigit():
+            request, weight = part.strip(), "1"
+        method, _, path = request.partition(" ")
+        mix.append((int(weight), method.upper(), path, None))
+    return mix
+
+
+def latency_summary(samples: list[float]) -> dict[str, float]:
+    return {name: round(percentile(samples, q) * 1000, 3) for name, q in PERCENTILES.items()}
+
+
+# ============================================================================
+# 2. RUNNING THE APP
+# ============================================================================
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def in_process_client(target: str):
+    """Client wired straight to the ASGI app, with its lifespan running"""
+    module, _, attr = target.partition(":")
+    app = getattr(importlib.import_module(module), attr)
+    lifespan = app.router.lifespan_context(app)
+    await lifespan.__aenter__()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest")
+
+    async def close():
+        await client.aclose()
+        await lifespan.__aexit__(None, None, None)
+    return client, close
+
+
+async def uvicorn_client(target: str, concurrency: int, workers: int):
+    """Start uvicorn in a subprocess and wait until it answers"""
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", target, "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits)
+
+    deadline = time.monotonic() + 15
+    while True:
+        try:
+            await client.get("/")
+            break
+        except httpx.TransportError:
+            if server.poll() is not None or time.monotonic() > deadline:
+                server.kill()
+                raise RuntimeError(f"uvicorn did not start {target}")
+            await asyncio.sleep(0.1)
+
+    async def close():
+        await client.aclose()
+        server.terminate()
+        server.wait(timeout=10)
+    return client, close
+
+
+# ============================================================================
+# 3. LOAD GENERATOR
+# ============================================================================
+
+async def run_load(
+    client: httpx.AsyncClient,
+    mix: list[tuple],
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    seed: int
+) -> dict[str, Any]:
+    """Closed-loop load: each worker sends its next request as soon as one finishes"""
+    weights = [entry[0] for entry in mix]
+    samples: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    async def worker(rng: random.Random):
+        while True:
+            _, method, path, body = rng.choices(mix, weights)[0]
+            url = path.replace("{n}", str(rng.randint(1, SEED_ITEMS)))
+            sent = time.perf_counter()
+            if sent >= stop_at:
+                return
+            try:
+                response = await client.request(method, url, json=body)
+                failed = response.status_code >= 500
+            except httpx.HTTPError:
+                failed = True
+            if sent >= measure_from:
+                endpoint = f"{method} {path}"
+                samples[endpoint].append(time.perf_counter() - sent)
+                if failed:
+                    errors[endpoint] += 1
+
+    await asyncio.gather(*(worker(random.Random(seed + i)) for i in range(concurrency)))
+
+    everything = [sample for endpoint_samples in samples.values() for sample in endpoint_samples]
+    return {
+        "requests": len(everything),
+        "errors": sum(errors.values()),
+        "rps": round(len(everything) / duration, 1),
+        "latency_ms": latency_summary(everything),
+        "endpoints": {
+            endpoint: {
+                "requests": len(endpoint_samples),
+                "errors": errors[endpoint],
+                "latency_ms": latency_summary(endpoint_samples),
+            }
+            for endpoint, endpoint_samples in sorted(samples.items())
+        },
+    }
+
+
+async def load_test(target: str, args: argparse.Namespace) -> dict[str, Any]:
+    """Start one app, seed it, load it, stop it"""
+    known = MIXES.get(target, {"setup": [], "requests": [(1, "GET", "/", None)]})
+    mix = parse_mix(args.mix) if args.mix else known["requests"]
+
+    if args.mode == "uvicorn":
+        client, close = await uvicorn_client(target, args.concurrency, args.workers)
+    else:
+        client, close = await in_process_client(target)
+    try:
+        for method, path, body in known["setup"]:
+            await client.request(method, path, json=body)
+        result = await run_load(client, mix, args.concurrency, args.duration, args.warmup, args.seed)
+    finally:
+        await close()
+
+    return {
+        "app": target,
+        "mode": args.mode,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        **result,
+    }
+
+
+# ============================================================================
+# 4. REPORTING AND BASELINES
+# ============================================================================
+
+def print_result(result: dict[str, Any]):
+    latency = result["latency_ms"]
+    print(f"\n{result['app']} ({result['mode']}, concurrency {result['concurrency']})")
+    print(f"  {result['requests']} requests, {result['errors']} errors, {result['rps']} req/s")
+    print("  latency ms: " + "  ".join(f"{name} {value}" for name, value in latency.items()))
+    for endpoint, stats in result["endpoints"].items():
+        print(
+            f"    {endpoint:<36} {stats['requests']:>8} req  "
+            f"p50 {stats['latency_ms']['p50']:>8}  p99 {stats['latency_ms']['p99']:>8}"
+        )
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    """Return one line per regression against the baseline"""
+    regressions = []
+    for target, result in results.items():
+        before: Optional[dict] = baseline.get(target)
+        if before is None:
+            continue
+        if (before["mode"], before["concurrency"]) != (result["mode"], result["concurrency"]):
+            print(f"Skipping {target}: baseline was measured with a different mode or concurrency")
+            continue
+        if result["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{target}: {result['rps']} req/s, baseline {before['rps']}")
+        if result["latency_ms"]["p99"] > before["latency_ms"]["p99"] * (1 + tolerance):
+            regressions.append(
+                f"{target}: p99 {result['latency_ms']['p99']} ms, "
+                f"baseline {before['latency_ms']['p99']} ms"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("targets", nargs="+", help="apps as module:attribute, e.g. basic_app:app")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=1.0, help="unmeasured seconds first")
+    parser.add_argument("--mix", help='weighted requests, e.g. "GET /=3,GET /items/{n}=1"')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="JSON from an earlier --output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    results = {}
+    for target in args.targets:
+        results[target] = asyncio.run(load_test(target, args))
+        print_result(results[target])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Application-Scoped Dependency Providers
+
+FastAPI calls a dependency function on every request. That's fine for
+cheap objects, but a dependency that reads env vars or files pays that
+cost on every call. A Registry hands out providers with a scope:
+
+- singleton: built once at startup, reused until reload()
+- ttl:       rebuilt when older than `seconds`
+- request:   built on every request (plain FastAPI behaviour)
+
+Singletons can be hot-reloaded when a watched file changes or when the
+process gets a signal (SIGHUP by default).
+
+Usage:
+    registry = Registry()
+    get_config = registry.singleton(Config.load, watch="config.json")
+
+    @app.get("/config")
+    async def read_config(config: Config = Depends(get_config)): ...
+
+    # in the app lifespan
+    await registry.start()
+    yield
+    await registry.stop()
+"""
+
+import asyncio
+import os
+import signal
+import time
+from typing import Any, Callable, Optional
+
+_MISSING = object()
+
+
+class Provider:
+    """A dependency callable that caches its factory's result per scope"""
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        scope: str,
+        ttl: Optional[float] = None,
+        watch: Optional[str] = None
+    ):
+        self.factory = factory
+        self.scope = scope
+        self.ttl = ttl
+        self.watch = watch
+        self._value: Any = _MISSING
+        self._expires = 0.0
+        self._mtime: Optional[float] = None
+        self.__name__ = getattr(factory, "__name__", "provider")
+
+    async def __call__(self) -> Any:
+        # async so FastAPI calls it inline instead of hopping to a thread
+        return self.get()
+
+    def get(self) -> Any:
+        """Return the current value, building it if the scope requires"""
+        if self.scope == "request":
+            return self.factory()
+        if self._value is _MISSING or (self.ttl is not None and time.monotonic() >= self._expires):
+            self.refresh()
+        return self._value
+
+    def refresh(self):
+        """Build a fresh value and swap it in (the old one stays if this fails)"""
+        value = self.factory()
+        self._value = value
+        if self.ttl is not None:
+            self._expires = time.monotonic() + self.ttl
+
+    def file_changed(self) -> bool:
+        """True if the watched file's mtime moved since the last check"""
+        try:
+            mtime = os.stat(self.watch).st_mtime
+        except OSError:
+            mtime = None
+        changed = self._mtime is not None and mtime != self._mtime
+        self._mtime = mtime
+        return changed
+
+
+class Registry:
+    """Creates providers and manages their lifetime with the app"""
+
+    def __init__(self, poll_interval: float = 2.0):
+        self.poll_interval = poll_interval
+        self.providers: list[Provider] = []
+        self._watcher: Optional[asyncio.Task] = None
+        self._signal: Optional[int] = None
+
+    def singleton(self, factory: Callable[[], Any], watch: Optional[str] = None) -> Provider:
+        return self._add(Provider(factory, "singleton", watch=watch))
+
+    def ttl(self, factory: Callable[[], Any], seconds: float) -> Provider:
+        return self._add(Provider(factory, "ttl", ttl=seconds))
+
+    def request(self, factory: Callable[[], Any]) -> Provider:
+        return self._add(Provider(factory, "request"))
+
+    def _add(self, provider: Provider) -> Provider:
+        self.providers.append(provider)
+        return provider
+
+    def reload(self):
+        """Rebuild every singleton and TTL value now"""
+        for provider in self.providers:
+            if provider.scope == "request":
+                continue
+            try:
+                provider.refresh()
+            except Exception as exc:
+                print(f"[Registry] Reloading {provider.__name__} failed, keeping old value: {exc!r}")
+
+    async def start(self, reload_signal: Optional[int] = getattr(signal, "SIGHUP", None)):
+        """Build singletons up front, then start watching files and the signal"""
+        for provider in self.providers:
+            if provider.scope == "singleton":
+                provider.refresh()
+            if provider.watch:
+                provider.file_changed()  # record the starting mtime
+
+        if reload_signal is not None:
+            try:
+                asyncio.get_running_loop().add_signal_handler(reload_signal, self.reload)
+                self._signal = reload_signal
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass  # not on the main thread (e.g. TestClient) or not on Unix
+
+        if any(provider.watch for provider in self.providers):
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            for provider in self.providers:
+                if provider.watch and provider.file_changed():
+                    try:
+                        provider.refresh()
+                    except Exception as exc:
+                        print(f"[Registry] Reloading {provider.__name__} failed: {exc!r}")
+
+    async def stop(self):
+        """Stop watching and close values that have a close() method"""
+        if self._signal is not None:
+            asyncio.get_running_loop().remove_signal_handler(self._signal)
+            self._signal = None
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+        for provider in self.providers:
+            close = getattr(provider._value, "close", None)
+            if callable(close):
+                close()
+            provider._value = _MISSING
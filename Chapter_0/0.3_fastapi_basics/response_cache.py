@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+HTTP Response Cache with ETag / 304
+
+Read endpoints that are polled recompute and re-serialize the same
+answer on every call. ResponseCacheMiddleware keeps the bytes of
+successful GET responses of routes marked with @cache_response:
+
+- ttl:     how long the server may reuse a cached response
+- version: optional callable (e.g. `lambda: store.version`). Cached
+           responses are only reused while it returns the same value,
+           so a write invalidates them at once, and the ETag is built
+           from it - a client whose ETag is current gets 304 without
+           the handler running at all
+- max_age: Cache-Control max-age sent to clients (0 = always revalidate)
+
+Every cached response carries a strong ETag (the handler's own, one
+built from the version, or a hash of the body), and a request whose
+If-None-Match matches it gets 304 Not Modified with no body.
+
+Usage:
+    app.add_middleware(ResponseCacheMiddleware)
+
+    @app.get("/tasks")
+    @cache_response(ttl=30, version=lambda: store.version)
+    async def list_tasks(): ...
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from route_options import lookup, route_option
+
+
+@dataclass
+class CachePolicy:
+    ttl: float
+    version: Optional[Callable[[], Any]] = None
+    max_age: int = 0
+
+
+@dataclass
+class CachedResponse:
+    status: int
+    headers: list[tuple[bytes, bytes]]
+    body: bytes
+    etag: bytes
+    version: Any
+    expires: float
+
+
+def cache_response(
+    ttl: float = 60.0,
+    version: Optional[Callable[[], Any]] = None,
+    max_age: int = 0
+):
+    """Decorator: cache this GET route's responses"""
+    return route_option("cache", CachePolicy(ttl, version, max_age))
+
+
+def etag_matches(if_none_match: bytes, etag: bytes) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 asks for)"""
+    if if_none_match.strip() == b"*":
+        return True
+    tags = {tag.strip().removeprefix(b"W/") for tag in if_none_match.split(b",")}
+    return etag.removeprefix(b"W/") in tags
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware that caches GET responses and answers 304s"""
+
+    def __init__(
+        self,
+        app,
+        maxsize: int = 1024,
+        vary: tuple[str, ...] = ("accept", "authorization")
+    ):
+        self.app = app
+        self.maxsize = maxsize
+        self.vary = {name.encode() for name in vary}
+        self.entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    def key(self, scope: dict) -> str:
+        digest = hashlib.sha256(scope["path"].encode() + b"?" + scope.get("query_string", b""))
+        for name, value in sorted(scope.get("headers", [])):
+            if name in self.vary:
+                digest.update(b"\0" + name + b":" + value)
+        return digest.hexdigest()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        policy: Optional[CachePolicy] = lookup(scope, "cache")
+        if policy is None:
+            return await self.app(scope, receive, send)
+
+        key = self.key(scope)
+        version = policy.version() if policy.version else None
+        if_none_match = dict(scope.get("headers", [])).get(b"if-none-match")
+
+        entry = self.entries.get(key)
+        if entry is not None and (entry.expires <= time.monotonic() or entry.version != version):
+            del self.entries[key]
+            entry = None
+
+        if entry is not None:
+            self.entries.move_to_end(key)
+            if if_none_match and etag_matches(if_none_match, entry.etag):
+                return await self._not_modified(send, entry.etag, policy)
+            self.stats["hits"] += 1
+            return await self._replay(send, entry, policy)
+
+        if version is not None and if_none_match:
+            # The client's copy is current if it carries this version's
+            # ETag - no need to run the handler to find out
+            if etag_matches(if_none_match, self._version_etag(key, version)):
+                return await self._not_modified(send, self._version_etag(key, version), policy)
+
+        self.stats["misses"] += 1
+        await self._fill(scope, receive, send, key, version, policy)
+
+    @staticmethod
+    def _version_etag(key: str, version: Any) -> bytes:
+        return f'"{version}-{key[:12]}"'.encode()
+
+    async def _fill(self, scope, receive, send, key, version, policy: CachePolicy):
+        """Run the handler, buffering its response to cache and tag it"""
+        start: Optional[dict] = None
+        body = bytearray()
+
+        async def capture(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                body.extend(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        if start is None:
+            return
+
+        headers = [
+            (name, value) for name, value in start["headers"]
+            if name not in (b"etag", b"cache-control")
+        ]
+        handler_etag = dict(start["headers"]).get(b"etag")
+        if start["status"] != 200:
+            # Errors and conditional answers (e.g. the handler's own 304)
+            # go out as they are and are not cached
+            await send(start)
+            return await send({"type": "http.response.body", "body": bytes(body)})
+
+        if handler_etag is not None:
+            etag = handler_etag
+        elif version is not None:
+            etag = self._version_etag(key, version)
+        else:
+            etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'.encode()
+
+        entry = CachedResponse(
+            status=200,
+            headers=headers,
+            body=bytes(body),
+            etag=etag,
+            version=version,
+            expires=time.monotonic() + policy.ttl
+        )
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+        if_none_match = dict(scope.get("headers", [])).get(b"if-none-match")
+        if if_none_match and etag_matches(if_none_match, etag):
+            return await self._not_modified(send, etag, policy)
+        await self._replay(send, entry, policy)
+
+    async def _replay(self, send, entry: CachedResponse, policy: CachePolicy):
+        await send({
+            "type": "http.response.start",
+            "status": entry.status,
+            "headers": entry.headers + [
+                (b"etag", entry.etag),
+                (b"cache-control", f"max-age={policy.max_age}".encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": entry.body})
+
+    async def _not_modified(self, send, etag: bytes, policy: CachePolicy):
+        self.stats["not_modified"] += 1
+        await send({
+            "type": "http.response.start",
+            "status": 304,
+            "headers": [
+                (b"etag", etag),
+                (b"cache-control", f"max-age={policy.max_age}".encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": b""})
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Per-Route Options for ASGI Middleware
+
+Middleware only sees a raw path, but some behaviour should be opt-in per
+route. A decorator stores an option on the endpoint function, and
+middleware looks up the route that will handle the request to read it.
+
+Usage:
+    @app.get("/slow")
+    @route_option("timeout", 2.0)
+    async def slow(): ...
+
+    # in middleware
+    timeout = lookup(scope, "timeout")
+"""
+
+from typing import Any, Callable
+
+from starlette.routing import Match
+
+OPTIONS_ATTR = "__route_options__"
+
+
+def route_option(name: str, value: Any) -> Callable:
+    """Decorator that attaches an option to an endpoint function"""
+    def decorator(endpoint: Callable) -> Callable:
+        options = dict(getattr(endpoint, OPTIONS_ATTR, {}))
+        options[name] = value
+        setattr(endpoint, OPTIONS_ATTR, options)
+        return endpoint
+    return decorator
+
+
+def lookup(scope: dict, name: str, default: Any = None) -> Any:
+    """Return the option of the route that matches this request"""
+    app = scope.get("app")
+    router = getattr(app, "router", None)
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            endpoint = getattr(route, "endpoint", None)
+            return getattr(endpoint, OPTIONS_ATTR, {}).get(name, default)
+    return default
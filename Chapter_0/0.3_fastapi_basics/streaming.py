@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+NDJSON / Server-Sent Events Streaming
+
+stream_records() turns an async generator of Pydantic models (or dicts)
+into a StreamingResponse:
+
+- Each record is serialized once, natively (model_dump_json / orjson)
+- Small records are batched into larger chunks: a chunk is written when
+  it reaches `max_chunk_bytes` or `max_delay` seconds after its first
+  record, whichever comes first - fewer writes, bounded extra latency
+- The producer runs ahead by at most `buffer` records (backpressure:
+  a slow client slows the producer down instead of growing memory)
+- When the client disconnects the producer is cancelled and closed,
+  so no orphaned generator keeps running
+- A heartbeat is sent when nothing was written for `heartbeat` seconds,
+  which keeps proxies from closing idle connections
+
+Usage:
+    async def tokens():
+        for token in ...:
+            yield Token(text=token)
+
+    return stream_records(tokens(), format="sse")
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Optional
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from fast_json import dumps
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+# Heartbeats: an empty NDJSON line and an SSE comment are both ignored by clients
+HEARTBEATS = {
+    "ndjson": b"\n",
+    "sse": b": ping\n\n",
+}
+
+_DONE = object()
+
+
+@dataclass
+class Event:
+    """A record with an explicit SSE event name (NDJSON sends just the data)"""
+    event: str
+    data: Any
+
+
+def encode(record: Any, format: str) -> bytes:
+    """Serialize one record as an NDJSON line or an SSE message"""
+    data = record.data if isinstance(record, Event) else record
+    if isinstance(data, BaseModel):
+        payload = data.__pydantic_serializer__.to_json(data)
+    else:
+        payload = dumps(data)
+
+    if format == "sse":
+        if isinstance(record, Event):
+            return b"event: " + record.event.encode() + b"\ndata: " + payload + b"\n\n"
+        return b"data: " + payload + b"\n\n"
+    return payload + b"\n"
+
+
+async def _produce(source: AsyncIterator[Any], queue: asyncio.Queue):
+    """Move records from the source into the bounded queue"""
+    try:
+        async for record in source:
+            await queue.put(record)
+        await queue.put(_DONE)
+    except Exception as exc:
+        await queue.put(exc)
+    finally:
+        aclose = getattr(source, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+async def batch_records(
+    source: AsyncIterator[Any],
+    format: str = "ndjson",
+    max_chunk_bytes: int = 16 * 1024,
+    max_delay: float = 0.05,
+    heartbeat: Optional[float] = 15.0,
+    buffer: int = 256
+) -> AsyncIterator[bytes]:
+    """Encode records from `source` and yield them as batched chunks"""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+    producer = asyncio.create_task(_produce(source, queue))
+    chunk = bytearray()
+    first_at = 0.0
+    last_write = time.monotonic()
+
+    try:
+        while True:
+            now = time.monotonic()
+            if chunk:
+                timeout = max(0.0, first_at + max_delay - now)
+            elif heartbeat is not None:
+                timeout = max(0.0, last_write + heartbeat - now)
+            else:
+                timeout = None
+
+            try:
+                record = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                # Either the oldest buffered record has waited long enough,
+                # or the connection has been idle for a heartbeat interval
+                yield bytes(chunk) if chunk else HEARTBEATS[format]
+                chunk.clear()
+                last_write = time.monotonic()
+                continue
+
+            if record is _DONE:
+                break
+            if isinstance(record, Exception):
+                if chunk:
+                    yield bytes(chunk)
+                raise record
+
+            if not chunk:
+                first_at = time.monotonic()
+            chunk += encode(record, format)
+            if len(chunk) >= max_chunk_bytes:
+                yield bytes(chunk)
+                chunk.clear()
+                last_write = time.monotonic()
+
+        if chunk:
+            yield bytes(chunk)
+    finally:
+        # Runs on normal completion and when Starlette cancels the
+        # response because the client went away
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+
+
+def stream_records(
+    source: AsyncIterator[Any],
+    format: str = "ndjson",
+    **options: Any
+) -> StreamingResponse:
+    """Build a streaming NDJSON or SSE response from an async iterator"""
+    if format not in MEDIA_TYPES:
+        raise ValueError(f"Unknown stream format: {format!r}")
+    return StreamingResponse(
+        batch_records(source, format, **options),
+        media_type=MEDIA_TYPES[format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
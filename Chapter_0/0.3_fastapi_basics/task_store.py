@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Pluggable Storage for the Agent Task API
+
+Demonstrates:
+- A storage interface (TaskStore) that route handlers depend on
+- An in-memory implementation (the original dict)
+- A SQLite implementation that several uvicorn workers can share
+
+Select the backend with environment variables:
+    TASK_STORE=memory                      # default, per-process
+    TASK_STORE=sqlite TASK_DB_PATH=tasks.db  # shared between workers
+
+    TASK_STORE=sqlite uv run uvicorn with_pydantic_models:app --workers 4
+"""
+
+import secrets
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Optional, List, Iterator
+
+from pydantic import BaseModel
+
+
+class VersionConflict(Exception):
+    """Raised when an update's expected version no longer matches the task"""
+
+    def __init__(self, task_id: int, expected: int, actual: int):
+        super().__init__(f"Task {task_id} is at version {actual}, not {expected}")
+        self.task_id = task_id
+        self.expected = expected
+        self.actual = actual
+
+
+# ============================================================================
+# 1. STORAGE INTERFACE
+# ============================================================================
+
+class TaskStore(ABC):
+    """
+    Storage interface used by the task endpoints.
+
+    Stores are created with the Pydantic model they hand back, so this
+    module does not need to import the API module that defines it.
+
+    `epoch` names one generation of the data: task and store versions
+    restart when the data does (a new in-memory store, a new database
+    file), so ETags carry the epoch too, and a tag from an earlier
+    generation can never match.
+    """
+
+    epoch: str
+
+    # True when calls can block on I/O or locks; async callers should then
+    # run them in a thread rather than on the event loop
+    blocking = False
+
+    def __init__(self, model: type[BaseModel]):
+        self.model = model
+
+    @abstractmethod
+    def list_tasks(
+        self,
+        after_id: int = 0,
+        limit: Optional[int] = None,
+        completed: Optional[bool] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None
+    ) -> List[BaseModel]:
+        """
+        Return up to `limit` tasks with id > after_id, ordered by id.
+
+        This is keyset pagination: the next page starts after the last id
+        of the previous one, so a page costs the same wherever it is.
+        """
+
+    @abstractmethod
+    def get_task(self, task_id: int) -> Optional[BaseModel]:
+        """Return a task, or None if it does not exist"""
+
+    @abstractmethod
+    def create_task(self, title: str, description: Optional[str]) -> BaseModel:
+        """Create a task and return it with its new id"""
+
+    @abstractmethod
+    def update_task(
+        self,
+        task_id: int,
+        changes: dict[str, Any],
+        expected_version: Optional[int] = None
+    ) -> Optional[BaseModel]:
+        """
+        Apply changes to a task and bump its version.
+
+        With no changes nothing is written and the version stays put.
+        Returns None if the task does not exist. If expected_version is
+        given and the task has moved on, raises VersionConflict instead
+        of overwriting someone else's change.
+        """
+
+    @abstractmethod
+    def delete_task(self, task_id: int) -> bool:
+        """Delete a task, returning False if it did not exist"""
+
+    @property
+    @abstractmethod
+    def version(self) -> int:
+        """
+        Counter that moves on every write to the store.
+
+        Response caches compare it to decide whether a cached list or
+        task is still current, and build ETags from it.
+        """
+
+    # Bulk operations. These defaults loop over the single-item methods;
+    # backends override them to do the whole batch in one step.
+
+    def create_tasks(self, items: List[tuple[str, Optional[str]]]) -> List[BaseModel]:
+        """Create tasks from (title, description) pairs with contiguous ids"""
+        return [self.create_task(title, description) for title, description in items]
+
+    def update_tasks(
+        self,
+        updates: List[tuple[int, dict[str, Any], Optional[int]]]
+    ) -> List[Any]:
+        """
+        Apply (task_id, changes, expected_version) triples.
+
+        Each result is the updated task, None for a missing task, or the
+        VersionConflict for that item (returned, not raised, so one stale
+        item does not abort the others).
+        """
+        results = []
+        for task_id, changes, expected_version in updates:
+            try:
+                results.append(self.update_task(task_id, changes, expected_version))
+            except VersionConflict as conflict:
+                results.append(conflict)
+        return results
+
+    def delete_tasks(self, task_ids: List[int]) -> List[bool]:
+        """Delete tasks, returning False for ids that did not exist"""
+        return [self.delete_task(task_id) for task_id in task_ids]
+
+    def close(self) -> None:
+        """Release any resources held by the store"""
+
+
+# ============================================================================
+# 2. IN-MEMORY STORE
+# ============================================================================
+
+class InMemoryTaskStore(TaskStore):
+    """
+    The original dict-based storage.
+
+    Fast, but data is lost on restart and every worker process
+    gets its own private copy. A sorted list of ids lets a page
+    start with a binary search instead of a scan from the beginning.
+    """
+
+    def __init__(self, model: type[BaseModel]):
+        super().__init__(model)
+        self.tasks: dict[int, BaseModel] = {}
+        self.ids: list[int] = []
+        self.next_id = 1
+        self._version = 0
+        self.epoch = secrets.token_hex(4)  # this process's copy of the data
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def list_tasks(
+        self,
+        after_id: int = 0,
+        limit: Optional[int] = None,
+        completed: Optional[bool] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None
+    ) -> List[BaseModel]:
+        page = []
+        for i in range(bisect_right(self.ids, after_id), len(self.ids)):
+            if limit is not None and len(page) >= limit:
+                break
+            task = self.tasks[self.ids[i]]
+            if completed is not None and task.completed != completed:
+                continue
+            if created_after is not None and task.created_at < created_after:
+                continue
+            if created_before is not None and task.created_at >= created_before:
+                continue
+            page.append(task)
+        return page
+
+    def get_task(self, task_id: int) -> Optional[BaseModel]:
+        return self.tasks.get(task_id)
+
+    def create_task(self, title: str, description: Optional[str]) -> BaseModel:
+        task = self.model(
+            id=self.next_id,
+            title=title,
+            description=description,
+            completed=False,
+            created_at=datetime.now()
+        )
+        self.tasks[self.next_id] = task
+        self.ids.append(self.next_id)  # ids only grow, so this stays sorted
+        self.next_id += 1
+        self._version += 1
+        return task
+
+    def create_tasks(self, items: List[tuple[str, Optional[str]]]) -> List[BaseModel]:
+        first_id = self.next_id
+        self.next_id += len(items)
+        created_at = datetime.now()
+
+        new_tasks = [
+            self.model(
+                id=first_id + offset,
+                title=title,
+                description=description,
+                completed=False,
+                created_at=created_at
+            )
+            for offset, (title, description) in enumerate(items)
+        ]
+        for task in new_tasks:
+            self.tasks[task.id] = task
+        self.ids.extend(range(first_id, self.next_id))
+        self._version += 1
+        return new_tasks
+
+    def update_task(
+        self,
+        task_id: int,
+        changes: dict[str, Any],
+        expected_version: Optional[int] = None
+    ) -> Optional[BaseModel]:
+        task = self.tasks.get(task_id)
+        if task is None:
+            return None
+        if expected_version is not None and task.version != expected_version:
+            raise VersionConflict(task_id, expected_version, task.version)
+        if not changes:
+            return task
+        # Update in place: only the changed attributes are written,
+        # no new model is allocated and no other field is copied.
+        # There is no await in here, so no other request can interleave.
+        for name, value in changes.items():
+            setattr(task, name, value)
+        task.version += 1
+        self._version += 1
+        return task
+
+    def delete_task(self, task_id: int) -> bool:
+        if self.tasks.pop(task_id, None) is None:
+            return False
+        del self.ids[bisect_left(self.ids, task_id)]
+        self._version += 1
+        return True
+
+
+# ============================================================================
+# 3. SQLITE STORE
+# ============================================================================
+
+class SQLiteTaskStore(TaskStore):
+    """
+    SQLite-backed storage shared by every process that opens the same file.
+
+    - WAL mode lets readers run while one writer commits
+    - Ids come from AUTOINCREMENT, so concurrent workers never reuse one
+    - Queries come from a small fixed set of SQL strings, so sqlite3's
+      statement cache prepares each one once per connection
+    - Each thread gets its own connection (sqlite3 connections are not
+      safe to share between threads)
+    """
+
+    # A write can wait up to busy_timeout for another process's lock
+    blocking = True
+
+    UPDATABLE = ("title", "description", "completed")
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            completed INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1
+        );
+        CREATE INDEX IF NOT EXISTS idx_tasks_completed ON tasks (completed);
+        CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks (created_at);
+
+        -- Store-wide write counter, bumped by triggers so that writes from
+        -- every process (and every code path) are counted
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        INSERT OR IGNORE INTO meta VALUES ('version', 0);
+        CREATE TRIGGER IF NOT EXISTS tasks_version_insert AFTER INSERT ON tasks
+            BEGIN UPDATE meta SET value = value + 1 WHERE key = 'version'; END;
+        CREATE TRIGGER IF NOT EXISTS tasks_version_update AFTER UPDATE ON tasks
+            BEGIN UPDATE meta SET value = value + 1 WHERE key = 'version'; END;
+        CREATE TRIGGER IF NOT EXISTS tasks_version_delete AFTER DELETE ON tasks
+            BEGIN UPDATE meta SET value = value + 1 WHERE key = 'version'; END;
+    """
+
+    FIELDS = "id, title, description, completed, created_at, version"
+    SELECT_PAGE = f"SELECT {FIELDS} FROM tasks WHERE id > ?"
+    SELECT_ONE = f"SELECT {FIELDS} FROM tasks WHERE id = ?"
+    SELECT_VERSION = "SELECT version FROM tasks WHERE id = ?"
+    INSERT = (
+        "INSERT INTO tasks (title, description, completed, created_at) VALUES (?, ?, 0, ?) "
+        f"RETURNING {FIELDS}"
+    )
+    INSERT_WITH_ID = (
+        "INSERT INTO tasks (id, title, description, completed, created_at) VALUES (?, ?, ?, 0, ?)"
+    )
+    LAST_ID = "SELECT seq FROM sqlite_sequence WHERE name = 'tasks'"
+    DELETE = "DELETE FROM tasks WHERE id = ?"
+    STORE_VERSION = "SELECT value FROM meta WHERE key = 'version'"
+    # Picked once, when the file is created, and shared by every worker
+    INSERT_EPOCH = "INSERT OR IGNORE INTO meta VALUES ('epoch', ?)"
+    SELECT_EPOCH = "SELECT value FROM meta WHERE key = 'epoch'"
+
+    def __init__(self, model: type[BaseModel], path: str = "tasks.db"):
+        super().__init__(model)
+        self.path = path
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._connection().executescript(self.SCHEMA)
+        self._migrate()
+        conn = self._connection()
+        conn.execute(self.INSERT_EPOCH, (secrets.randbits(32),))
+        self.epoch = f"{conn.execute(self.SELECT_EPOCH).fetchone()[0]:08x}"
+
+    def _migrate(self):
+        """Add columns that files created by older versions are missing"""
+        conn = self._connection()
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+        if "version" not in columns:
+            conn.execute("ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: autocommit, transactions are explicit
+            conn = sqlite3.connect(
+                self.path,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=256
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Run a block as one write transaction.
+
+        BEGIN IMMEDIATE takes the write lock up front, so no other
+        process can allocate ids or change rows until we commit.
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @property
+    def version(self) -> int:
+        return self._connection().execute(self.STORE_VERSION).fetchone()[0]
+
+    def _to_model(self, row: tuple) -> BaseModel:
+        """Build a model from a trusted database row without re-validating"""
+        task_id, title, description, completed, created_at, version = row
+        return self.model.model_construct(
+            id=task_id,
+            title=title,
+            description=description,
+            completed=bool(completed),
+            created_at=datetime.fromisoformat(created_at),
+            version=version
+        )
+
+    def list_tasks(
+        self,
+        after_id: int = 0,
+        limit: Optional[int] = None,
+        completed: Optional[bool] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None
+    ) -> List[BaseModel]:
+        # Only a handful of query shapes exist, so each one is prepared once
+        sql = self.SELECT_PAGE
+        params: list[Any] = [after_id]
+        if completed is not None:
+            sql += " AND completed = ?"
+            params.append(int(completed))
+        if created_after is not None:
+            sql += " AND created_at >= ?"
+            params.append(created_after.isoformat())
+        if created_before is not None:
+            sql += " AND created_at < ?"
+            params.append(created_before.isoformat())
+        sql += " ORDER BY id LIMIT ?"
+        params.append(-1 if limit is None else limit)
+
+        rows = self._connection().execute(sql, params).fetchall()
+        return [self._to_model(row) for row in rows]
+
+    def get_task(self, task_id: int) -> Optional[BaseModel]:
+        row = self._connection().execute(self.SELECT_ONE, (task_id,)).fetchone()
+        return self._to_model(row) if row else None
+
+    def create_task(self, title: str, description: Optional[str]) -> BaseModel:
+        row = self._connection().execute(
+            self.INSERT, (title, description, datetime.now().isoformat())
+        ).fetchone()
+        return self._to_model(row)
+
+    def create_tasks(self, items: List[tuple[str, Optional[str]]]) -> List[BaseModel]:
+        created_at = datetime.now().isoformat()
+        with self._transaction() as conn:
+            row = conn.execute(self.LAST_ID).fetchone()
+            first_id = (row[0] if row else 0) + 1
+            rows = [
+                (first_id + offset, title, description, created_at)
+                for offset, (title, description) in enumerate(items)
+            ]
+            conn.executemany(self.INSERT_WITH_ID, rows)
+        return [self._to_model(row[:3] + (0,) + row[3:] + (1,)) for row in rows]
+
+    def _update(
+        self,
+        conn: sqlite3.Connection,
+        task_id: int,
+        changes: dict[str, Any],
+        expected_version: Optional[int]
+    ) -> Optional[BaseModel]:
+        # Column names come from the UPDATABLE whitelist, never from the client
+        columns = [name for name in self.UPDATABLE if name in changes]
+        if not columns:
+            # Nothing to change: don't write, but check the version all the same
+            row = conn.execute(self.SELECT_ONE, (task_id,)).fetchone()
+            if row is None:
+                return None
+            task = self._to_model(row)
+            if expected_version is not None and task.version != expected_version:
+                raise VersionConflict(task_id, expected_version, task.version)
+            return task
+        assignments = "".join(f"{name} = ?, " for name in columns)
+        sql = f"UPDATE tasks SET {assignments}version = version + 1 WHERE id = ?"
+        params = [changes[name] for name in columns] + [task_id]
+        if expected_version is not None:
+            # Compare-and-set: the row only changes if nobody got there first
+            sql += " AND version = ?"
+            params.append(expected_version)
+
+        row = conn.execute(f"{sql} RETURNING {self.FIELDS}", params).fetchone()
+        if row:
+            return self._to_model(row)
+        if expected_version is None:
+            return None
+        current = conn.execute(self.SELECT_VERSION, (task_id,)).fetchone()
+        if current is None:
+            return None
+        raise VersionConflict(task_id, expected_version, current[0])
+
+    def update_task(
+        self,
+        task_id: int,
+        changes: dict[str, Any],
+        expected_version: Optional[int] = None
+    ) -> Optional[BaseModel]:
+        return self._update(self._connection(), task_id, changes, expected_version)
+
+    def update_tasks(
+        self,
+        updates: List[tuple[int, dict[str, Any], Optional[int]]]
+    ) -> List[Any]:
+        results = []
+        with self._transaction() as conn:
+            for task_id, changes, expected_version in updates:
+                try:
+                    results.append(self._update(conn, task_id, changes, expected_version))
+                except VersionConflict as conflict:
+                    results.append(conflict)
+        return results
+
+    def delete_task(self, task_id: int) -> bool:
+        return self._connection().execute(self.DELETE, (task_id,)).rowcount > 0
+
+    def delete_tasks(self, task_ids: List[int]) -> List[bool]:
+        with self._transaction() as conn:
+            return [conn.execute(self.DELETE, (task_id,)).rowcount > 0 for task_id in task_ids]
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
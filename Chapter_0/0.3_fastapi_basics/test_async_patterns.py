@@ -0,0 +1,125 @@
+"""
+Tests for the Streaming Agent Endpoint (POST /agent)
+
+The job queue is replaced with a stub, so no lifespan is needed and
+nothing sleeps in the background.
+
+Run tests with:
+    uv add --dev pytest pytest-asyncio
+    uv run pytest test_async_patterns.py -v
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import async_patterns
+from async_patterns import app, get_jobs
+from test_middleware import asgi_request
+
+PROMPT = " ".join(f"word{i}" for i in range(40))
+
+
+class StubJobs:
+    """Records submitted jobs instead of running them"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, func, *args, **kwargs):
+        self.submitted.append(func.__name__)
+
+
+@pytest.fixture
+def jobs():
+    stub = StubJobs()
+    app.dependency_overrides[get_jobs] = lambda: stub
+    yield stub
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def tokens(monkeypatch):
+    """Counts the tokens the simulated LLM produces, and whether it was closed"""
+    state = {"generated": 0, "closed": False}
+    generate_tokens = async_patterns.generate_tokens
+
+    async def counting(prompt: str, model: str):
+        try:
+            async for token in generate_tokens(prompt, model):
+                state["generated"] += 1
+                yield token
+        finally:
+            state["closed"] = True
+
+    monkeypatch.setattr(async_patterns, "generate_tokens", counting)
+    return state
+
+
+async def post_agent(**kwargs) -> httpx.Response:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.post("/agent", json={"prompt": "hello world"}, **kwargs)
+
+
+# ============================================================================
+# 1. EVENT FRAMING
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_agent_streams_ndjson_events(jobs):
+    """One JSON event per line: tool call, tool result, tokens, then done"""
+    response = await post_agent()
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    events = [json.loads(line) for line in response.text.splitlines() if line]
+    types = [event["type"] for event in events]
+    assert types[:2] == ["tool_call", "tool_result"]
+    assert set(types[2:-1]) == {"token"}
+    assert events[-1] == {
+        "type": "done", "text": "".join(event["text"] for event in events[2:-1]).strip()
+    }
+    assert jobs.submitted == ["log_task"]
+
+
+@pytest.mark.asyncio
+async def test_agent_streams_named_sse_events(jobs):
+    """With Accept: text/event-stream each message is named after the event type"""
+    response = await post_agent(headers={"Accept": "text/event-stream"})
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    messages = [block for block in response.text.split("\n\n") if block]
+    names = [message.split("\n")[0] for message in messages]
+    assert names[:2] == ["event: tool_call", "event: tool_result"]
+    assert names[-1] == "event: done"
+    for message in messages:
+        name, data = message.split("\n")
+        assert json.loads(data.removeprefix("data: "))["type"] == name.removeprefix("event: ")
+
+
+@pytest.mark.asyncio
+async def test_agent_without_streaming_returns_one_result(jobs):
+    response = await post_agent(params={"stream": "false"})
+    assert response.json() == {"result": "Agent (llama2) response to: hello world"}
+
+
+# ============================================================================
+# 2. DISCONNECTS
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_client_disconnect_stops_the_agent_run(jobs, tokens):
+    """Hanging up mid-answer cancels generation (through every middleware)"""
+    body = json.dumps({"prompt": PROMPT}).encode()
+    messages = await asgi_request(
+        app, "POST", "/agent", body=body,
+        headers=[("Content-Type", "application/json")],
+        disconnect_after=3,  # tool call, tool result, first token
+    )
+    await asyncio.sleep(0.2)
+
+    assert messages[0]["status"] == 200
+    assert tokens["closed"]
+    assert tokens["generated"] < 10  # of the 44 the answer has
@@ -0,0 +1,165 @@
+"""
+Tests for Bounded Fan-Out
+
+Every result type fan_out() can put in a slot (value, error,
+CallTimeout, DeadlineExceeded, NotNeeded) and the options that produce
+them, using short sleeps as backends.
+
+Run tests with:
+    uv add --dev pytest pytest-asyncio
+    uv run pytest test_fanout.py -v
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from fanout import CallTimeout, DeadlineExceeded, NotNeeded, fan_out
+
+
+class Backend:
+    """Fake backend: each call sleeps, then returns its name (or raises)"""
+
+    def __init__(self):
+        self.started = []
+        self.cancelled = []
+        self.active = 0
+        self.max_active = 0
+
+    def call(self, name: str, seconds: float, error: Exception = None):
+        async def run():
+            self.started.append(name)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            try:
+                await asyncio.sleep(seconds)
+            except asyncio.CancelledError:
+                self.cancelled.append(name)
+                raise
+            finally:
+                self.active -= 1
+            if error is not None:
+                raise error
+            return name
+        return run
+
+
+# ============================================================================
+# 1. RESULTS AND LIMITS
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_results_come_back_in_call_order():
+    """Values and exceptions keep their slot, like gather(return_exceptions=True)"""
+    backend = Backend()
+    results = await fan_out([
+        backend.call("slow", 0.05),
+        backend.call("broken", 0.0, ValueError("down")),
+        backend.call("fast", 0.0),
+    ])
+    assert results[0] == "slow"
+    assert isinstance(results[1], ValueError)
+    assert results[2] == "fast"
+
+
+@pytest.mark.asyncio
+async def test_limit_caps_concurrent_calls():
+    """No more than `limit` calls run at once"""
+    backend = Backend()
+    results = await fan_out([backend.call(str(i), 0.02) for i in range(6)], limit=2)
+    assert results == [str(i) for i in range(6)]
+    assert backend.max_active == 2
+
+
+# ============================================================================
+# 2. TIMEOUTS AND DEADLINES
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_slow_call_gets_call_timeout():
+    """A call over its own timeout fails alone; the others still answer"""
+    backend = Backend()
+    results = await fan_out(
+        [backend.call("slow", 1.0), backend.call("fast", 0.0)], timeout=0.05
+    )
+    assert isinstance(results[0], CallTimeout)
+    assert results[1] == "fast"
+    assert backend.cancelled == ["slow"]
+
+
+@pytest.mark.asyncio
+async def test_waiting_for_a_slot_does_not_count_against_the_timeout():
+    """Queued behind the limit, each call still gets its full timeout"""
+    backend = Backend()
+    results = await fan_out(
+        [backend.call(str(i), 0.05) for i in range(4)], limit=1, timeout=0.1
+    )
+    assert results == ["0", "1", "2", "3"]
+
+
+@pytest.mark.asyncio
+async def test_deadline_ends_the_whole_fan_out():
+    """Calls still running at the deadline get DeadlineExceeded"""
+    backend = Backend()
+    start = time.monotonic()
+    results = await fan_out(
+        [backend.call("fast", 0.0), backend.call("slow", 1.0)], deadline=0.05
+    )
+    assert time.monotonic() - start < 0.5
+    assert results[0] == "fast"
+    assert isinstance(results[1], DeadlineExceeded)
+    assert backend.cancelled == ["slow"]
+
+
+# ============================================================================
+# 3. QUORUM AND HEDGING
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_quorum_cancels_the_calls_it_does_not_need():
+    """Once `quorum` calls succeed, the rest are cancelled and marked NotNeeded"""
+    backend = Backend()
+    results = await fan_out(
+        [backend.call("a", 0.0), backend.call("b", 0.01), backend.call("c", 1.0)],
+        quorum=2
+    )
+    assert results[:2] == ["a", "b"]
+    assert isinstance(results[2], NotNeeded)
+    assert backend.cancelled == ["c"]
+
+
+@pytest.mark.asyncio
+async def test_failures_do_not_count_towards_the_quorum():
+    """A failed call is not a success: fan_out keeps waiting for real answers"""
+    backend = Backend()
+    results = await fan_out(
+        [backend.call("a", 0.0, ValueError("down")), backend.call("b", 0.02)], quorum=1
+    )
+    assert isinstance(results[0], ValueError)
+    assert results[1] == "b"
+
+
+@pytest.mark.asyncio
+async def test_hedge_answers_for_a_slow_first_attempt():
+    """After hedge_after a second copy starts; the first answer wins"""
+    backend = Backend()
+    durations = iter([1.0, 0.01])  # first attempt stalls, the hedge is quick
+
+    async def flaky():
+        return await backend.call("flaky", next(durations))()
+
+    start = time.monotonic()
+    results = await fan_out([flaky], hedge_after=0.02)
+    assert results == ["flaky"]
+    assert time.monotonic() - start < 0.5
+    assert backend.started == ["flaky", "flaky"]
+    assert backend.cancelled == ["flaky"]  # the stalled first attempt
+
+
+@pytest.mark.asyncio
+async def test_fast_calls_are_not_hedged():
+    """Calls that answer before hedge_after run once"""
+    backend = Backend()
+    await fan_out([backend.call("a", 0.0), backend.call("b", 0.0)], hedge_after=0.05)
+    assert backend.started == ["a", "b"]
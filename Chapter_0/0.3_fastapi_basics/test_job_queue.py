@@ -0,0 +1,51 @@
+"""
+Tests for the Bounded Background Job Queue
+
+Run tests with:
+    uv add --dev pytest pytest-asyncio
+    uv run pytest test_job_queue.py -v
+"""
+
+import asyncio
+
+import pytest
+
+from job_queue import JobQueue, QueueFull
+
+
+@pytest.mark.asyncio
+async def test_submit_from_another_thread_wakes_a_worker():
+    """A sync endpoint in the threadpool can submit jobs safely"""
+    jobs = JobQueue(maxsize=10, workers=2)
+    await jobs.start()
+    ran = asyncio.Event()
+
+    async def job():
+        ran.set()
+
+    await asyncio.to_thread(jobs.submit, job)
+    await asyncio.wait_for(ran.wait(), timeout=1)
+    await jobs.drain(timeout=1)
+    assert jobs.metrics()["completed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_submits_from_another_thread():
+    """QueueFull reaches the submitting thread, not the event loop"""
+    jobs = JobQueue(maxsize=1, workers=1)
+    await jobs.start()
+    release = asyncio.Event()
+
+    async def blocker():
+        await release.wait()
+
+    jobs.submit(blocker)  # picked up by the only worker
+    await asyncio.sleep(0)
+    jobs.submit(blocker)  # fills the queue
+
+    with pytest.raises(QueueFull):
+        await asyncio.to_thread(jobs.submit, blocker)
+    assert jobs.metrics()["rejected"] == 1
+
+    release.set()
+    await jobs.drain(timeout=1)
@@ -0,0 +1,366 @@
+"""
+Tests for the ASGI Middleware (deadlines, coalescing, response cache)
+
+Each test builds a small app with just the middleware under test and
+drives it with concurrent requests through httpx's ASGI transport.
+
+Run tests with:
+    uv add --dev pytest pytest-asyncio
+    uv run pytest test_middleware.py -v
+"""
+
+import asyncio
+from typing import Optional, Sequence
+
+import httpx
+import pytest
+from fastapi import FastAPI, Header, Response
+
+from coalescing import CoalescingMiddleware, coalesce
+from deadlines import DeadlineMiddleware, bounded, remaining, request_timeout
+from response_cache import ResponseCacheMiddleware, cache_response
+from streaming import stream_records
+
+
+def client_for(app: FastAPI) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def asgi_request(
+    app,
+    method: str,
+    path: str,
+    body: bytes = b"",
+    headers: Sequence[tuple[str, str]] = (),
+    disconnect_after: Optional[int] = None
+) -> list[dict]:
+    """
+    Send one request straight to the ASGI app and return the messages it sent.
+    
+    httpx's ASGI transport reads the whole response before returning,
+    so it can't hang up halfway; this client disconnects once it has
+    `disconnect_after` body chunks.
+    """
+    gone = asyncio.Event()
+    request_sent = False
+    messages = []
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+        chunks = [m for m in messages if m["type"] == "http.response.body" and m.get("body")]
+        if disconnect_after is not None and len(chunks) >= disconnect_after:
+            gone.set()
+
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"test")] + [
+            (name.lower().encode(), value.encode()) for name, value in headers
+        ],
+        "client": ("test", 1234), "server": ("test", 80),
+    }
+    await app(scope, receive, send)
+    return messages
+
+
+# ============================================================================
+# 1. DEADLINES
+# ============================================================================
+
+def deadline_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(DeadlineMiddleware, default_timeout=1.0)
+
+    @app.get("/sleep")
+    async def sleep(seconds: float = 0.0):
+        await bounded(asyncio.sleep(seconds))
+        return {"remaining": remaining()}
+
+    @app.get("/short")
+    @request_timeout(0.05)
+    async def short():
+        await asyncio.sleep(1)
+
+    @app.get("/upstream")
+    async def upstream():
+        await asyncio.wait_for(asyncio.sleep(1), 0.01)  # its own timeout, not the request's
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_request_within_its_deadline():
+    """Handlers see the time left; finishing in time is a normal response"""
+    async with client_for(deadline_app()) as client:
+        response = await client.get("/sleep")
+    assert response.status_code == 200
+    assert 0 < response.json()["remaining"] <= 1.0
+
+
+@pytest.mark.asyncio
+async def test_client_header_shortens_the_deadline():
+    """X-Request-Timeout below the default wins, and expiry is a 504"""
+    async with client_for(deadline_app()) as client:
+        response = await client.get(
+            "/sleep", params={"seconds": 0.5}, headers={"X-Request-Timeout": "0.05"}
+        )
+    assert response.status_code == 504
+
+
+@pytest.mark.asyncio
+async def test_route_timeout_cancels_the_handler():
+    """@request_timeout applies even when the handler never checks the deadline"""
+    async with client_for(deadline_app()) as client:
+        response = await client.get("/short")
+    assert response.status_code == 504
+
+
+@pytest.mark.asyncio
+async def test_handlers_own_timeout_is_not_a_deadline_504():
+    """A TimeoutError raised inside the handler is a 500, not 'deadline exceeded'"""
+    transport = httpx.ASGITransport(app=deadline_app(), raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/upstream")
+    assert response.status_code == 500
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("value", ["-1", "0", "nan", "soon"])
+async def test_unusable_timeout_header_is_ignored(value):
+    """Negative, zero, nan or non-numeric X-Request-Timeout falls back to the default"""
+    async with client_for(deadline_app()) as client:
+        response = await client.get("/sleep", headers={"X-Request-Timeout": value})
+    assert response.status_code == 200
+    assert response.json()["remaining"] > 0.5
+
+
+# ============================================================================
+# 2. COALESCING
+# ============================================================================
+
+def coalescing_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CoalescingMiddleware)
+    # Added last: runs first, so each request has its own deadline
+    app.add_middleware(DeadlineMiddleware, default_timeout=5.0)
+    app.state.runs = 0
+
+    @app.get("/work")
+    @coalesce()
+    async def work(seconds: float = 0.1):
+        app.state.runs += 1
+        await bounded(asyncio.sleep(seconds))
+        return {"runs": app.state.runs}
+
+    @app.get("/plain")
+    async def plain():
+        app.state.runs += 1
+        await asyncio.sleep(0.05)
+        return {}
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_requests_share_one_run():
+    """Five identical requests in flight at once run the handler once"""
+    app = coalescing_app()
+    async with client_for(app) as client:
+        responses = await asyncio.gather(*(client.get("/work") for _ in range(5)))
+    assert [response.json() for response in responses] == [{"runs": 1}] * 5
+    assert app.state.runs == 1
+
+
+@pytest.mark.asyncio
+async def test_different_queries_and_unmarked_routes_run_separately():
+    """Only identical requests to @coalesce routes are merged"""
+    app = coalescing_app()
+    async with client_for(app) as client:
+        await asyncio.gather(client.get("/work?seconds=0.05"), client.get("/work?seconds=0.06"))
+        await asyncio.gather(client.get("/plain"), client.get("/plain"))
+    assert app.state.runs == 4
+
+
+@pytest.mark.asyncio
+async def test_first_requests_deadline_does_not_apply_to_the_others():
+    """A request with a short deadline times out alone; its twin still succeeds"""
+    app = coalescing_app()
+    async with client_for(app) as client:
+        hurried, patient = await asyncio.gather(
+            client.get("/work?seconds=0.3", headers={"X-Request-Timeout": "0.1"}),
+            client.get("/work?seconds=0.3"),
+        )
+    assert hurried.status_code == 504
+    assert patient.status_code == 200
+    assert app.state.runs == 1
+
+
+@pytest.mark.asyncio
+async def test_conditional_and_plain_requests_are_not_merged():
+    """A handler's 304 for one client must not reach a client without If-None-Match"""
+    app = FastAPI()
+    app.add_middleware(CoalescingMiddleware)
+
+    @app.get("/doc")
+    @coalesce()
+    async def doc(if_none_match: str = Header(None)):
+        await asyncio.sleep(0.05)
+        if if_none_match == '"1"':
+            return Response(status_code=304, headers={"ETag": '"1"'})
+        return Response('{"body": "full"}', headers={"ETag": '"1"'})
+
+    async with client_for(app) as client:
+        conditional, plain = await asyncio.gather(
+            client.get("/doc", headers={"If-None-Match": '"1"'}),
+            client.get("/doc"),
+        )
+    assert conditional.status_code == 304
+    assert plain.status_code == 200
+    assert plain.json() == {"body": "full"}
+
+
+def streaming_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CoalescingMiddleware)
+    app.state.generated = 0
+    app.state.closed = False
+
+    @app.get("/tokens")
+    @coalesce()
+    async def tokens():
+        async def generate():
+            try:
+                for i in range(60):
+                    app.state.generated += 1
+                    yield {"token": i}
+                    await asyncio.sleep(0.01)
+            finally:
+                app.state.closed = True
+
+        return stream_records(generate(), max_delay=0.0)
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_shared_stream_stops_when_every_client_has_gone():
+    """Coalescing must not keep generating for clients that disconnected"""
+    app = streaming_app()
+    await asyncio.gather(
+        asgi_request(app, "GET", "/tokens", disconnect_after=1),
+        asgi_request(app, "GET", "/tokens", disconnect_after=2),
+    )
+    await asyncio.sleep(0.05)
+    assert app.state.closed
+    assert app.state.generated < 60
+
+
+@pytest.mark.asyncio
+async def test_shared_stream_continues_for_the_clients_still_reading():
+    """One client hanging up doesn't cut the stream short for the other"""
+    app = streaming_app()
+    _, reader = await asyncio.gather(
+        asgi_request(app, "GET", "/tokens", disconnect_after=1),
+        asgi_request(app, "GET", "/tokens"),
+    )
+    body = b"".join(m.get("body", b"") for m in reader if m["type"] == "http.response.body")
+    assert body.count(b"\n") == 60
+
+
+@pytest.mark.asyncio
+async def test_request_arriving_as_a_flight_is_cancelled_starts_a_new_run():
+    """Joining a run whose last subscriber just left must not fail with CancelledError"""
+    app = coalescing_app()
+    first = asyncio.create_task(asgi_request(app, "GET", "/work?seconds=0.3"))
+    while app.state.runs == 0:
+        await asyncio.sleep(0.01)
+
+    first.cancel()  # the only subscriber leaves, cancelling the run...
+    second = asyncio.create_task(asgi_request(app, "GET", "/work?seconds=0.3"))  # ...as a twin arrives
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+    messages = await second
+    assert messages[0]["status"] == 200
+    assert app.state.runs == 2
+
+
+# ============================================================================
+# 3. RESPONSE CACHE
+# ============================================================================
+
+def cached_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(ResponseCacheMiddleware)
+    app.state.runs = 0
+    app.state.version = 1
+
+    @app.get("/report")
+    @cache_response(ttl=60, version=lambda: app.state.version)
+    async def report():
+        app.state.runs += 1
+        return {"runs": app.state.runs}
+
+    @app.get("/hashed")
+    @cache_response(ttl=60)
+    async def hashed():
+        app.state.runs += 1
+        return {"same": "body"}
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_cached_response_is_reused_until_the_version_moves():
+    """Repeat GETs are served from the cache; a new version runs the handler again"""
+    app = cached_app()
+    async with client_for(app) as client:
+        first = await client.get("/report")
+        second = await client.get("/report")
+        app.state.version = 2
+        third = await client.get("/report")
+
+    assert first.json() == second.json() == {"runs": 1}
+    assert third.json() == {"runs": 2}
+    assert first.headers["ETag"] == second.headers["ETag"] != third.headers["ETag"]
+
+
+@pytest.mark.asyncio
+async def test_current_etag_gets_304_without_running_the_handler():
+    """With a version callable, a current If-None-Match is answered up front"""
+    app = cached_app()
+    async with client_for(app) as client:
+        etag = (await client.get("/report")).headers["ETag"]
+        app.state.runs = 0
+        # A fresh middleware cache (e.g. another worker) still knows the tag is current
+        app.middleware_stack = None
+        response = await client.get("/report", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert app.state.runs == 0
+
+
+@pytest.mark.asyncio
+async def test_body_hash_etag_and_stale_tags():
+    """Without a version the ETag hashes the body; an old tag gets the full response"""
+    app = cached_app()
+    async with client_for(app) as client:
+        etag = (await client.get("/hashed")).headers["ETag"]
+        current = await client.get("/hashed", headers={"If-None-Match": etag})
+        stale = await client.get("/hashed", headers={"If-None-Match": '"old"'})
+
+    assert current.status_code == 304
+    assert stale.status_code == 200
+    assert stale.json() == {"same": "body"}
@@ -0,0 +1,153 @@
+"""
+Tests for the Dependency Providers
+
+Covers each scope (singleton, ttl, request), reloading on a signal and
+on a watched file changing, and using providers with Depends().
+
+Run tests with:
+    uv add --dev pytest pytest-asyncio
+    uv run pytest test_providers.py -v
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import signal
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from providers import Registry
+
+
+class Counter:
+    """Factory that returns 1, 2, 3, ... so rebuilds are visible"""
+
+    def __init__(self):
+        self.calls = itertools.count(1)
+
+    def __call__(self) -> int:
+        return next(self.calls)
+
+
+# ============================================================================
+# 1. SCOPES
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_singleton_is_built_once_at_start():
+    registry = Registry()
+    provider = registry.singleton(Counter())
+    await registry.start(reload_signal=None)
+
+    assert [await provider() for _ in range(3)] == [1, 1, 1]
+    await registry.stop()
+
+
+@pytest.mark.asyncio
+async def test_ttl_value_is_rebuilt_once_it_expires():
+    registry = Registry()
+    provider = registry.ttl(Counter(), seconds=0.05)
+
+    assert await provider() == await provider() == 1
+    await asyncio.sleep(0.06)
+    assert await provider() == 2
+
+
+@pytest.mark.asyncio
+async def test_request_scope_builds_a_new_value_every_call():
+    registry = Registry()
+    provider = registry.request(Counter())
+    assert [await provider() for _ in range(3)] == [1, 2, 3]
+
+
+def test_providers_work_with_depends():
+    """A singleton is shared by every request; a request-scoped value is not"""
+    registry = Registry()
+    get_shared = registry.singleton(Counter())
+    get_fresh = registry.request(Counter())
+    app = FastAPI()
+
+    @app.get("/")
+    async def read(shared: int = Depends(get_shared), fresh: int = Depends(get_fresh)):
+        return {"shared": shared, "fresh": fresh}
+
+    with TestClient(app) as client:
+        assert client.get("/").json() == {"shared": 1, "fresh": 1}
+        assert client.get("/").json() == {"shared": 1, "fresh": 2}
+
+
+@pytest.mark.asyncio
+async def test_stop_closes_values_and_forgets_them():
+    class Connection:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    registry = Registry()
+    provider = registry.singleton(Connection)
+    await registry.start(reload_signal=None)
+    connection = await provider()
+    await registry.stop()
+
+    assert connection.closed
+    assert await provider() is not connection
+
+
+# ============================================================================
+# 2. RELOADING
+# ============================================================================
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not hasattr(signal, "SIGHUP"), reason="needs SIGHUP (Unix)")
+async def test_sighup_reloads_singletons():
+    registry = Registry()
+    provider = registry.singleton(Counter())
+    await registry.start()
+    try:
+        assert await provider() == 1
+        os.kill(os.getpid(), signal.SIGHUP)
+        await asyncio.sleep(0.05)  # the handler runs on the event loop
+        assert await provider() == 2
+    finally:
+        await registry.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_reload_keeps_the_old_value():
+    values = iter([{"version": 1}])
+    registry = Registry()
+    provider = registry.singleton(lambda: next(values))  # second call raises
+    await registry.start(reload_signal=None)
+
+    registry.reload()
+    assert await provider() == {"version": 1}
+    await registry.stop()
+
+
+@pytest.mark.asyncio
+async def test_watched_file_change_reloads_the_singleton(tmp_path):
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps({"timeout": 30}))
+
+    def load() -> dict:
+        return json.loads(config_file.read_text())
+
+    registry = Registry(poll_interval=0.02)
+    provider = registry.singleton(load, watch=str(config_file))
+    await registry.start(reload_signal=None)
+    try:
+        assert (await provider())["timeout"] == 30
+
+        config_file.write_text(json.dumps({"timeout": 5}))
+        stat = config_file.stat()
+        # Coarse filesystem clocks: make sure the mtime really moves
+        os.utime(config_file, (stat.st_atime, stat.st_mtime + 1))
+        await asyncio.sleep(0.1)
+
+        assert (await provider())["timeout"] == 5
+    finally:
+        await registry.stop()
@@ -0,0 +1,155 @@
+"""
+Tests for NDJSON / SSE Streaming
+
+batch_records() is driven directly to check how records are grouped
+into chunks. stream_records() is driven as a raw ASGI response, so the
+client can hang up halfway through.
+
+Run tests with:
+    uv add --dev pytest pytest-asyncio
+    uv run pytest test_streaming.py -v
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+from pydantic import BaseModel
+
+from streaming import HEARTBEATS, Event, batch_records, stream_records
+
+
+class Token(BaseModel):
+    text: str
+
+
+async def records(count: int, every: float = 0.0):
+    """count records, `every` seconds apart"""
+    for i in range(count):
+        if every:
+            await asyncio.sleep(every)
+        yield {"n": i}
+
+
+async def collect(chunks) -> list[tuple[float, bytes]]:
+    """(seconds since start, chunk) for every chunk"""
+    start = time.monotonic()
+    return [(time.monotonic() - start, chunk) async for chunk in chunks]
+
+
+# ============================================================================
+# 1. ENCODING AND BATCHING
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_ndjson_and_sse_framing():
+    """NDJSON is one line per record; SSE messages carry the event name"""
+    async def source():
+        yield Token(text="hi")
+        yield Event("done", {"ok": True})
+
+    ndjson = b"".join([chunk async for chunk in batch_records(source(), "ndjson")])
+    assert [json.loads(line) for line in ndjson.splitlines()] == [{"text": "hi"}, {"ok": True}]
+
+    sse = b"".join([chunk async for chunk in batch_records(source(), "sse")])
+    assert sse == b'data: {"text":"hi"}\n\nevent: done\ndata: {"ok":true}\n\n'
+
+
+@pytest.mark.asyncio
+async def test_chunk_is_written_once_it_reaches_max_chunk_bytes():
+    """Records available at once are grouped into chunks of about max_chunk_bytes"""
+    chunks = [chunk for _, chunk in await collect(
+        batch_records(records(100), max_chunk_bytes=100, max_delay=10.0)
+    )]
+    assert b"".join(chunks).count(b"\n") == 100
+    assert 1 < len(chunks) < 100
+    assert all(len(chunk) >= 100 for chunk in chunks[:-1])
+
+
+@pytest.mark.asyncio
+async def test_chunk_is_written_after_max_delay():
+    """A lone record waits at most max_delay for company"""
+    async def slow_source():
+        yield {"n": 0}
+        await asyncio.sleep(0.3)
+        yield {"n": 1}
+
+    chunks = await collect(batch_records(slow_source(), max_delay=0.05, heartbeat=None))
+    assert [chunk for _, chunk in chunks] == [b'{"n":0}\n', b'{"n":1}\n']
+    assert chunks[0][0] < 0.2  # not held back until the second record
+
+
+# ============================================================================
+# 2. HEARTBEATS
+# ============================================================================
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("format", ["ndjson", "sse"])
+async def test_heartbeat_while_the_source_is_idle(format):
+    """Idle streams get a heartbeat every `heartbeat` seconds"""
+    chunks = await collect(batch_records(records(2, every=0.25), format, heartbeat=0.05))
+    bodies = [chunk for _, chunk in chunks]
+
+    assert bodies.count(HEARTBEATS[format]) >= 3
+    assert len(bodies) - bodies.count(HEARTBEATS[format]) == 2
+
+
+@pytest.mark.asyncio
+async def test_no_heartbeat_when_disabled():
+    chunks = await collect(batch_records(records(2, every=0.1), heartbeat=None))
+    assert HEARTBEATS["ndjson"] not in [chunk for _, chunk in chunks]
+
+
+# ============================================================================
+# 3. DISCONNECTS
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_the_producer():
+    """When the client hangs up, the source generator is closed right away"""
+    state = {"produced": 0, "closed": False}
+
+    async def source():
+        try:
+            for i in range(100):
+                state["produced"] += 1
+                yield {"n": i}
+                await asyncio.sleep(0.01)
+        finally:
+            state["closed"] = True
+
+    gone = asyncio.Event()
+
+    async def receive():
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            gone.set()  # hang up after the first chunk
+
+    response = stream_records(source(), max_delay=0.0)
+    await response({"type": "http"}, receive, send)
+
+    assert state["closed"]
+    assert state["produced"] < 100
+
+
+@pytest.mark.asyncio
+async def test_source_error_ends_the_stream_after_the_buffered_records():
+    """Records before a failure are still sent, then the error propagates"""
+    async def failing():
+        yield {"n": 0}
+        raise RuntimeError("upstream broke")
+
+    received = []
+    with pytest.raises(RuntimeError, match="upstream broke"):
+        async for chunk in batch_records(failing(), max_delay=10.0):
+            received.append(chunk)
+    assert received == [b'{"n":0}\n']
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        stream_records(records(1), format="xml")
@@ -0,0 +1,384 @@
+"""
+Tests for the Task Store Backends
+
+Every store test runs against both backends, so InMemoryTaskStore and
+SQLiteTaskStore are held to the same behaviour.
+
+Run tests with:
+    uv add --dev pytest pytest-asyncio
+    uv run pytest test_task_store.py -v
+"""
+
+import threading
+import types
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from task_store import InMemoryTaskStore, SQLiteTaskStore, VersionConflict
+from with_pydantic_models import Task, app, call, get_store
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    """A fresh, empty store of each backend"""
+    if request.param == "sqlite":
+        store = SQLiteTaskStore(Task, str(tmp_path / "tasks.db"))
+    else:
+        store = InMemoryTaskStore(Task)
+    yield store
+    store.close()
+
+
+# ============================================================================
+# 1. CRUD
+# ============================================================================
+
+def test_create_and_get(store):
+    """New tasks get the next id, version 1 and completed=False"""
+    task = store.create_task("Write tests", "for both backends")
+    assert task.id == 1
+    assert task.version == 1
+    assert task.completed is False
+
+    fetched = store.get_task(task.id)
+    assert (fetched.title, fetched.description) == ("Write tests", "for both backends")
+
+
+def test_get_missing_task(store):
+    """Unknown ids give None, not an error"""
+    assert store.get_task(42) is None
+
+
+def test_update_changes_only_given_fields(store):
+    """Fields not in the update keep their values"""
+    task = store.create_task("Draft", "keep me")
+
+    updated = store.update_task(task.id, {"completed": True})
+    assert updated.completed is True
+    assert updated.description == "keep me"
+    assert updated.version == 2
+    assert store.get_task(task.id).completed is True
+
+
+def test_update_without_changes_writes_nothing(store):
+    """An empty update keeps the task's version and the store's"""
+    task = store.create_task("Same", None)
+    version = store.version
+
+    assert store.update_task(task.id, {}).version == 1
+    assert store.version == version
+    with pytest.raises(VersionConflict):
+        store.update_task(task.id, {}, expected_version=7)
+    assert store.update_task(42, {}) is None
+
+
+def test_update_missing_task(store):
+    """Updating an unknown id gives None"""
+    assert store.update_task(42, {"title": "Nothing"}) is None
+
+
+def test_delete(store):
+    """Deleting twice reports the task as missing the second time"""
+    task = store.create_task("Short-lived", None)
+
+    assert store.delete_task(task.id) is True
+    assert store.get_task(task.id) is None
+    assert store.delete_task(task.id) is False
+
+
+def test_every_write_moves_the_store_version(store):
+    """Response caches rely on the store version changing on each write"""
+    versions = [store.version]
+    task = store.create_task("One", None)
+    versions.append(store.version)
+    store.update_task(task.id, {"title": "Two"})
+    versions.append(store.version)
+    store.delete_task(task.id)
+    versions.append(store.version)
+
+    assert len(set(versions)) == len(versions)
+
+
+# ============================================================================
+# 2. PAGINATION AND FILTERS
+# ============================================================================
+
+def test_keyset_pages_cover_every_task_once(store):
+    """Following after_id from page to page visits each task once"""
+    for i in range(7):
+        store.create_task(f"Task {i}", None)
+
+    seen, after_id = [], 0
+    while page := store.list_tasks(after_id=after_id, limit=3):
+        seen.extend(task.id for task in page)
+        after_id = page[-1].id
+    assert seen == list(range(1, 8))
+
+
+def test_pages_skip_deleted_tasks(store):
+    """A deleted id leaves no gap in a page"""
+    for i in range(5):
+        store.create_task(f"Task {i}", None)
+    store.delete_task(2)
+
+    assert [task.id for task in store.list_tasks(after_id=1, limit=2)] == [3, 4]
+
+
+def test_filter_by_completed(store):
+    """Filters apply before the limit"""
+    for i in range(4):
+        store.create_task(f"Task {i}", None)
+    store.update_task(2, {"completed": True})
+    store.update_task(4, {"completed": True})
+
+    assert [task.id for task in store.list_tasks(completed=True)] == [2, 4]
+    assert [task.id for task in store.list_tasks(completed=False, limit=1)] == [1]
+
+
+def test_filter_by_created_at(store):
+    """created_after is inclusive, created_before exclusive"""
+    task = store.create_task("Now", None)
+
+    assert store.list_tasks(created_after=task.created_at) == [task]
+    assert store.list_tasks(created_before=task.created_at) == []
+
+
+# ============================================================================
+# 3. BATCHES
+# ============================================================================
+
+def test_batch_create_gets_contiguous_ids(store):
+    """A batch gets a block of ids, and later creates continue after it"""
+    store.create_task("Before", None)
+
+    created = store.create_tasks([("A", None), ("B", "second"), ("C", None)])
+    assert [task.id for task in created] == [2, 3, 4]
+    assert store.get_task(3).description == "second"
+    assert store.create_task("After", None).id == 5
+
+
+def test_batch_update_reports_each_item(store):
+    """A missing or stale item does not stop the rest of the batch"""
+    first, second = store.create_tasks([("A", None), ("B", None)])
+
+    results = store.update_tasks([
+        (first.id, {"completed": True}, None),
+        (42, {"completed": True}, None),
+        (second.id, {"title": "Stale"}, 7),
+    ])
+    assert results[0].completed is True
+    assert results[1] is None
+    assert isinstance(results[2], VersionConflict)
+    assert store.get_task(second.id).title == "B"
+
+
+def test_batch_delete(store):
+    """Each id in a batch delete is reported on its own"""
+    store.create_tasks([("A", None), ("B", None)])
+
+    assert store.delete_tasks([1, 42, 2]) == [True, False, True]
+    assert store.list_tasks() == []
+
+
+# ============================================================================
+# 4. VERSION CONFLICTS
+# ============================================================================
+
+def test_update_with_current_version(store):
+    """Updates with the current version go through"""
+    task = store.create_task("Original", None)
+
+    updated = store.update_task(task.id, {"title": "Mine"}, expected_version=1)
+    assert updated.version == 2
+
+
+def test_update_with_stale_version_is_rejected(store):
+    """Updates with an old version raise instead of overwriting"""
+    task = store.create_task("Original", None)
+    store.update_task(task.id, {"title": "Theirs"})
+
+    with pytest.raises(VersionConflict) as conflict:
+        store.update_task(task.id, {"title": "Mine"}, expected_version=1)
+    assert (conflict.value.expected, conflict.value.actual) == (1, 2)
+    assert store.get_task(task.id).title == "Theirs"
+
+
+def test_stale_version_of_missing_task_is_not_a_conflict(store):
+    """A missing task is reported as missing, whatever version was expected"""
+    assert store.update_task(42, {"title": "Mine"}, expected_version=1) is None
+
+
+# ============================================================================
+# 5. EVENT LOOP
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_blocking_store_calls_run_off_the_event_loop(store):
+    """SQLite calls go to the threadpool; in-memory ones stay on the loop"""
+    def current_thread(self):
+        return threading.current_thread()
+
+    thread = await call(types.MethodType(current_thread, store))
+    assert (thread is threading.current_thread()) is not store.blocking
+
+
+# ============================================================================
+# 6. API
+# ============================================================================
+
+@pytest.fixture
+def client(store):
+    """TestClient for the task API, backed by each store"""
+    app.dependency_overrides[get_store] = lambda: store
+    with TestClient(app) as client:
+        yield client
+    app.dependency_overrides.clear()
+
+
+def test_created_filters_accept_utc_offsets(client):
+    """created_after/before may carry an offset; it is converted, not compared raw"""
+    client.post("/tasks", json={"title": "Now"})
+    hour_ago = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+    in_an_hour = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+
+    response = client.get("/tasks", params={"created_after": hour_ago})
+    assert response.status_code == 200
+    assert [task["title"] for task in response.json()] == ["Now"]
+
+    response = client.get("/tasks", params={"created_after": in_an_hour})
+    assert response.json() == []
+
+    response = client.get("/tasks", params={"created_before": "2020-01-01T00:00:00Z"})
+    assert response.json() == []
+
+
+@pytest.mark.parametrize("body", [b"not json", b'{"title": "not a list"}'])
+def test_batch_rejects_a_body_that_is_not_a_json_array(client, body):
+    """A malformed batch body is a 422, not a server error"""
+    response = client.post(
+        "/tasks:batch", content=body, headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] in ("json_invalid", "list_type")
+
+
+def test_batch_reports_invalid_items_individually(client):
+    """Invalid items get their own 422; the valid ones are still created"""
+    response = client.post("/tasks:batch", json=[{"title": "Good"}, {"title": ""}])
+    assert [result["status"] for result in response.json()["results"]] == [201, 422]
+
+
+@pytest.mark.parametrize("field", ["title", "completed"])
+def test_update_rejects_null_for_required_fields(client, field):
+    """Sending null for title/completed is a 422 and leaves the task alone"""
+    client.post("/tasks", json={"title": "Keep"})
+
+    response = client.put("/tasks/1", json={field: None})
+    assert response.status_code == 422
+    assert client.get("/tasks/1").json()["title"] == "Keep"
+
+    response = client.patch("/tasks:batch", json=[{"id": 1, field: None}])
+    assert response.json()["results"][0]["status"] == 422
+    assert client.get("/tasks").json()[0]["completed"] is False
+
+
+def test_update_allows_clearing_the_description(client):
+    """description is genuinely optional, so null clears it"""
+    client.post("/tasks", json={"title": "Task", "description": "old"})
+
+    response = client.put("/tasks/1", json={"description": None})
+    assert response.status_code == 200
+    assert response.json()["description"] is None
+
+
+def test_if_match_with_a_weak_etag_is_a_precondition_failure(client):
+    """Weak tags never match under If-Match: 412, not 400"""
+    etag = client.post("/tasks", json={"title": "Task"}).headers["ETag"]
+
+    response = client.put("/tasks/1", json={"title": "New"}, headers={"If-Match": f"W/{etag}"})
+    assert response.status_code == 412
+
+    response = client.put("/tasks/1", json={"title": "New"}, headers={"If-Match": etag})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("if_match, status", [
+    ('"abc"', 412),                  # well-formed, just not ours
+    ('"abc", "zzz-1"', 412),
+    ('"abc', 400),                   # not an entity tag at all
+    ("abc", 400),
+    ('"a" "b"', 400),
+])
+def test_if_match_that_cannot_match(client, if_match, status):
+    """A list of tags that match nothing is 412; a malformed header is 400"""
+    client.post("/tasks", json={"title": "Task"})
+
+    response = client.put("/tasks/1", json={"title": "New"}, headers={"If-Match": if_match})
+    assert response.status_code == status
+    assert client.get("/tasks/1").json()["title"] == "Task"
+
+
+def test_if_match_list_containing_the_current_etag(client):
+    """Any strong tag in the list may match"""
+    old = client.post("/tasks", json={"title": "Task"}).headers["ETag"]
+    current = client.put("/tasks/1", json={"title": "Edited"}).headers["ETag"]
+
+    response = client.put(
+        "/tasks/1", json={"title": "Mine"}, headers={"If-Match": f'"abc", {old}, {current}'}
+    )
+    assert response.status_code == 200
+
+    response = client.put("/tasks/1", json={"title": "Late"}, headers={"If-Match": f"{old}, {current}"})
+    assert response.status_code == 412  # both tags are stale now
+
+
+def test_empty_update_keeps_the_etag(client):
+    """PUT {} changes nothing, so the version and ETag stay the same"""
+    etag = client.post("/tasks", json={"title": "Task"}).headers["ETag"]
+
+    response = client.put("/tasks/1", json={}, headers={"If-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == etag
+    assert client.get("/tasks/1", headers={"If-None-Match": etag}).status_code == 304
+
+
+@pytest.mark.parametrize("fast_json", ["0", "1"])
+def test_list_tasks_pages_with_and_without_fast_json(client, monkeypatch, fast_json):
+    """FAST_JSON only changes how /tasks is encoded, not what it returns"""
+    monkeypatch.setenv("FAST_JSON", fast_json)
+    client.post("/tasks:batch", json=[{"title": "A"}, {"title": "B"}, {"title": "C"}])
+
+    response = client.get("/tasks", params={"limit": 2})
+    assert [task["title"] for task in response.json()] == ["A", "B"]
+    assert response.headers["X-Next-After-Id"] == "2"
+
+    response = client.get("/tasks", params={"after_id": 2, "fields": "id,title"})
+    assert response.json() == [{"id": 3, "title": "C"}]
+
+
+@pytest.mark.parametrize("fields", ["", ",", " , ", "id,nope"])
+def test_list_tasks_rejects_empty_or_unknown_fields(client, fields):
+    """A projection must name real fields; it never yields empty objects"""
+    client.post("/tasks", json={"title": "Task"})
+
+    response = client.get("/tasks", params={"fields": fields})
+    assert response.status_code == 400
+
+
+def test_etags_from_an_earlier_copy_of_the_data_never_match(store, client):
+    """Versions restart with a new store, so ETags carry its epoch as well"""
+    etag = client.post("/tasks", json={"title": "Task"}).headers["ETag"]
+    assert client.get("/tasks/1", headers={"If-None-Match": etag}).status_code == 304
+
+    # Same ids and versions, different data: like a restarted worker
+    restarted = InMemoryTaskStore(Task)
+    restarted.create_task("Other task", None)
+    app.dependency_overrides[get_store] = lambda: restarted
+
+    response = client.get("/tasks/1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["title"] == "Other task"
+    response = client.put("/tasks/1", json={"title": "Mine"}, headers={"If-Match": etag})
+    assert response.status_code == 412
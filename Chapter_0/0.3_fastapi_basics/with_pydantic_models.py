@@ -8,20 +8,54 @@ Run with:
     uv run python with_pydantic_models.py
     # or
     uv run uvicorn with_pydantic_models:app --reload
+
+Storage is pluggable (see task_store.py). To share tasks between workers:
+    TASK_STORE=sqlite uv run uvicorn with_pydantic_models:app --workers 4
 """
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-from typing import Optional, List
+import os
+import re
+from contextlib import asynccontextmanager
+
+import json
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, field_validator
+from typing import Any, Optional, List
 from datetime import datetime
 
+from coalescing import CoalescingMiddleware, coalesce
+from fast_json import FastJSONResponse, default_response_class, fast_json_enabled
+from response_cache import ResponseCacheMiddleware, cache_response, etag_matches
+from task_store import TaskStore, InMemoryTaskStore, SQLiteTaskStore, VersionConflict
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Close the task store when the server shuts down"""
+    yield
+    store.close()
+
+
 # Create FastAPI app
 app = FastAPI(
     title="Agent Task API",
     description="FastAPI with Pydantic models",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=default_response_class()  # FAST_JSON=1 to opt in
 )
 
+# Identical concurrent requests to @coalesce routes share one handler run
+# (see coalescing.py)
+app.add_middleware(CoalescingMiddleware)
+
+# GET /tasks and /tasks/{id} responses are reused until the next write to
+# the store, and clients with a current ETag get 304 (see response_cache.py).
+# Added last: it runs first.
+app.add_middleware(ResponseCacheMiddleware)
+
 
 # Define request/response models using Pydantic
 class Task(BaseModel):
@@ -31,6 +65,7 @@ class Task(BaseModel):
     description: Optional[str] = Field(None, max_length=500)
     completed: bool = False
     created_at: datetime
+    version: int = Field(1, description="Bumped on every update; sent in the ETag")
 
 
 class TaskCreate(BaseModel):
@@ -40,75 +75,396 @@ class TaskCreate(BaseModel):
 
 
 class TaskUpdate(BaseModel):
-    """Request model for updating a task"""
-    title: Optional[str] = None
-    description: Optional[str] = None
+    """Request model for updating a task (only the fields you send change)"""
+    # Same limits as Task: updates are applied without re-validating the task
+    title: Optional[str] = Field(None, min_length=1, max_length=100)
+    description: Optional[str] = Field(None, max_length=500)
     completed: Optional[bool] = None
 
+    @field_validator("title", "completed")
+    @classmethod
+    def not_null(cls, value):
+        """Optional means "may be left out": an explicit null is rejected"""
+        if value is None:
+            raise ValueError("may be omitted, but not null")
+        return value
+
+
+# Storage backend (in-memory by default, SQLite when TASK_STORE=sqlite)
+def create_store() -> TaskStore:
+    """Build the task store selected by the TASK_STORE environment variable"""
+    backend = os.environ.get("TASK_STORE", "memory")
+    if backend == "sqlite":
+        return SQLiteTaskStore(Task, os.environ.get("TASK_DB_PATH", "tasks.db"))
+    if backend != "memory":
+        raise ValueError(f"Unknown TASK_STORE: {backend!r}")
+    return InMemoryTaskStore(Task)
+
+
+store = create_store()
+
+
+def get_store() -> TaskStore:
+    """Dependency that provides the task store (override it in tests)"""
+    return store
+
+
+async def call(method, *args, **kwargs):
+    """
+    Call a store method without stalling the event loop.
+
+    Methods of blocking stores (SQLite may wait for another worker's
+    write lock) run in the threadpool; the in-memory store is called
+    directly, since a thread hop would cost more than the call.
+    """
+    if method.__self__.blocking:
+        return await run_in_threadpool(method, *args, **kwargs)
+    return method(*args, **kwargs)
+
+
+def store_version() -> str:
+    """
+    Epoch and write counter of the store the endpoints use, for the
+    response cache (the counter alone restarts with a new store).
+
+    Called directly even for SQLite: it is a read, and in WAL mode
+    readers never wait for a writer's lock.
+    """
+    current = app.dependency_overrides.get(get_store, get_store)()
+    return f"{current.epoch}.{current.version}"
 
-# In-memory database (for demonstration)
-tasks_db: dict[int, Task] = {}
-next_id = 1
+
+def local_time(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Express a filter time the way created_at is stored: naive local time.
+
+    Clients may send an offset (2020-01-01T00:00:00Z); comparing that with
+    a naive datetime fails, and comparing ISO strings with different
+    offsets gives wrong answers.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
 
 
 @app.get("/tasks", response_model=List[Task])
-async def list_tasks():
-    """Get all tasks"""
-    return list(tasks_db.values())
+@cache_response(ttl=30, version=store_version)
+async def list_tasks(
+    response: Response,
+    after_id: int = Query(0, ge=0, description="Return tasks with id greater than this"),
+    limit: int = Query(100, ge=1, le=1000),
+    completed: Optional[bool] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields, e.g. id,title"),
+    store: TaskStore = Depends(get_store)
+):
+    """
+    Get one page of tasks (keyset pagination)
+    
+    - **after_id**: Pass the `X-Next-After-Id` header of the previous page
+    - **fields**: Only return these fields
+    """
+    projection = None
+    if fields is not None:
+        projection = {name.strip() for name in fields.split(",") if name.strip()}
+        if not projection:
+            raise HTTPException(status_code=400, detail="fields must name at least one field")
+        unknown = projection - Task.model_fields.keys()
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {sorted(unknown)}")
+    
+    page = await call(
+        store.list_tasks,
+        after_id=after_id,
+        limit=limit,
+        completed=completed,
+        created_after=local_time(created_after),
+        created_before=local_time(created_before)
+    )
+    
+    headers = {}
+    if len(page) == limit:
+        headers["X-Next-After-Id"] = str(page[-1].id)
+    
+    if projection is not None:
+        # Partial objects don't match response_model, so build the response here
+        response_class = FastJSONResponse if fast_json_enabled() else JSONResponse
+        return response_class(
+            [task.model_dump(include=projection, mode="json") for task in page],
+            headers=headers
+        )
+    
+    if fast_json_enabled():
+        # Store data is already valid: encode the page in one native pass
+        # instead of re-validating it against response_model first
+        return FastJSONResponse(page, headers=headers)
+    response.headers.update(headers)
+    return page
+
+
+def etag(task: Task, store: TaskStore) -> str:
+    """Strong ETag for a task: the store's epoch and the task's version, quoted"""
+    return f'"{store.epoch}-{task.version}"'
+
+
+# If-Match is "*" or a comma-separated list of entity tags (RFC 9110)
+ENTITY_TAG = r'\s*(W/)?"([\x21\x23-\x7e\x80-\xff]*)"\s*'
+ENTITY_TAG_LIST = re.compile(rf"{ENTITY_TAG}(?:,{ENTITY_TAG})*")
+
+
+def parse_if_match(if_match: Optional[str], store: TaskStore) -> Optional[set[int]]:
+    """
+    Turn an If-Match header into the task versions it accepts (None = any)
+
+    400 if the header isn't a list of entity tags; 412 if none of them
+    can match, i.e. every tag is weak, from another epoch or not ours.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    if not ENTITY_TAG_LIST.fullmatch(if_match):
+        raise HTTPException(
+            status_code=400, detail="If-Match must be a list of ETags, as sent in the ETag header"
+        )
+    versions = set()
+    for weak, tag in re.findall(ENTITY_TAG, if_match):
+        # Strong comparison: a weak tag never matches. Versions restart
+        # with the data, so a tag from another epoch doesn't either
+        epoch, _, version = tag.rpartition("-")
+        if not weak and epoch == store.epoch and version.isdigit():
+            versions.add(int(version))
+    if not versions:
+        raise HTTPException(status_code=412, detail="If-Match matches no current ETag")
+    return versions
+
+
+async def expected_version(if_match: Optional[str], task_id: int, store: TaskStore) -> Optional[int]:
+    """The version an update must find, from If-Match (None = any)"""
+    versions = parse_if_match(if_match, store)
+    if versions is None or len(versions) == 1:
+        return None if versions is None else next(iter(versions))
+    # Several candidates: the one the task has now, if any. The store
+    # still compares it on write, so a concurrent update gives 412
+    task = await call(store.get_task, task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if task.version not in versions:
+        raise HTTPException(status_code=412, detail="If-Match matches no current ETag")
+    return task.version
 
 
 @app.get("/tasks/{task_id}", response_model=Task)
-async def get_task(task_id: int):
-    """Get a specific task"""
-    if task_id not in tasks_db:
+@cache_response(ttl=30, version=store_version)
+@coalesce()
+async def get_task(
+    task_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    store: TaskStore = Depends(get_store)
+):
+    """
+    Get a specific task (the ETag header carries its version)
+    
+    Send `If-None-Match` with the ETag you have to get 304 if the task
+    hasn't changed, even when other tasks have.
+    """
+    task = await call(store.get_task, task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
-    return tasks_db[task_id]
+    if if_none_match is not None and etag_matches(if_none_match.encode(), etag(task, store).encode()):
+        return Response(status_code=304, headers={"ETag": etag(task, store)})
+    response.headers["ETag"] = etag(task, store)
+    return task
 
 
 @app.post("/tasks", response_model=Task, status_code=201)
-async def create_task(task: TaskCreate):
+async def create_task(task: TaskCreate, response: Response, store: TaskStore = Depends(get_store)):
     """Create a new task"""
-    global next_id
-    
-    new_task = Task(
-        id=next_id,
-        title=task.title,
-        description=task.description,
-        completed=False,
-        created_at=datetime.now()
-    )
-    
-    tasks_db[next_id] = new_task
-    next_id += 1
-    
+    new_task = await call(store.create_task, task.title, task.description)
+    response.headers["ETag"] = etag(new_task, store)
     return new_task
 
 
 @app.put("/tasks/{task_id}", response_model=Task)
-async def update_task(task_id: int, task_update: TaskUpdate):
-    """Update an existing task"""
-    if task_id not in tasks_db:
-        raise HTTPException(status_code=404, detail="Task not found")
+async def update_task(
+    task_id: int,
+    task_update: TaskUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    store: TaskStore = Depends(get_store)
+):
+    """
+    Update an existing task
     
-    existing_task = tasks_db[task_id]
-    update_data = task_update.dict(exclude_unset=True)
+    Send only the fields to change. Send `If-Match` with the ETag you
+    last saw to get 412 instead of overwriting a concurrent update.
+    """
+    update_data = task_update.model_dump(exclude_unset=True)
     
-    updated_task = existing_task.copy(update={**update_data})
-    tasks_db[task_id] = updated_task
+    version = await expected_version(if_match, task_id, store)
+    try:
+        updated_task = await call(store.update_task, task_id, update_data, version)
+    except VersionConflict as conflict:
+        raise HTTPException(status_code=412, detail=str(conflict))
+    if updated_task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
     
+    response.headers["ETag"] = etag(updated_task, store)
     return updated_task
 
 
 @app.delete("/tasks/{task_id}")
-async def delete_task(task_id: int):
+async def delete_task(task_id: int, store: TaskStore = Depends(get_store)):
     """Delete a task"""
-    if task_id not in tasks_db:
+    if not await call(store.delete_task, task_id):
         raise HTTPException(status_code=404, detail="Task not found")
-    
-    del tasks_db[task_id]
     return {"message": "Task deleted"}
 
 
+# ============================================================================
+# BATCH ENDPOINTS
+# ============================================================================
+
+class TaskBatchUpdate(TaskUpdate):
+    """One item of a PATCH /tasks:batch request"""
+    id: int
+    version: Optional[int] = Field(None, description="Expected version (like If-Match)")
+
+
+class BatchItemResult(BaseModel):
+    """Outcome of one item in a batch request"""
+    index: int
+    status: int
+    task: Optional[Task] = None
+    detail: Optional[Any] = None
+
+
+class BatchResult(BaseModel):
+    """Per-item results, in request order"""
+    results: List[BatchItemResult]
+
+
+# Built once: a TypeAdapter compiles its validator when it is created
+task_create_batch = TypeAdapter(List[TaskCreate])
+task_update_batch = TypeAdapter(List[TaskBatchUpdate])
+task_id_batch = TypeAdapter(List[int])
+
+
+def validate_batch(adapter: TypeAdapter, body: bytes) -> tuple[list, dict[int, list]]:
+    """
+    Validate a JSON array in one pass.
+
+    Returns (valid, errors): `valid` holds (index, item) pairs and `errors`
+    maps the index of each rejected item to its validation errors. Only
+    when something is invalid are the remaining items validated again.
+    """
+    try:
+        return list(enumerate(adapter.validate_json(body))), {}
+    except ValidationError as exc:
+        errors: dict[int, list] = {}
+        for error in exc.errors(include_url=False, include_context=False):
+            if not error["loc"] or not isinstance(error["loc"][0], int):
+                # The body itself is not a JSON array. Leave the input out:
+                # for invalid JSON it is the raw bytes, which can't be sent back
+                raise HTTPException(
+                    status_code=422,
+                    detail=exc.errors(include_url=False, include_input=False)
+                )
+            errors.setdefault(error["loc"][0], []).append(error)
+    
+    raw_items = json.loads(body)
+    valid_indexes = [i for i in range(len(raw_items)) if i not in errors]
+    valid_items = adapter.validate_python([raw_items[i] for i in valid_indexes])
+    return list(zip(valid_indexes, valid_items)), errors
+
+
+def batch_result(size: int, outcomes: dict[int, BatchItemResult]) -> BatchResult:
+    """Assemble per-item results in request order"""
+    return BatchResult(results=[outcomes[i] for i in range(size)])
+
+
+def error_outcomes(errors: dict[int, list]) -> dict[int, BatchItemResult]:
+    return {
+        i: BatchItemResult(index=i, status=422, detail=item_errors)
+        for i, item_errors in errors.items()
+    }
+
+
+@app.post(
+    "/tasks:batch",
+    response_model=BatchResult,
+    openapi_extra={"requestBody": {"content": {"application/json": {
+        "schema": task_create_batch.json_schema()
+    }}, "required": True}}
+)
+async def create_tasks_batch(request: Request, store: TaskStore = Depends(get_store)):
+    """
+    Create many tasks in one request
+    
+    Valid items get a contiguous block of ids; invalid items are reported
+    with status 422 and do not stop the rest of the batch.
+    """
+    valid, errors = validate_batch(task_create_batch, await request.body())
+    
+    created = await call(
+        store.create_tasks, [(item.title, item.description) for _, item in valid]
+    )
+    
+    outcomes = error_outcomes(errors)
+    for (i, _), task in zip(valid, created):
+        outcomes[i] = BatchItemResult(index=i, status=201, task=task)
+    return batch_result(len(valid) + len(errors), outcomes)
+
+
+@app.patch(
+    "/tasks:batch",
+    response_model=BatchResult,
+    openapi_extra={"requestBody": {"content": {"application/json": {
+        "schema": task_update_batch.json_schema()
+    }}, "required": True}}
+)
+async def update_tasks_batch(request: Request, store: TaskStore = Depends(get_store)):
+    """Update many tasks in one request (each item carries its id)"""
+    valid, errors = validate_batch(task_update_batch, await request.body())
+    
+    updated = await call(store.update_tasks, [
+        (item.id, item.model_dump(exclude_unset=True, exclude={"id", "version"}), item.version)
+        for _, item in valid
+    ])
+    
+    outcomes = error_outcomes(errors)
+    for (i, _), task in zip(valid, updated):
+        if task is None:
+            outcomes[i] = BatchItemResult(index=i, status=404, detail="Task not found")
+        elif isinstance(task, VersionConflict):
+            outcomes[i] = BatchItemResult(index=i, status=412, detail=str(task))
+        else:
+            outcomes[i] = BatchItemResult(index=i, status=200, task=task)
+    return batch_result(len(valid) + len(errors), outcomes)
+
+
+@app.delete(
+    "/tasks:batch",
+    response_model=BatchResult,
+    openapi_extra={"requestBody": {"content": {"application/json": {
+        "schema": task_id_batch.json_schema()
+    }}, "required": True}}
+)
+async def delete_tasks_batch(request: Request, store: TaskStore = Depends(get_store)):
+    """Delete many tasks in one request (body is a JSON array of ids)"""
+    valid, errors = validate_batch(task_id_batch, await request.body())
+    
+    deleted = await call(store.delete_tasks, [task_id for _, task_id in valid])
+    
+    outcomes = error_outcomes(errors)
+    for (i, _), found in zip(valid, deleted):
+        if found:
+            outcomes[i] = BatchItemResult(index=i, status=200)
+        else:
+            outcomes[i] = BatchItemResult(index=i, status=404, detail="Task not found")
+    return batch_result(len(valid) + len(errors), outcomes)
+
+
 @app.get("/")
 async def root():
     """Root endpoint with API info"""
@@ -117,11 +473,14 @@ async def root():
         "version": "0.1.0",
         "docs": "/docs",
         "endpoints": {
-            "list_tasks": "GET /tasks",
+            "list_tasks": "GET /tasks?after_id=&limit=&fields=",
             "get_task": "GET /tasks/{task_id}",
             "create_task": "POST /tasks",
             "update_task": "PUT /tasks/{task_id}",
-            "delete_task": "DELETE /tasks/{task_id}"
+            "delete_task": "DELETE /tasks/{task_id}",
+            "create_tasks_batch": "POST /tasks:batch",
+            "update_tasks_batch": "PATCH /tasks:batch",
+            "delete_tasks_batch": "DELETE /tasks:batch"
         }
     }
 
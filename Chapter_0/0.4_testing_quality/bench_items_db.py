@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Memory of items_db at 1M Items
+
+Fills each layout with the same items, in a fresh process each, and
+reports how much resident memory (RSS) the items added:
+
+- dict:     the original dict-of-dicts items_db (no search index)
+- columnar: ColumnarItemStore from test_fastapi.py on its own
+- app:      ColumnarItemStore plus the ItemIndex /search keeps next to
+            it - what the app actually holds per item
+
+Run with:
+    uv run python bench_items_db.py
+    uv run python bench_items_db.py --items 100000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource  # no /proc (macOS): peak RSS is the best we have
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def fill(store: str, items: int) -> dict:
+    """Runs in a child process: fill one store and measure"""
+    from test_fastapi import ColumnarItemStore, ItemIndex
+
+    db = {} if store == "dict" else ColumnarItemStore()
+    index = ItemIndex() if store == "app" else None
+    before = rss_bytes()
+    for i in range(1, items + 1):
+        db[i] = {"name": f"Item {i}", "price": i * 0.01, "tax": 0.1}
+        if index is not None:
+            index.add(i, db[i])
+    return {"store": store, "items": len(db), "rss_bytes": rss_bytes() - before}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=1_000_000)
+    parser.add_argument("--child", choices=["dict", "columnar", "app"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(fill(args.child, args.items)))
+        return
+
+    results = []
+    for store in ("dict", "columnar", "app"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", store, "--items", str(args.items)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        results.append(json.loads(output.splitlines()[-1]))
+
+    print(f"{'store':<10} {'items':>10} {'RSS MB':>10} {'bytes/item':>12}")
+    for result in results:
+        print(
+            f"{result['store']:<10} {result['items']:>10} "
+            f"{result['rss_bytes'] / 2**20:>10.1f} {result['rss_bytes'] / result['items']:>12.0f}"
+        )
+    print(f"\nreduction, dict -> app: {results[0]['rss_bytes'] / results[2]['rss_bytes']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
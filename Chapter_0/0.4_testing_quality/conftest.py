@@ -8,9 +8,21 @@ Run all tests with:
     uv run pytest -v
 """
 
+import asyncio
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+
 import pytest
+from hypothesis import HealthCheck, is_hypothesis_test, settings
+from hypothesis.database import DirectoryBasedExampleDatabase
 from unittest.mock import Mock
 
+# Sharded / parallel runs: pytest --workers 4 (see sharding.py)
+pytest_plugins = ["sharding"]
+
 
 # ============================================================================
 # DATABASE FIXTURES
@@ -95,6 +107,10 @@ def pytest_configure(config):
         "markers",
         "llm: mark test as requiring LLM (mocked)"
     )
+    config.addinivalue_line(
+        "markers",
+        "perf: mark test as a performance benchmark (uses the benchmark fixture)"
+    )
 
 
 # ============================================================================
@@ -119,3 +135,274 @@ def pytest_collection_modifyitems(config, items):
         # Mark LLM tests
         if "llm" in item.nodeid:
             item.add_marker(pytest.mark.llm)
+
+
+# ============================================================================
+# PERFORMANCE BENCHMARKS
+# ============================================================================
+#
+#   @pytest.mark.perf
+#   def test_search_speed(benchmark):
+#       benchmark(search, "widget")          # sync callables and coroutines
+#
+# Each benchmark is compared with benchmarks.json (committed). The test
+# fails when its median is more than --benchmark-threshold slower.
+# Timings are divided by a fixed reference workload measured in the same
+# session, so a baseline recorded on one machine works on another.
+#
+#   uv run pytest -m perf                          # run only the benchmarks
+#   uv run pytest -m perf --benchmark-save         # record a new baseline
+#   uv run pytest -m "not perf"                    # skip them
+
+BASELINE_FILE = Path(__file__).with_name("benchmarks.json")
+results_key = pytest.StashKey[dict]()
+reference_key = pytest.StashKey[float]()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmark")
+    group.addoption(
+        "--benchmark-baseline", default=str(BASELINE_FILE),
+        help="baseline file to compare benchmark medians against"
+    )
+    group.addoption(
+        "--benchmark-threshold", type=float, default=0.5,
+        help="fail when a median is this much slower than the baseline (0.5 = 50%%)"
+    )
+    group.addoption(
+        "--benchmark-save", action="store_true",
+        help="write this run's benchmark results into the baseline file"
+    )
+
+
+def summarize(samples: list[float], iterations: int) -> dict:
+    """Median and MAD: unlike mean and stdev, a few slow rounds don't move them"""
+    median = statistics.median(samples)
+    mad = statistics.median(abs(sample - median) for sample in samples)
+    # 1.4826 * MAD estimates the standard deviation for normal data
+    outliers = [s for s in samples if abs(s - median) > 3 * 1.4826 * mad] if mad else []
+    return {
+        "median": median,
+        "mad": mad,
+        "min": min(samples),
+        "max": max(samples),
+        "rounds": len(samples),
+        "iterations": iterations,
+        "outliers": len(outliers),
+    }
+
+
+def calibrated_rounds(time_round, rounds: int, min_round_time: float) -> tuple[list[float], int]:
+    """
+    Pick an iteration count so one round takes at least min_round_time
+    (timer resolution and call overhead stop mattering), then time
+    `rounds` rounds. time_round(n) runs n iterations and returns seconds.
+    """
+    iterations = 1
+    while True:
+        elapsed = time_round(iterations)
+        if elapsed >= min_round_time or iterations >= 1_000_000:
+            break
+        iterations *= 2 if elapsed == 0 else max(2, int(min_round_time / elapsed * 1.2))
+    return [time_round(iterations) / iterations for _ in range(rounds)], iterations
+
+
+class Benchmark:
+    """Times a callable or coroutine function; see the benchmark fixture"""
+    def __init__(self, rounds: int = 15, warmup: int = 3, min_round_time: float = 0.005):
+        self.rounds = rounds
+        self.warmup = warmup
+        self.min_round_time = min_round_time
+        self.stats = None
+    
+    def __call__(self, func, *args, **kwargs):
+        if asyncio.iscoroutinefunction(func):
+            return self._run_async(func, *args, **kwargs)
+        
+        def time_round(n: int) -> float:
+            start = time.perf_counter()
+            for _ in range(n):
+                func(*args, **kwargs)
+            return time.perf_counter() - start
+        
+        for _ in range(self.warmup):
+            func(*args, **kwargs)
+        samples, iterations = calibrated_rounds(time_round, self.rounds, self.min_round_time)
+        self.stats = summarize(samples, iterations)
+        return func(*args, **kwargs)
+    
+    def _run_async(self, func, *args, **kwargs):
+        loop = asyncio.new_event_loop()
+        
+        async def timed(n: int) -> float:
+            # Timed inside the loop, so run_until_complete isn't measured
+            start = time.perf_counter()
+            for _ in range(n):
+                await func(*args, **kwargs)
+            return time.perf_counter() - start
+        
+        try:
+            for _ in range(self.warmup):
+                loop.run_until_complete(func(*args, **kwargs))
+            samples, iterations = calibrated_rounds(
+                lambda n: loop.run_until_complete(timed(n)), self.rounds, self.min_round_time
+            )
+            self.stats = summarize(samples, iterations)
+            return loop.run_until_complete(func(*args, **kwargs))
+        finally:
+            loop.close()
+
+
+def reference_workload():
+    """Fixed pure-Python work used to measure how fast this machine is"""
+    total = 0
+    for i in range(10_000):
+        total += i * i % 7
+    return total
+
+
+def machine_reference(config) -> float:
+    if reference_key not in config.stash:
+        bench = Benchmark(rounds=9)
+        bench(reference_workload)
+        config.stash[reference_key] = bench.stats["median"]
+    return config.stash[reference_key]
+
+
+def load_baseline(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"reference": None, "benchmarks": {}}
+
+
+@pytest.fixture
+def benchmark(request):
+    """
+    Call benchmark(func, *args) to time func and check it against the baseline.
+    
+    Runs warmup calls, calibrates iterations per round, times several
+    rounds and records median/MAD under the test's node id.
+    """
+    bench = Benchmark()
+    yield bench
+    if bench.stats is None:
+        return
+    
+    config = request.config
+    reference = machine_reference(config)
+    stats = {**bench.stats, "relative": bench.stats["median"] / reference}
+    config.stash.setdefault(results_key, {})[request.node.nodeid] = stats
+    
+    baseline = load_baseline(config.getoption("benchmark_baseline"))
+    before = baseline["benchmarks"].get(request.node.nodeid)
+    if before is None or config.getoption("benchmark_save"):
+        return
+    threshold = config.getoption("benchmark_threshold")
+    change = stats["relative"] / before["relative"] - 1
+    if change > threshold:
+        pytest.fail(
+            f"Benchmark regressed {change:+.0%} (threshold {threshold:.0%}): "
+            f"median {stats['median'] * 1e6:.1f}us, "
+            f"baseline {before['relative'] * reference * 1e6:.1f}us on this machine",
+            pytrace=False
+        )
+
+
+def pytest_sessionfinish(session):
+    results = session.config.stash.get(results_key, {})
+    if not results:
+        return
+    cache = getattr(session.config, "cache", None)  # None with -p no:cacheprovider
+    if cache is not None:
+        cache.set("benchmark/results", results)
+    if session.config.getoption("benchmark_save"):
+        path = session.config.getoption("benchmark_baseline")
+        baseline = load_baseline(path)
+        baseline["reference"] = session.config.stash[reference_key]
+        for nodeid, stats in results.items():
+            baseline["benchmarks"][nodeid] = {
+                "median": stats["median"], "mad": stats["mad"], "relative": stats["relative"]
+            }
+        with open(path, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+# ============================================================================
+# PROPERTY TESTS (HYPOTHESIS PROFILES)
+# ============================================================================
+#
+# Every profile shares one example database next to this file, so a
+# failure found by any run (or any --workers process) is replayed first
+# by every later run, before new examples are generated. Without
+# HYPOTHESIS_PROFILE, Hypothesis's own defaults apply (100 examples).
+#
+#   HYPOTHESIS_PROFILE=dev uv run pytest test_property_based.py     # quick
+#   HYPOTHESIS_PROFILE=nightly uv run pytest test_property_based.py
+#   uv run pytest --hypothesis-profile ci                        # same examples every run
+#   uv run pytest --hypothesis-show-statistics                   # generation vs test time
+
+HYPOTHESIS_DB = DirectoryBasedExampleDatabase(Path(__file__).with_name(".hypothesis") / "examples")
+SLOWEST_PROPERTY_TESTS = 5
+property_times_key = pytest.StashKey[dict]()
+
+# Replays saved failures, then only a few new examples: for pre-commit.
+# The hook sets the profile itself, e.g. in .pre-commit-config.yaml:
+#   - id: property-tests
+#     name: property tests
+#     entry: env HYPOTHESIS_PROFILE=dev uv run pytest test_property_based.py
+#     language: system
+#     pass_filenames: false
+settings.register_profile("dev", max_examples=20, database=HYPOTHESIS_DB)
+# Fixed seed and no database: every run tries the same examples
+settings.register_profile("ci", derandomize=True, database=None)
+# Digs deep, and saves what it finds for dev runs to replay
+settings.register_profile(
+    "nightly",
+    max_examples=2000,
+    deadline=None,
+    database=HYPOTHESIS_DB,
+    suppress_health_check=[HealthCheck.too_slow]
+)
+if "HYPOTHESIS_PROFILE" in os.environ:
+    settings.load_profile(os.environ["HYPOTHESIS_PROFILE"])
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    """Time each property test (generation, shrinking and test body)"""
+    start = time.perf_counter()
+    yield
+    if is_hypothesis_test(getattr(item, "obj", None)):
+        item.config.stash.setdefault(property_times_key, {})[item.nodeid] = (
+            time.perf_counter() - start
+        )
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    results = config.stash.get(results_key, {})
+    if results:
+        terminalreporter.section("benchmarks")
+        for nodeid, stats in sorted(results.items()):
+            terminalreporter.write_line(
+                f"{stats['median'] * 1e6:10.1f}us  \u00b1{stats['mad'] * 1e6:8.1f}us  "
+                f"({stats['rounds']}x{stats['iterations']})  {nodeid}"
+            )
+    
+    times = config.stash.get(property_times_key, {})
+    if times:
+        terminalreporter.section(
+            f"slowest property tests (hypothesis profile {settings.get_current_profile_name()!r})"
+        )
+        total = sum(times.values())
+        slowest = sorted(times.items(), key=lambda entry: entry[1], reverse=True)
+        for nodeid, seconds in slowest[:SLOWEST_PROPERTY_TESTS]:
+            terminalreporter.write_line(
+                f"{seconds * 1000:10.1f}ms  {seconds / total:4.0%}  {nodeid}"
+            )
+        terminalreporter.write_line(
+            f"{total * 1000:10.1f}ms  in {len(times)} property tests "
+            "(--hypothesis-show-statistics splits generation from test time)"
+        )
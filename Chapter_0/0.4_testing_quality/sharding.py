@@ -0,0 +1,300 @@
+"""
+Sharded, Parallel Test Runs
+
+A pytest plugin (loaded from conftest.py) that splits the suite into
+shards and runs them in parallel worker processes, or runs one shard of
+a CI matrix:
+
+    uv run pytest --workers 4             # 4 local worker processes
+    uv run pytest --workers auto          # one per CPU core
+    uv run pytest --shard-count 3 --shard-index 0   # CI job 1 of 3
+    uv run pytest --workers 4 --shard-plan          # show the plan only
+
+How tests are split:
+- Tests that use a module-scoped (or wider) fixture from this project
+  stay together, so the fixture is built once, in one worker
+- Every other test can go to any shard
+- Shards are balanced with the durations recorded by earlier full runs
+  (kept in .pytest_cache), largest group first onto the least-loaded
+  shard (LPT scheduling). Tests without a recorded duration count as
+  the median of the known ones
+"""
+
+import argparse
+import heapq
+import inspect
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+DURATIONS_KEY = "sharding/durations"
+DEFAULT_DURATION = 0.01
+SHARED_SCOPES = ("module", "package", "session")
+
+# Our options, and whether each takes a value (stripped from worker command lines)
+OPTIONS = {
+    "--workers": True,
+    "--shard-count": True,
+    "--shard-index": True,
+    "--shard-plan": False,
+    "--shard-worker": True,
+    "--shard-nodeids": True,
+}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("sharding")
+    group.addoption(
+        "--workers", default=None,
+        help="run the tests in N worker processes ('auto' = one per CPU)"
+    )
+    group.addoption("--shard-count", type=int, default=None, help="split the tests into N shards")
+    group.addoption("--shard-index", type=int, default=None, help="run only this shard (0-based)")
+    group.addoption("--shard-plan", action="store_true", help="print the shard plan and exit")
+    # Internal: set on the command lines of worker processes
+    group.addoption("--shard-worker", default=None, help=argparse.SUPPRESS)
+    group.addoption("--shard-nodeids", default=None, help=argparse.SUPPRESS)
+
+
+# ============================================================================
+# 1. GROUPING AND BALANCING
+# ============================================================================
+
+def project_fixture(fixturedef, rootdir: Path) -> bool:
+    """True for fixtures defined in this project (not pytest or plugins)"""
+    try:
+        source = Path(inspect.getsourcefile(fixturedef.func)).resolve()
+    except (TypeError, OSError):
+        return False
+    return rootdir in source.parents and "site-packages" not in source.parts
+
+
+def group_items(items: list, rootdir: Path) -> dict[str, list]:
+    """Map group name -> items that must run in the same process"""
+    shared_modules = set()
+    for item in items:
+        fixtureinfo = getattr(item, "_fixtureinfo", None)
+        if fixtureinfo is None:
+            continue
+        for fixturedefs in fixtureinfo.name2fixturedefs.values():
+            fixturedef = fixturedefs[-1]
+            if fixturedef.scope in SHARED_SCOPES and project_fixture(fixturedef, rootdir):
+                shared_modules.add(item.nodeid.split("::")[0])
+
+    groups: dict[str, list] = {}
+    for item in items:
+        module = item.nodeid.split("::")[0]
+        key = module if module in shared_modules else item.nodeid
+        groups.setdefault(key, []).append(item)
+    return groups
+
+
+def plan_shards(groups: dict[str, list], durations: dict[str, float], shards: int) -> list[dict]:
+    """
+    Longest-processing-time-first: hand the most expensive remaining
+    group to the shard with the least work so far.
+    """
+    known = [d for d in durations.values() if d > 0]
+    default = statistics.median(known) if known else DEFAULT_DURATION
+    costs = {
+        key: sum(durations.get(item.nodeid, default) for item in items)
+        for key, items in groups.items()
+    }
+
+    plan = [{"index": i, "seconds": 0.0, "items": []} for i in range(shards)]
+    heap = [(0.0, i) for i in range(shards)]
+    for key in sorted(groups, key=lambda key: (-costs[key], key)):
+        seconds, index = heapq.heappop(heap)
+        plan[index]["items"].extend(groups[key])
+        plan[index]["seconds"] = seconds + costs[key]
+        heapq.heappush(heap, (plan[index]["seconds"], index))
+    return plan
+
+
+def worker_count(value: Optional[str]) -> int:
+    if value is None:
+        return 0
+    return os.cpu_count() or 1 if value == "auto" else int(value)
+
+
+# ============================================================================
+# 2. COLLECTION: PICK THIS PROCESS'S TESTS
+# ============================================================================
+
+def pytest_collection_modifyitems(config, items):
+    nodeids_file = config.getoption("shard_nodeids")
+    if nodeids_file:
+        # Worker process: run exactly the tests the parent planned for us
+        with open(nodeids_file) as f:
+            wanted = set(json.load(f))
+        deselect(config, items, lambda item: item.nodeid in wanted)
+        return
+
+    shards = config.getoption("shard_count")
+    index = config.getoption("shard_index")
+    if shards and index is not None and not worker_count(config.getoption("workers")):
+        if not 0 <= index < shards:
+            raise pytest.UsageError(f"--shard-index must be between 0 and {shards - 1}")
+        plan = build_plan(config, items, shards)
+        selected = {item.nodeid for item in plan[index]["items"]}
+        deselect(config, items, lambda item: item.nodeid in selected)
+
+
+def deselect(config, items: list, keep):
+    kept = [item for item in items if keep(item)]
+    dropped = [item for item in items if not keep(item)]
+    if dropped:
+        config.hook.pytest_deselected(items=dropped)
+        items[:] = kept
+
+
+def build_plan(config, items: list, shards: int) -> list[dict]:
+    cache = getattr(config, "cache", None)
+    durations = cache.get(DURATIONS_KEY, {}) if cache else {}
+    return plan_shards(group_items(items, Path(str(config.rootpath)).resolve()), durations, shards)
+
+
+# ============================================================================
+# 3. RUNNING SHARDS IN WORKER PROCESSES
+# ============================================================================
+
+def worker_args(config) -> list[str]:
+    """The original command line without our options"""
+    args, skip = [], False
+    for arg in config.invocation_params.args:
+        if skip:
+            skip = False
+            continue
+        name = arg.split("=", 1)[0]
+        if name in OPTIONS:
+            skip = OPTIONS[name] and "=" not in arg
+            continue
+        args.append(arg)
+    return args
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtestloop(session):
+    config = session.config
+    workers = worker_count(config.getoption("workers"))
+    plan_only = config.getoption("shard_plan")
+    if (workers < 2 and not plan_only) or config.getoption("shard_nodeids"):
+        return None  # normal in-process run
+    if session.config.option.collectonly:
+        return None
+
+    shards = workers if workers >= 2 else (config.getoption("shard_count") or 2)
+    plan = build_plan(config, session.items, shards)
+    reporter = config.pluginmanager.get_plugin("terminalreporter")
+    for shard in plan:
+        reporter.write_line(
+            f"shard {shard['index']}: {len(shard['items'])} tests, ~{shard['seconds']:.2f}s"
+        )
+    if plan_only:
+        return True
+
+    with tempfile.TemporaryDirectory(prefix="shards-") as tmp:
+        processes = []
+        for shard in plan:
+            if not shard["items"]:
+                continue
+            nodeids = os.path.join(tmp, f"nodeids-{shard['index']}.json")
+            report = os.path.join(tmp, f"report-{shard['index']}.json")
+            with open(nodeids, "w") as f:
+                json.dump([item.nodeid for item in shard["items"]], f)
+            command = [
+                sys.executable, "-m", "pytest", *worker_args(config),
+                # "--opt=value": a separate value would be taken for a test path
+                # before conftest.py has registered the option
+                f"--shard-nodeids={nodeids}", f"--shard-worker={report}",
+                "-p", "no:cacheprovider",
+            ]
+            processes.append((report, subprocess.Popen(
+                command, cwd=config.invocation_params.dir,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+            )))
+
+        durations = {}
+        for report, process in processes:
+            output = process.communicate()[0]
+            if not os.path.exists(report):
+                pytest.exit(
+                    f"Worker crashed:\n{output.decode(errors='replace')}",
+                    returncode=pytest.ExitCode.INTERNAL_ERROR
+                )
+            with open(report) as f:
+                for entry in json.load(f):
+                    replay(config, entry)
+                    durations[entry["nodeid"]] = durations.get(entry["nodeid"], 0.0) + entry["duration"]
+                    if entry["outcome"] == "failed":
+                        session.testsfailed += 1
+
+    record_durations(config, durations)
+    return True
+
+
+def replay(config, entry: dict):
+    """Feed a worker's result to this process's reporting hooks"""
+    if isinstance(entry["longrepr"], list):
+        # A skip's (path, lineno, reason): JSON brought it back as a list
+        entry["longrepr"] = tuple(entry["longrepr"])
+    report = config.hook.pytest_report_from_serializable(config=config, data=entry)
+    config.hook.pytest_runtest_logreport(report=report)
+
+
+# ============================================================================
+# 4. RECORDING RESULTS AND DURATIONS
+# ============================================================================
+
+class Recorder:
+    """Collects per-test durations (and, in workers, results for the parent)"""
+
+    def __init__(self, config):
+        self.config = config
+        self.durations: dict[str, float] = {}
+        self.reports: list[dict] = []
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_runtest_logreport(self, report):
+        self.durations[report.nodeid] = self.durations.get(report.nodeid, 0.0) + report.duration
+        # Keep the call phase, and setup/teardown only when they did not pass
+        if report.when == "call" or report.outcome != "passed":
+            # The whole report, as pytest-xdist sends it: the parent's
+            # summary needs e.g. a skip's (path, lineno, reason) tuple
+            self.reports.append(self.config.hook.pytest_report_to_serializable(
+                config=self.config, report=report
+            ))
+
+
+def pytest_configure(config):
+    recorder = Recorder(config)
+    config.pluginmanager.register(recorder, "sharding-recorder")
+
+
+def pytest_sessionfinish(session):
+    config = session.config
+    recorder = config.pluginmanager.get_plugin("sharding-recorder")
+    worker_report = config.getoption("shard_worker")
+    if worker_report:
+        with open(worker_report, "w") as f:
+            json.dump(recorder.reports, f)
+    elif not worker_count(config.getoption("workers")) and config.getoption("shard_index") is None:
+        # Only full runs record durations: shards of one CI matrix must all
+        # plan from the same numbers, or they would overlap or miss tests
+        record_durations(config, recorder.durations)
+
+
+def record_durations(config, durations: dict[str, float]):
+    """Merge this run's durations into the ones kept in .pytest_cache"""
+    if not durations or getattr(config, "cache", None) is None:
+        return
+    stored = config.cache.get(DURATIONS_KEY, {})
+    stored.update(durations)
+    config.cache.set(DURATIONS_KEY, stored)
@@ -9,8 +9,14 @@ Run tests with:
     uv run pytest test_fastapi.py -v
 """
 
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterator, MutableMapping
+
+import httpx
 import pytest
-from fastapi import FastAPI
+import pytest_asyncio
+from fastapi import FastAPI, Query
 from fastapi.testclient import TestClient
 from pydantic import BaseModel
 
@@ -25,10 +31,267 @@ class Item(BaseModel):
     tax: float = 0.1
 
 
+class ColumnarItemStore(MutableMapping):
+    """
+    items_db as columns instead of one dict per item.
+    
+    Item ids are handed out in order, so row = id - 1 and no id -> row
+    map is needed. Prices and taxes live in array('d') columns, names
+    as UTF-8 bytes in one shared buffer (start/length per row), and
+    deleted rows are flagged in `alive`. That's ~40 bytes per item
+    instead of several hundred for a dict of boxed values.
+    
+    It behaves like the dict it replaces: items_db[id] builds the item
+    dict only when a row is actually read (e.g. for a response).
+    """
+    def __init__(self):
+        self.clear()
+    
+    def clear(self):
+        self.prices = array("d")
+        self.taxes = array("d")
+        self.name_starts = array("Q")
+        self.name_lengths = array("I")
+        self.name_bytes = bytearray()
+        self.alive = bytearray()
+        self.count = 0
+    
+    def snapshot(self) -> tuple:
+        """Copy the columns (flat buffers, so this is a few memcpys)"""
+        return (
+            self.prices[:], self.taxes[:], self.name_starts[:], self.name_lengths[:],
+            self.name_bytes[:], self.alive[:], self.count
+        )
+    
+    def restore(self, snapshot: tuple):
+        """Go back to a snapshot(); the snapshot stays reusable"""
+        prices, taxes, name_starts, name_lengths, name_bytes, alive, self.count = snapshot
+        self.prices, self.taxes = prices[:], taxes[:]
+        self.name_starts, self.name_lengths = name_starts[:], name_lengths[:]
+        self.name_bytes, self.alive = name_bytes[:], alive[:]
+    
+    def _row(self, item_id: int) -> int:
+        row = item_id - 1
+        if not (0 <= row < len(self.alive) and self.alive[row]):
+            raise KeyError(item_id)
+        return row
+    
+    def __setitem__(self, item_id: int, item):
+        if item_id < 1:
+            raise KeyError(item_id)
+        if isinstance(item, BaseModel):
+            item = item.model_dump()
+        row = item_id - 1
+        while len(self.alive) <= row:  # ids skipped so far become dead rows
+            self.prices.append(0.0)
+            self.taxes.append(0.0)
+            self.name_starts.append(0)
+            self.name_lengths.append(0)
+            self.alive.append(0)
+        
+        name = item["name"].encode()
+        # Appended, never overwritten in place: a replaced name's old
+        # bytes stay behind, which is fine for an append-mostly store
+        self.name_starts[row] = len(self.name_bytes)
+        self.name_lengths[row] = len(name)
+        self.name_bytes += name
+        self.prices[row] = item["price"]
+        self.taxes[row] = item.get("tax", 0.1)
+        if not self.alive[row]:
+            self.alive[row] = 1
+            self.count += 1
+    
+    def __getitem__(self, item_id: int) -> dict:
+        row = self._row(item_id)
+        return {"name": self.name(item_id), "price": self.prices[row], "tax": self.taxes[row]}
+    
+    def __delitem__(self, item_id: int):
+        self.alive[self._row(item_id)] = 0
+        self.count -= 1
+    
+    def __contains__(self, item_id) -> bool:
+        row = item_id - 1 if isinstance(item_id, int) else -1
+        return 0 <= row < len(self.alive) and bool(self.alive[row])
+    
+    def __iter__(self):
+        return (row + 1 for row, alive in enumerate(self.alive) if alive)
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    # Column access without building a dict
+    
+    def price(self, item_id: int) -> float:
+        return self.prices[self._row(item_id)]
+    
+    def name(self, item_id: int) -> str:
+        row = self._row(item_id)
+        start = self.name_starts[row]
+        return self.name_bytes[start:start + self.name_lengths[row]].decode()
+    
+    def item(self, item_id: int) -> Item:
+        """Materialize a row as an Item model (trusted data, no validation)"""
+        return Item.model_construct(**self[item_id])
+
+
+class ItemIndex:
+    """
+    Secondary indexes over items_db for /search, kept in flat arrays like
+    the store itself (a dict of sets and tuples per item would cost more
+    than the items).
+    
+    - price_keys/price_ids: (price, id) pairs in sorted order, so
+              "price >= x" is one bisect
+    - grams:  trigram -> ids (ascending) of items whose name contains it,
+              so a name substring query only looks at items sharing its
+              trigrams
+    - names:  every lowercased name in one NUL-separated UTF-8 buffer,
+              row = id - 1; a scan is bytes.find() over the buffer
+              instead of a Python loop over items
+    
+    Items must be added in id order, as items_db hands ids out.
+    """
+    def __init__(self):
+        self.clear()
+    
+    def clear(self):
+        self.price_keys = array("d")
+        self.price_ids = array("I")
+        self.grams: dict[bytes, array] = {}
+        self.names = bytearray()
+        self.name_starts = array("Q")
+        self.name_lengths = array("I")
+        self.count = 0
+    
+    def snapshot(self) -> tuple:
+        return (
+            self.price_keys[:], self.price_ids[:],
+            {gram: ids[:] for gram, ids in self.grams.items()},
+            self.names[:], self.name_starts[:], self.name_lengths[:], self.count
+        )
+    
+    def restore(self, snapshot: tuple):
+        price_keys, price_ids, grams, names, name_starts, name_lengths, self.count = snapshot
+        self.price_keys, self.price_ids = price_keys[:], price_ids[:]
+        self.grams = {gram: ids[:] for gram, ids in grams.items()}
+        self.names = names[:]
+        self.name_starts, self.name_lengths = name_starts[:], name_lengths[:]
+    
+    @staticmethod
+    def trigrams(text: bytes) -> set[bytes]:
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+    
+    def add(self, item_id: int, item: dict):
+        row = item_id - 1
+        if row < len(self.name_starts):
+            raise ValueError(f"Item {item_id} added out of id order")
+        while len(self.name_starts) < row:  # skipped ids: empty rows
+            self.name_starts.append(len(self.names))
+            self.name_lengths.append(0)
+        name = item["name"].lower().encode()
+        self.name_starts.append(len(self.names))
+        self.name_lengths.append(len(name))
+        self.names += name + b"\0"
+        
+        # Equal prices keep id order: a new id is the largest so far
+        i = bisect_right(self.price_keys, item["price"])
+        self.price_keys.insert(i, item["price"])
+        self.price_ids.insert(i, item_id)
+        for gram in self.trigrams(name):
+            self.grams.setdefault(gram, array("I")).append(item_id)
+        self.count += 1
+    
+    def remove(self, item_id: int, item: dict):
+        row = item_id - 1
+        start, length = self.name_starts[row], self.name_lengths[row]
+        name = bytes(self.names[start:start + length])
+        self.names[start:start + length] = bytes(length)  # NULs never match a query
+        
+        low = bisect_left(self.price_keys, item["price"])
+        i = low + self.price_ids[low:bisect_right(self.price_keys, item["price"])].index(item_id)
+        del self.price_keys[i]
+        del self.price_ids[i]
+        for gram in self.trigrams(name):
+            ids = self.grams[gram]
+            ids.remove(item_id)
+            if not ids:
+                del self.grams[gram]
+        self.count -= 1
+    
+    def plan(self, query: str, min_price: float, wanted: int) -> str:
+        """
+        Pick the cheapest way to find `wanted` matches:
+        
+        - "text":  check the items with the query's rarest trigram
+                   (queries of 3+ characters)
+        - "price": walk the price index from min_price
+        - "scan":  walk items in id order and stop after `wanted` matches,
+                   best when most items match anyway
+        """
+        total = self.count
+        estimates = {"price": len(self.price_keys) - bisect_left(self.price_keys, min_price)}
+        grams = self.trigrams(query.lower().encode())
+        if grams:
+            estimates["text"] = min(len(self.grams.get(gram, ())) for gram in grams)
+        plan, candidates = min(estimates.items(), key=lambda entry: entry[1])
+        # Matches are spread over the id range, so a scan reads about
+        # wanted * total / candidates items before it can stop
+        if candidates and wanted * total / candidates <= candidates:
+            return "scan"
+        return plan
+    
+    def search(self, query: str, min_price: float, offset: int, limit: int) -> list[int]:
+        """Ids (in insertion order) of items matching the query, one page"""
+        needle = query.lower().encode()
+        if b"\0" in needle:
+            return []
+        wanted = offset + limit
+        plan = self.plan(query, min_price, wanted)
+        
+        if plan == "scan":
+            matches = []
+            for item_id in self._scan(needle):
+                if items_db.price(item_id) >= min_price:
+                    matches.append(item_id)
+                    if len(matches) == wanted:
+                        break
+            return matches[offset:]
+        
+        if plan == "text":
+            # The rarest trigram's postings are enough: the substring
+            # check below implies all the other trigrams
+            candidates = min((self.grams.get(gram, ()) for gram in self.trigrams(needle)), key=len)
+        else:
+            candidates = self.price_ids[bisect_left(self.price_keys, min_price):]
+        
+        matches = [
+            item_id for item_id in sorted(candidates)
+            if self._contains(item_id, needle) and items_db.price(item_id) >= min_price
+        ]
+        return matches[offset:wanted]
+    
+    def _scan(self, needle: bytes) -> Iterator[int]:
+        """Ids of items whose name contains needle, in id order"""
+        if not needle:
+            yield from (item_id for item_id in range(1, len(self.name_starts) + 1) if item_id in items_db)
+            return
+        position = self.names.find(needle)
+        while position >= 0:
+            row = bisect_right(self.name_starts, position) - 1
+            yield row + 1
+            # Continue after this name: one hit per item
+            position = self.names.find(needle, self.name_starts[row] + self.name_lengths[row] + 1)
+    
+    def _contains(self, item_id: int, needle: bytes) -> bool:
+        start = self.name_starts[item_id - 1]
+        return self.names.find(needle, start, start + self.name_lengths[item_id - 1]) >= 0
+
+
 app = FastAPI()
 
-# In-memory database
-items_db = {}
+# In-memory database (columnar, but used like a dict of item dicts)
+items_db = ColumnarItemStore()
+items_index = ItemIndex()
 next_id = 1
 
 
@@ -41,15 +304,17 @@ async def root():
 async def get_item(item_id: int):
     if item_id not in items_db:
         return {"detail": "Item not found"}
-    return items_db[item_id]
+    return items_db.item(item_id)
 
 
 @app.post("/items", response_model=Item, status_code=201)
 async def create_item(item: Item):
     global next_id
-    items_db[next_id] = item.dict()
+    row = item.model_dump()
+    items_db[next_id] = row
+    items_index.add(next_id, row)
     next_id += 1
-    return item.dict()
+    return row
 
 
 @app.get("/items")
@@ -61,7 +326,7 @@ async def list_items():
 async def delete_item(item_id: int):
     if item_id not in items_db:
         return {"detail": "Item not found"}
-    del items_db[item_id]
+    items_index.remove(item_id, items_db.pop(item_id))
     return {"message": "Deleted"}
 
 
@@ -69,18 +334,40 @@ async def delete_item(item_id: int):
 # TESTS
 # ============================================================================
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def client():
-    """Provide FastAPI test client"""
-    return TestClient(app)
+    """
+    One TestClient for the whole session.
+    
+    Entering it starts the app's lifespan (and the client's event loop
+    thread) once; a bare TestClient(app) per test pays for both on
+    every test.
+    """
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest_asyncio.fixture
+async def async_client():
+    """httpx.AsyncClient talking to the app in-process, for async tests"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def pristine_db():
+    """The stores' state before any test ran"""
+    return items_db.snapshot(), items_index.snapshot(), next_id
 
 
 @pytest.fixture(autouse=True)
-def clear_db():
-    """Clear database before each test"""
+def clear_db(pristine_db):
+    """Reset the stores before each test by restoring the pristine snapshot"""
     global next_id
-    items_db.clear()
-    next_id = 1
+    db, index, next_id = pristine_db
+    items_db.restore(db)
+    items_index.restore(index)
     yield
 
 
@@ -215,14 +502,14 @@ def test_create_retrieve_delete_workflow(client):
 # ============================================================================
 
 @app.get("/search")
-async def search_items(query: str = "", min_price: float = 0.0):
-    """Search items by name and price"""
-    results = []
-    for item in items_db.values():
-        if (query.lower() in item.get("name", "").lower() and
-            item.get("price", 0) >= min_price):
-            results.append(item)
-    return results
+async def search_items(
+    query: str = "",
+    min_price: float = 0.0,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    """Search items by name and price (see ItemIndex for how)"""
+    return [items_db[item_id] for item_id in items_index.search(query, min_price, offset, limit)]
 
 
 def test_search_items(client):
@@ -240,6 +527,99 @@ def test_search_items(client):
     assert results[0]["name"] == "Expensive Widget"
 
 
+def test_search_pagination(client):
+    """limit/offset page through matches in insertion order"""
+    for i in range(5):
+        client.post("/items", json={"name": f"Widget {i}", "price": float(i)})
+    
+    response = client.get("/search?query=widget&limit=2&offset=1")
+    assert [item["name"] for item in response.json()] == ["Widget 1", "Widget 2"]
+
+
+def test_search_index_follows_deletes(client):
+    """Deleted items disappear from every index"""
+    client.post("/items", json={"name": "Widget", "price": 100.0})
+    client.delete("/items/1")
+    
+    assert client.get("/search?query=widget").json() == []
+    assert client.get("/search?min_price=50").json() == []
+    assert items_index.grams == {} and len(items_index.price_keys) == 0
+
+
+@pytest.mark.parametrize("query, min_price, plan", [
+    ("", 0.0, "scan"),           # everything matches: stop after one page
+    ("", 995.0, "price"),        # only 5 items are this expensive
+    ("item 99", 0.0, "text"),    # a name fragment few items share
+])
+def test_search_planner_picks_selective_index(query, min_price, plan):
+    """The planner drives the search from the most selective index"""
+    for i in range(1000):
+        create_item_directly(f"Item {i}", float(i))
+    
+    assert items_index.plan(query, min_price, wanted=10) == plan
+    
+    expected = [
+        item for item in items_db.values()
+        if query in item["name"].lower() and item["price"] >= min_price
+    ][:10]
+    assert [items_db[i] for i in items_index.search(query, min_price, 0, 10)] == expected
+
+
+def test_columnar_store_behaves_like_a_dict():
+    """Rows round-trip, and deleted or skipped ids are missing"""
+    store = ColumnarItemStore()
+    store[1] = {"name": "Widget", "price": 9.99, "tax": 0.2}
+    store[3] = Item(name="Gädget", price=5.0)
+    store[1] = {"name": "Widget v2", "price": 10.0}
+    
+    assert store[1] == {"name": "Widget v2", "price": 10.0, "tax": 0.1}
+    assert store.item(3) == Item(name="Gädget", price=5.0)
+    assert 2 not in store and list(store) == [1, 3] and len(store) == 2
+    
+    del store[1]
+    assert 1 not in store and len(store) == 1
+    with pytest.raises(KeyError):
+        store[1]
+
+
+def test_columnar_store_is_compact():
+    """The columns take a small fraction of what dicts of values would"""
+    store = ColumnarItemStore()
+    for i in range(1, 10_001):
+        store[i] = {"name": f"Item {i}", "price": float(i), "tax": 0.1}
+    
+    column_bytes = sum(
+        column.itemsize * len(column)
+        for column in (store.prices, store.taxes, store.name_starts, store.name_lengths)
+    ) + len(store.name_bytes) + len(store.alive)
+    assert column_bytes / len(store) < 50
+
+
+@pytest.mark.perf
+def test_perf_search_items(benchmark):
+    """Name search over 10k items stays in the microseconds"""
+    for i in range(10_000):
+        create_item_directly(f"Item {i}", float(i))
+    
+    results = benchmark(search_items, query="item 99", min_price=0.0, limit=1000, offset=0)
+    assert len(results) == 111  # 99, 990-999, 9900-9999
+
+
+@pytest.mark.perf
+def test_perf_create_item(benchmark):
+    """Storing an item and indexing it"""
+    item = Item(name="Benchmark Widget", price=9.99)
+    assert benchmark(create_item, item)["name"] == "Benchmark Widget"
+
+
+def create_item_directly(name: str, price: float):
+    """Insert without HTTP, for tests that need many items"""
+    global next_id
+    items_db[next_id] = {"name": name, "price": price, "tax": 0.1}
+    items_index.add(next_id, items_db[next_id])
+    next_id += 1
+
+
 # ============================================================================
 # 7. RESPONSE CODES
 # ============================================================================
@@ -286,3 +666,32 @@ def test_missing_header(client):
     response = client.get("/protected")
     assert response.status_code == 200
     assert "error" in response.json()
+
+
+# ============================================================================
+# 9. ASYNC CLIENT
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_async_create_and_list(async_client):
+    """Same app, driven from async code through httpx's ASGI transport"""
+    response = await async_client.post("/items", json={"name": "Async", "price": 3.0})
+    assert response.status_code == 201
+    
+    response = await async_client.get("/items")
+    assert [item["name"] for item in response.json()] == ["Async"]
+
+
+def test_snapshot_restore_resets_stores():
+    """restore() undoes every write since snapshot(), and can be reused"""
+    create_item_directly("Kept", 1.0)
+    db, index = items_db.snapshot(), items_index.snapshot()
+    
+    for _ in range(2):
+        create_item_directly("Dropped", 2.0)
+        items_index.remove(1, items_db.pop(1))
+        items_db.restore(db)
+        items_index.restore(index)
+        assert [item["name"] for item in items_db.values()] == ["Kept"]
+        assert items_index.search("kept", 0.0, 0, 10) == [1]
+        assert items_index.search("dropped", 0.0, 0, 10) == []
@@ -6,12 +6,28 @@ Demonstrates mocking LLM calls, API calls, and external tools.
 Run tests with:
     uv add --dev pytest
     uv add --dev pytest-mock
+    uv add --dev pytest-asyncio httpx
     uv run pytest test_mocking.py -v
 """
 
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+
+import httpx
 import pytest
-from unittest.mock import Mock, patch, MagicMock, call
-from typing import Optional
+import pytest_asyncio
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from unittest.mock import Mock, AsyncMock, patch, MagicMock, call
+from typing import Any, AsyncIterator, Callable, Optional
 
 
 # ============================================================================
@@ -19,18 +35,128 @@ from typing import Optional
 # ============================================================================
 
 class LLMClient:
-    """Simulated LLM client"""
-    def __init__(self, model: str):
+    """
+    LLM client with a blocking API (generate) and an async one.
+    
+    The async API shares one pooled HTTP connection set, and prompts
+    sent with agenerate() within `batch_window` seconds of each other
+    go to the backend as a single request (up to `max_batch_size`).
+    """
+    # True if the backend keeps earlier turns (KV/prefix cache), so an
+    # agent only needs to send the new messages
+    supports_prefix_cache = False
+    
+    def __init__(
+        self,
+        model: str,
+        base_url: str = "http://llm",
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        max_connections: int = 20,
+        batch_window: float = 0.005,
+        max_batch_size: int = 32
+    ):
         self.model = model
+        self.base_url = base_url
+        self.transport = transport
+        self.max_connections = max_connections
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self._http: Optional[httpx.AsyncClient] = None
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._inflight: set[asyncio.Task] = set()
     
     def generate(self, prompt: str) -> str:
-        """Generate response from LLM"""
+        """Generate response from LLM (blocking - use agenerate in async code)"""
         # In reality, this would call OpenAI, Ollama, etc.
         raise NotImplementedError("Must be mocked in tests")
+    
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """Pooled HTTP client, created on first use"""
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                transport=self.transport,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                timeout=httpx.Timeout(60.0, connect=5.0)
+            )
+        return self._http
+    
+    async def agenerate(self, prompt: str) -> str:
+        """Generate without blocking the event loop; batched with other calls"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((prompt, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        return await future
+    
+    def _flush(self):
+        """Send everything collected so far as one backend request"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+    
+    async def _send_batch(self, batch: list[tuple[str, asyncio.Future]]):
+        try:
+            response = await self.http.post(
+                "/v1/generate",
+                json={"model": self.model, "prompts": [prompt for prompt, _ in batch]}
+            )
+            response.raise_for_status()
+            completions = response.json()["completions"]
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), completion in zip(batch, completions):
+            if not future.done():  # the caller may have been cancelled
+                future.set_result(completion)
+        for _, future in batch[len(completions):]:
+            if not future.done():
+                future.set_exception(RuntimeError(
+                    f"Backend returned {len(completions)} completions for {len(batch)} prompts"
+                ))
+    
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield tokens as the backend produces them (NDJSON stream)"""
+        async with self.http.stream(
+            "POST", "/v1/stream", json={"model": self.model, "prompt": prompt}
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line:
+                    yield json.loads(line)["token"]
+    
+    async def aclose(self):
+        """Send any prompts still waiting for a batch, then close pooled connections"""
+        self._flush()
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
 
 
 class Tool:
-    """Base tool class"""
+    """
+    Base tool class.
+    
+    `execute` may be a plain method or `async def`: the agent awaits
+    async tools and runs sync ones in a thread pool.
+    """
     def execute(self, args: dict) -> any:
         raise NotImplementedError
 
@@ -43,19 +169,126 @@ class SearchTool(Tool):
 
 
 class Agent:
-    """Simple agent that uses LLM and tools"""
-    def __init__(self, llm: LLMClient, tools: dict[str, Tool]):
+    """
+    Simple agent that uses LLM and tools.
+    
+    Every response line of the form `<tool>: <args>` naming a known tool
+    is a tool call (args are a JSON object, or plain text passed as
+    {"query": ...}). All calls from one response run concurrently, at
+    most `limits[tool]` at a time per tool and each within
+    `timeouts[tool]` seconds, and their results come back in order. A
+    call that fails or times out comes back as an "<Tool> error: ..."
+    line, so the other results still reach the caller.
+    """
+    DEFAULT_LIMIT = 4
+    
+    def __init__(
+        self,
+        llm: LLMClient,
+        tools: dict[str, Tool],
+        timeouts: Optional[dict[str, float]] = None,
+        limits: Optional[dict[str, int]] = None
+    ):
         self.llm = llm
         self.tools = tools
+        self.timeouts = timeouts or {}
+        self.limits = limits or {}
     
     def run(self, prompt: str) -> str:
-        """Run agent"""
+        """Run agent (blocking; works with or without a running event loop)"""
         response = self.llm.generate(prompt)
-        if "search:" in response:
-            search_query = response.replace("search:", "").strip()
-            search_result = self.tools["search"].execute({"query": search_query})
-            return f"Search result: {search_result}"
-        return response
+        calls = self._parse_calls(response)
+        if not calls:
+            return response
+        name, args = calls[0]
+        tool = self.tools[name]
+        if (
+            len(calls) == 1
+            and name not in self.timeouts
+            and not asyncio.iscoroutinefunction(tool.execute)
+        ):
+            # One sync call with nothing to enforce: no event loop or thread needed
+            try:
+                result = tool.execute(args)
+            except Exception as exc:
+                result = exc
+            return self._format([(name, result)])
+        return self._format(self._run_blocking(calls))
+    
+    async def arun(self, prompt: str) -> str:
+        """Run agent without blocking the event loop (for async endpoints)"""
+        response = await self.llm.agenerate(prompt)
+        calls = self._parse_calls(response)
+        if not calls:
+            return response
+        return self._format(await self._run_tools(calls))
+    
+    def _run_blocking(self, calls: list[tuple[str, dict]]) -> list[tuple[str, Any]]:
+        """_run_tools from sync code, even if this thread already runs a loop"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self._run_tools(calls))
+        # asyncio.run can't nest: give the tools their own loop in a thread
+        with ThreadPoolExecutor(max_workers=1) as runner:
+            return runner.submit(asyncio.run, self._run_tools(calls)).result()
+    
+    def _parse_calls(self, response: str) -> list[tuple[str, dict]]:
+        calls = []
+        for line in response.splitlines():
+            name, sep, text = line.partition(":")
+            name = name.strip()
+            if not sep or name not in self.tools:
+                continue
+            text = text.strip()
+            try:
+                args = json.loads(text)
+            except ValueError:
+                args = None
+            calls.append((name, args if isinstance(args, dict) else {"query": text}))
+        return calls
+    
+    async def _run_tools(self, calls: list[tuple[str, dict]]) -> list[tuple[str, Any]]:
+        """Run calls concurrently; a failure or timeout becomes that call's result"""
+        semaphores = {
+            name: asyncio.Semaphore(self.limits.get(name, self.DEFAULT_LIMIT))
+            for name, _ in calls
+        }
+        # Sync tools get a pool of their own rather than the loop's default
+        # executor, which asyncio.run() joins before returning - that would
+        # make the turn wait for every timed-out thread anyway
+        executor = ThreadPoolExecutor(max_workers=len(calls), thread_name_prefix="agent-tool")
+        loop = asyncio.get_running_loop()
+        
+        async def call_tool(name: str, args: dict) -> Any:
+            tool = self.tools[name]
+            async with semaphores[name]:
+                if asyncio.iscoroutinefunction(tool.execute):
+                    call = tool.execute(args)
+                else:
+                    call = loop.run_in_executor(executor, tool.execute, args)
+                return await asyncio.wait_for(call, self.timeouts.get(name))
+        
+        try:
+            results = await asyncio.gather(
+                *(call_tool(name, args) for name, args in calls), return_exceptions=True
+            )
+        finally:
+            # A timed-out thread can't be stopped, only abandoned
+            executor.shutdown(wait=False)
+        return [(name, result) for (name, _), result in zip(calls, results)]
+    
+    @staticmethod
+    def _format(results: list[tuple[str, Any]]) -> str:
+        lines = []
+        for name, result in results:
+            if isinstance(result, asyncio.TimeoutError):
+                lines.append(f"{name.capitalize()} error: timed out")
+            elif isinstance(result, Exception):
+                lines.append(f"{name.capitalize()} error: {result}")
+            else:
+                lines.append(f"{name.capitalize()} result: {result}")
+        return "\n".join(lines)
 
 
 # ============================================================================
@@ -248,23 +481,115 @@ def test_agent_with_fixtures(agent_with_mocks, mock_llm):
 # 10. REAL-WORLD EXAMPLE: Testing Agent with LLM
 # ============================================================================
 
+@dataclass
+class Message:
+    role: str
+    content: str
+    tokens: int
+
+
+def approx_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English)"""
+    return max(1, len(text) // 4)
+
+
+class ConversationState:
+    """
+    Append-only message log kept within a token budget.
+    
+    The first message (the task) is pinned. When the log grows past
+    `max_tokens`, the oldest other messages are dropped - or, with a
+    `summarize` callable, folded into one summary message. `delta()`
+    returns only the messages the backend hasn't seen yet; trimming
+    changes the prefix, so the next delta is the whole window again.
+    """
+    def __init__(
+        self,
+        max_tokens: int = 4000,
+        count_tokens: Callable[[str], int] = approx_tokens,
+        summarize: Optional[Callable[[list[Message]], str]] = None
+    ):
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens
+        self.summarize = summarize
+        self.messages: list[Message] = []
+        self.tokens = 0
+        self.sent = 0  # messages[:sent] are already on the backend
+    
+    def append(self, role: str, content: str):
+        message = Message(role, content, self.count_tokens(content))
+        self.messages.append(message)
+        self.tokens += message.tokens
+        if self.tokens > self.max_tokens:
+            self._trim()
+    
+    def _trim(self):
+        pinned, rest = self.messages[:1], self.messages[1:]
+        dropped = []
+        while rest and len(rest) > 1 and self.tokens > self.max_tokens:
+            message = rest.pop(0)
+            dropped.append(message)
+            self.tokens -= message.tokens
+        if dropped and self.summarize is not None:
+            summary = Message("summary", self.summarize(dropped), 0)
+            summary.tokens = self.count_tokens(summary.content)
+            rest.insert(0, summary)
+            self.tokens += summary.tokens
+        self.messages = pinned + rest
+        self.sent = 0
+    
+    @staticmethod
+    def render(messages: list[Message]) -> str:
+        return "\n".join(f"{m.role}: {m.content}" for m in messages)
+    
+    def prompt(self) -> str:
+        """The whole window; marks it as sent"""
+        self.sent = len(self.messages)
+        return self.render(self.messages)
+    
+    def delta(self) -> str:
+        """Only the messages added since the last send; marks them as sent"""
+        new = self.messages[self.sent:]
+        self.sent = len(self.messages)
+        return self.render(new)
+
+
 class RealWorldAgent:
-    """More realistic agent implementation"""
-    def __init__(self, llm: LLMClient, max_iterations: int = 3):
+    """
+    More realistic agent implementation.
+    
+    Each iteration sees the earlier responses through a ConversationState,
+    and backends with a prefix cache only get the new messages.
+    """
+    def __init__(
+        self,
+        llm: LLMClient,
+        max_iterations: int = 3,
+        max_tokens: int = 4000,
+        summarize: Optional[Callable[[list[Message]], str]] = None
+    ):
         self.llm = llm
         self.max_iterations = max_iterations
+        self.max_tokens = max_tokens
+        self.summarize = summarize
         self.iteration = 0
+        self.state = ConversationState(max_tokens, summarize=summarize)
     
     def run(self, prompt: str) -> str:
         """Run agent with iteration limit"""
         self.iteration = 0
+        self.state = ConversationState(self.max_tokens, summarize=self.summarize)
+        self.state.append("user", prompt)
+        incremental = getattr(self.llm, "supports_prefix_cache", False) is True
         
         for _ in range(self.max_iterations):
             self.iteration += 1
-            response = self.llm.generate(prompt)
+            text = self.state.delta() if incremental else self.state.prompt()
+            response = self.llm.generate(text)
             
             if response.startswith("DONE:"):
                 return response.replace("DONE:", "").strip()
+            self.state.append("assistant", response)
         
         return f"Failed after {self.max_iterations} iterations"
 
@@ -286,3 +611,795 @@ def test_real_world_agent(mocker):
     assert result == "Final answer"
     assert mock_llm.generate.call_count == 3
     assert agent.iteration == 3
+
+
+@pytest.mark.perf
+def test_perf_agent_run(benchmark):
+    """Overhead of one agent turn with a tool call (LLM and tool mocked)"""
+    mock_llm = Mock(spec=LLMClient)
+    mock_llm.generate.return_value = "search: python"
+    mock_search = Mock(spec=SearchTool)
+    mock_search.execute.return_value = "Python is a language"
+    agent = Agent(mock_llm, {"search": mock_search})
+    
+    assert benchmark(agent.run, "prompt") == "Search result: Python is a language"
+
+
+# ============================================================================
+# 11. ASYNC LLM CLIENT WITH A LOCAL STUB SERVER
+# ============================================================================
+
+def create_stub_llm_server() -> FastAPI:
+    """
+    In-process stand-in for an LLM backend.
+    
+    Served through httpx.ASGITransport, so tests exercise the real HTTP
+    code path without a network or a model.
+    """
+    stub = FastAPI()
+    stub.state.batches = []
+    stub.state.missing = 0  # answer this many prompts fewer than were sent
+    
+    @stub.post("/v1/generate")
+    async def generate(body: dict):
+        stub.state.batches.append(body["prompts"])
+        completions = [f"echo: {prompt}" for prompt in body["prompts"]]
+        return {"completions": completions[:len(completions) - stub.state.missing]}
+    
+    @stub.post("/v1/stream")
+    async def stream(body: dict):
+        async def tokens():
+            for token in f"echo: {body['prompt']}".split():
+                yield json.dumps({"token": token}) + "\n"
+        return StreamingResponse(tokens(), media_type="application/x-ndjson")
+    
+    return stub
+
+
+@pytest.fixture
+def stub_llm_server():
+    return create_stub_llm_server()
+
+
+@pytest_asyncio.fixture
+async def async_llm(stub_llm_server):
+    """Async LLMClient wired to the stub server"""
+    client = LLMClient("stub", transport=httpx.ASGITransport(app=stub_llm_server))
+    yield client
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_agenerate_batches_concurrent_prompts(async_llm, stub_llm_server):
+    """Concurrent prompts are sent to the backend as one request"""
+    prompts = [f"prompt {i}" for i in range(10)]
+    
+    results = await asyncio.gather(*(async_llm.agenerate(p) for p in prompts))
+    
+    assert results == [f"echo: {p}" for p in prompts]
+    assert stub_llm_server.state.batches == [prompts]
+
+
+@pytest.mark.asyncio
+async def test_agenerate_splits_at_max_batch_size(stub_llm_server):
+    """A full batch is sent right away instead of waiting for the window"""
+    llm = LLMClient(
+        "stub",
+        transport=httpx.ASGITransport(app=stub_llm_server),
+        max_batch_size=4
+    )
+    
+    await asyncio.gather(*(llm.agenerate(str(i)) for i in range(10)))
+    await llm.aclose()
+    
+    assert [len(batch) for batch in stub_llm_server.state.batches] == [4, 4, 2]
+
+
+@pytest.mark.asyncio
+async def test_agenerate_fails_prompts_the_backend_did_not_answer(async_llm, stub_llm_server):
+    """A short completions list fails the unmatched prompts instead of hanging them"""
+    stub_llm_server.state.missing = 1
+    
+    results = await asyncio.wait_for(
+        asyncio.gather(*(async_llm.agenerate(f"p{i}") for i in range(3)), return_exceptions=True),
+        timeout=1
+    )
+    
+    assert results[:2] == ["echo: p0", "echo: p1"]
+    assert isinstance(results[2], RuntimeError)
+
+
+@pytest.mark.asyncio
+async def test_aclose_sends_prompts_still_waiting_for_a_batch(stub_llm_server):
+    """Closing the client doesn't leave queued prompts unanswered"""
+    llm = LLMClient(
+        "stub",
+        transport=httpx.ASGITransport(app=stub_llm_server),
+        batch_window=60
+    )
+    calls = [asyncio.create_task(llm.agenerate(f"p{i}")) for i in range(2)]
+    await asyncio.sleep(0)
+    
+    await llm.aclose()
+    
+    assert await asyncio.wait_for(asyncio.gather(*calls), timeout=1) == ["echo: p0", "echo: p1"]
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_tokens(async_llm):
+    """Tokens arrive one by one from the streaming endpoint"""
+    tokens = [token async for token in async_llm.stream("hello world")]
+    assert tokens == ["echo:", "hello", "world"]
+
+
+@pytest.mark.asyncio
+async def test_agent_arun_with_async_mock():
+    """AsyncMock stands in for async methods, just like Mock for sync ones"""
+    mock_llm = Mock(spec=LLMClient)
+    mock_llm.agenerate = AsyncMock(return_value="search: asyncio")
+    mock_search = Mock(spec=SearchTool)
+    mock_search.execute.return_value = "asyncio runs coroutines"
+    
+    agent = Agent(mock_llm, {"search": mock_search})
+    result = await agent.arun("What is asyncio?")
+    
+    mock_llm.agenerate.assert_awaited_once_with("What is asyncio?")
+    assert result == "Search result: asyncio runs coroutines"
+
+
+# ============================================================================
+# 12. PROMPT/RESPONSE CACHE
+# ============================================================================
+
+class TTLCache:
+    """
+    In-memory LRU cache whose entries also expire after `ttl` seconds.
+    
+    `clock` is injectable so tests can move time forward.
+    """
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires <= self.clock():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)  # most recently used
+            return value
+    
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = float("inf") if ttl is None else self.clock() + ttl
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)  # least recently used
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class PromptCache:
+    """
+    Two-tier cache for LLM completions keyed on (model, prompt, params).
+    
+    Memory tier: TTLCache. Optional disk tier: a SQLite file that
+    survives restarts; disk hits are promoted back into memory.
+    """
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: Optional[float] = 3600,
+        path: Optional[str] = None,
+        clock: Callable[[], float] = time.time
+    ):
+        self.ttl = ttl
+        self.clock = clock
+        self.memory = TTLCache(maxsize, ttl, clock)
+        self.db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS completions "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+        self._db_lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0}
+    
+    @staticmethod
+    def key(model: str, prompt: str, params: dict) -> str:
+        payload = json.dumps([model, prompt, params], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats["hits"] += 1
+            return value
+        if self.db is not None:
+            with self._db_lock:
+                row = self.db.execute(
+                    "SELECT value, expires FROM completions WHERE key = ?", (key,)
+                ).fetchone()
+            if row is not None and row[1] > self.clock():
+                self.stats["disk_hits"] += 1
+                self.memory.set(key, row[0], ttl=row[1] - self.clock())
+                return row[0]
+        self.stats["misses"] += 1
+        return None
+    
+    def set(self, key: str, value: str):
+        self.memory.set(key, value)
+        if self.db is not None:
+            expires = float("inf") if self.ttl is None else self.clock() + self.ttl
+            with self._db_lock, self.db:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO completions VALUES (?, ?, ?)", (key, value, expires)
+                )
+    
+    def metrics(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = self.stats["hits"] + self.stats["disk_hits"]
+        return {**self.stats, "size": len(self.memory), "hit_rate": hits / lookups if lookups else 0.0}
+    
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+
+
+@dataclass
+class InFlight:
+    """A shared async call and how many callers are waiting for it"""
+    task: asyncio.Future
+    waiters: int = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time.
+    
+    Callers that arrive while a call with the same key is running wait
+    for it and share its result (or exception). Joins are counted in
+    `stats["coalesced"]`. An async call runs in its own task: a caller
+    that is cancelled stops waiting without cancelling the others, and
+    the call is only cancelled once nobody waits for it.
+    """
+    def __init__(self, stats: dict):
+        self.stats = stats
+        self._calls: dict[str, Future] = {}
+        self._acalls: dict[str, InFlight] = {}
+        self._lock = threading.Lock()
+    
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            self.stats["coalesced"] += 1
+            return future.result()
+        
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except Exception as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+    
+    async def ado(self, key: str, fn: Callable[[], Any]) -> Any:
+        flight = self._acalls.get(key)
+        if flight is None:
+            flight = self._acalls[key] = InFlight(asyncio.ensure_future(fn()))
+            flight.task.add_done_callback(lambda _: self._acalls.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+        
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+
+class CachedLLMClient:
+    """
+    Wraps an LLMClient with a PromptCache.
+    
+    Identical requests made while the first one is still running wait
+    for it instead of calling the LLM again (single-flight).
+    """
+    def __init__(self, llm: LLMClient, cache: PromptCache, **params: Any):
+        self.llm = llm
+        self.cache = cache
+        self.params = params
+        self.model = llm.model
+        self.flight = SingleFlight(cache.stats)
+    
+    def generate(self, prompt: str) -> str:
+        key = self.cache.key(self.model, prompt, self.params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        
+        def call():
+            result = self.llm.generate(prompt)
+            self.cache.set(key, result)
+            return result
+        return self.flight.do(key, call)
+    
+    async def agenerate(self, prompt: str) -> str:
+        key = self.cache.key(self.model, prompt, self.params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        
+        async def call():
+            result = await self.llm.agenerate(prompt)
+            self.cache.set(key, result)
+            return result
+        return await self.flight.ado(key, call)
+
+
+@pytest.fixture
+def prompt_cache():
+    cache = PromptCache(maxsize=2, ttl=60)
+    yield cache
+    cache.close()
+
+
+def test_cache_hit_skips_llm(mock_llm, prompt_cache):
+    """Same model + prompt + params is answered from the cache"""
+    mock_llm.model = "gpt-4"
+    llm = CachedLLMClient(mock_llm, prompt_cache, temperature=0)
+    
+    assert llm.generate("hi") == "Mocked response"
+    assert llm.generate("hi") == "Mocked response"
+    
+    mock_llm.generate.assert_called_once_with("hi")
+    assert prompt_cache.metrics()["hits"] == 1
+    assert prompt_cache.metrics()["misses"] == 1
+
+
+def test_cache_key_includes_params(mock_llm, prompt_cache):
+    """Different generation params are different cache entries"""
+    mock_llm.model = "gpt-4"
+    CachedLLMClient(mock_llm, prompt_cache, temperature=0).generate("hi")
+    CachedLLMClient(mock_llm, prompt_cache, temperature=1).generate("hi")
+    assert mock_llm.generate.call_count == 2
+
+
+def test_cache_ttl_and_lru_eviction():
+    """Entries expire after ttl, and the least recently used goes first"""
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")          # "a" is now most recently used
+    cache.set("c", 3)       # evicts "b"
+    
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    
+    now[0] = 11.0
+    assert cache.get("a") is None
+
+
+def test_cache_disk_tier_survives_restart(tmp_path, mock_llm):
+    """A new cache on the same file still has earlier completions"""
+    mock_llm.model = "gpt-4"
+    path = str(tmp_path / "prompts.db")
+    
+    first = PromptCache(path=path)
+    CachedLLMClient(mock_llm, first).generate("hi")
+    first.close()
+    
+    second = PromptCache(path=path)
+    assert CachedLLMClient(mock_llm, second).generate("hi") == "Mocked response"
+    assert second.metrics()["disk_hits"] == 1
+    mock_llm.generate.assert_called_once()
+    second.close()
+
+
+@pytest.mark.asyncio
+async def test_cache_coalesces_concurrent_identical_prompts(prompt_cache):
+    """Ten concurrent identical prompts make one LLM call"""
+    async def slow_generate(prompt):
+        await asyncio.sleep(0.01)
+        return f"answer to {prompt}"
+    
+    mock_llm = Mock(spec=LLMClient)
+    mock_llm.model = "gpt-4"
+    mock_llm.agenerate = AsyncMock(side_effect=slow_generate)
+    llm = CachedLLMClient(mock_llm, prompt_cache)
+    
+    results = await asyncio.gather(*(llm.agenerate("same") for _ in range(10)))
+    
+    assert results == ["answer to same"] * 10
+    mock_llm.agenerate.assert_awaited_once()
+    assert prompt_cache.metrics()["coalesced"] == 9
+
+
+# ============================================================================
+# 13. PARALLEL TOOL EXECUTION
+# ============================================================================
+
+class SlowTool(Tool):
+    """Async tool that takes `delay` seconds and records peak concurrency"""
+    def __init__(self, delay: float = 0.1):
+        self.delay = delay
+        self.running = 0
+        self.peak = 0
+    
+    async def execute(self, args: dict) -> str:
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(args.get("delay", self.delay))
+            return args["query"].upper()
+        finally:
+            self.running -= 1
+
+
+@pytest.mark.asyncio
+async def test_agent_runs_tool_calls_concurrently():
+    """Three 0.1s calls finish in about 0.1s, results in call order"""
+    mock_llm = Mock(spec=LLMClient)
+    mock_llm.agenerate = AsyncMock(return_value="search: a\nsearch: b\nsearch: c")
+    agent = Agent(mock_llm, {"search": SlowTool(0.1)})
+    
+    start = time.perf_counter()
+    result = await agent.arun("prompt")
+    
+    assert time.perf_counter() - start < 0.25
+    assert result == "Search result: A\nSearch result: B\nSearch result: C"
+
+
+def test_agent_mixes_sync_and_async_tools():
+    """Sync tools run in threads next to async ones"""
+    mock_llm = Mock(spec=LLMClient)
+    mock_llm.generate.return_value = 'fetch: {"query": "x", "delay": 0.01}\nsearch: python'
+    mock_search = Mock(spec=SearchTool)
+    mock_search.execute.return_value = "Python is a language"
+    
+    agent = Agent(mock_llm, {"search": mock_search, "fetch": SlowTool()})
+    result = agent.run("prompt")
+    
+    mock_search.execute.assert_called_once_with({"query": "python"})
+    assert result == "Fetch result: X\nSearch result: Python is a language"
+
+
+def test_agent_sync_timeout_bounds_the_turn():
+    """A timed-out sync tool is abandoned: run() doesn't wait for its thread"""
+    mock_llm = Mock(spec=LLMClient)
+    mock_llm.generate.return_value = "search: slow"
+    release = threading.Event()
+    mock_search = Mock(spec=SearchTool)
+    mock_search.execute.side_effect = lambda args: release.wait(2)
+    agent = Agent(mock_llm, {"search": mock_search}, timeouts={"search": 0.05})
+    
+    start = time.perf_counter()
+    result = agent.run("prompt")
+    elapsed = time.perf_counter() - start
+    release.set()
+    
+    assert result == "Search error: timed out"
+    assert elapsed < 1
+
+
+@pytest.mark.parametrize("response", ["search: a", "search: a\nsearch: b"])
+def test_agent_reports_tool_errors_the_same_for_one_or_many_calls(response):
+    """A failing tool becomes an error line, however many calls there are"""
+    mock_llm = Mock(spec=LLMClient)
+    mock_llm.generate.return_value = response
+    mock_search = Mock(spec=SearchTool)
+    mock_search.execute.side_effect = RuntimeError("search is down")
+    
+    result = Agent(mock_llm, {"search": mock_search}).run("prompt")
+    
+    assert set(result.splitlines()) == {"Search error: search is down"}
+
+
+@pytest.mark.asyncio
+async def test_agent_run_works_inside_a_running_loop():
+    """run() blocks like any sync call, but doesn't fail under an event loop"""
+    mock_llm = Mock(spec=LLMClient)
+    mock_llm.generate.return_value = "search: a\nsearch: b"
+    
+    result = Agent(mock_llm, {"search": SlowTool(0.01)}).run("prompt")
+    
+    assert result == "Search result: A\nSearch result: B"
+
+
+@pytest.mark.asyncio
+async def test_agent_tool_limits_and_timeouts():
+    """Per-tool limit caps concurrency; a timed-out call doesn't fail the others"""
+    mock_llm = Mock(spec=LLMClient)
+    mock_llm.agenerate = AsyncMock(
+        return_value='search: a\nsearch: b\nsearch: c\nslow: {"query": "z", "delay": 1}'
+    )
+    search = SlowTool(0.01)
+    agent = Agent(
+        mock_llm,
+        {"search": search, "slow": SlowTool()},
+        timeouts={"slow": 0.05},
+        limits={"search": 1}
+    )
+    
+    result = await agent.arun("prompt")
+    
+    assert search.peak == 1
+    assert result.splitlines() == [
+        "Search result: A", "Search result: B", "Search result: C", "Slow error: timed out"
+    ]
+
+
+# ============================================================================
+# 14. CONVERSATION STATE
+# ============================================================================
+
+def test_agent_sends_history_without_prefix_cache(mocker):
+    """Each iteration re-sends the whole conversation so far"""
+    mock_llm = mocker.Mock(spec=LLMClient)
+    mock_llm.generate.side_effect = ["Thinking...", "DONE: 42"]
+    
+    RealWorldAgent(mock_llm, max_iterations=5).run("Question")
+    
+    assert mock_llm.generate.call_args_list == [
+        call("user: Question"),
+        call("user: Question\nassistant: Thinking..."),
+    ]
+
+
+def test_agent_sends_only_delta_with_prefix_cache(mocker):
+    """A prefix-caching backend only gets the new messages"""
+    mock_llm = mocker.Mock(spec=LLMClient)
+    mock_llm.supports_prefix_cache = True
+    mock_llm.generate.side_effect = ["Step 1", "Step 2", "DONE: 42"]
+    
+    RealWorldAgent(mock_llm, max_iterations=5).run("Question")
+    
+    assert mock_llm.generate.call_args_list == [
+        call("user: Question"),
+        call("assistant: Step 1"),
+        call("assistant: Step 2"),
+    ]
+
+
+def test_conversation_state_stays_within_budget():
+    """Old messages are dropped; the task message is kept"""
+    state = ConversationState(max_tokens=10, count_tokens=lambda text: len(text.split()))
+    state.append("user", "the task")
+    for i in range(20):
+        state.append("assistant", f"step {i} done")
+    
+    assert state.tokens <= 10
+    assert state.messages[0].content == "the task"
+    assert state.messages[-1].content == "step 19 done"
+    assert len(state.messages) == 3
+
+
+def test_conversation_state_summarizes_dropped_messages():
+    """With summarize=, dropped messages become one summary message"""
+    summarize = Mock(return_value="earlier steps")
+    state = ConversationState(
+        max_tokens=10, count_tokens=lambda text: len(text.split()), summarize=summarize
+    )
+    state.append("user", "the task")
+    state.append("assistant", "step one done")
+    state.append("assistant", "step two done")
+    state.append("assistant", "step three done")
+    state.append("assistant", "step four done")
+    
+    # The first summary was folded into the second one
+    dropped = summarize.call_args.args[0]
+    assert [m.content for m in dropped] == ["earlier steps", "step two done"]
+    assert [m.role for m in state.messages] == ["user", "summary", "assistant", "assistant"]
+    assert state.prompt().splitlines()[1] == "summary: earlier steps"
+    assert state.tokens <= 10
+
+
+# ============================================================================
+# 15. TOOL RESULT MEMOIZATION
+# ============================================================================
+
+_NOT_CACHED = object()
+
+
+class MemoizedTool(Tool):
+    """
+    Caches a tool's results by canonical arguments.
+    
+    {"a": 1, "b": 2} and {"b": 2, "a": 1} are the same call. Results live
+    for `ttl` seconds in an LRU of `maxsize` entries, and concurrent
+    identical calls share one execution. Use memoize() to build one.
+    """
+    def __init__(self, tool: Tool, ttl: Optional[float] = 300, maxsize: int = 256):
+        self.tool = tool
+        self.cache = TTLCache(maxsize, ttl)
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+        self.flight = SingleFlight(self.stats)
+    
+    @staticmethod
+    def key(args: dict) -> str:
+        payload = json.dumps(args, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def _lookup(self, key: str) -> Any:
+        result = self.cache.get(key, _NOT_CACHED)
+        self.stats["hits" if result is not _NOT_CACHED else "misses"] += 1
+        return result
+    
+    def execute(self, args: dict) -> Any:
+        key = self.key(args)
+        result = self._lookup(key)
+        if result is not _NOT_CACHED:
+            return result
+        
+        def call():
+            result = self.tool.execute(args)
+            self.cache.set(key, result)
+            return result
+        return self.flight.do(key, call)
+    
+    def metrics(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self.cache),
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+        }
+
+
+class AsyncMemoizedTool(MemoizedTool):
+    """MemoizedTool for tools whose execute() is async"""
+    async def execute(self, args: dict) -> Any:
+        key = self.key(args)
+        result = self._lookup(key)
+        if result is not _NOT_CACHED:
+            return result
+        
+        async def call():
+            result = await self.tool.execute(args)
+            self.cache.set(key, result)
+            return result
+        return await self.flight.ado(key, call)
+
+
+def memoize(tool: Tool, ttl: Optional[float] = 300, maxsize: int = 256) -> MemoizedTool:
+    """Wrap a tool so repeated calls with the same arguments hit a cache"""
+    if asyncio.iscoroutinefunction(tool.execute):
+        return AsyncMemoizedTool(tool, ttl, maxsize)
+    return MemoizedTool(tool, ttl, maxsize)
+
+
+def create_metrics_app(tools: dict[str, Tool], prompt_cache: Optional[PromptCache] = None) -> FastAPI:
+    """Expose cache statistics for memoized tools (and the prompt cache)"""
+    metrics = FastAPI()
+    
+    @metrics.get("/metrics/cache")
+    async def cache_metrics():
+        body = {
+            "tools": {
+                name: tool.metrics()
+                for name, tool in tools.items()
+                if isinstance(tool, MemoizedTool)
+            }
+        }
+        if prompt_cache is not None:
+            body["prompt_cache"] = prompt_cache.metrics()
+        return body
+    
+    return metrics
+
+
+def test_memoized_tool_canonical_arguments():
+    """Argument order doesn't matter; different arguments are different entries"""
+    mock_search = Mock(spec=SearchTool)
+    mock_search.execute.side_effect = lambda args: f"results for {args['query']}"
+    search = memoize(mock_search, ttl=60)
+    
+    assert search.execute({"query": "python", "lang": "en"}) == "results for python"
+    assert search.execute({"lang": "en", "query": "python"}) == "results for python"
+    assert search.execute({"query": "rust", "lang": "en"}) == "results for rust"
+    
+    assert mock_search.execute.call_count == 2
+    assert search.metrics()["hits"] == 1
+
+
+def test_agent_reuses_memoized_search(mocker):
+    """Repeated queries in one session hit the tool once"""
+    mock_llm = mocker.Mock(spec=LLMClient)
+    mock_llm.generate.return_value = "search: python"
+    mock_search = Mock(spec=SearchTool)
+    mock_search.execute.return_value = "Python is a language"
+    agent = Agent(mock_llm, {"search": memoize(mock_search)})
+    
+    for _ in range(3):
+        assert agent.run("prompt") == "Search result: Python is a language"
+    
+    mock_search.execute.assert_called_once_with({"query": "python"})
+
+
+@pytest.mark.asyncio
+async def test_memoized_async_tool_coalesces_in_flight_calls():
+    """Concurrent identical calls to an async tool share one execution"""
+    slow = SlowTool(0.05)
+    slow.execute = AsyncMock(side_effect=slow.execute)
+    tool = memoize(slow)
+    
+    results = await asyncio.gather(*(tool.execute({"query": "q"}) for _ in range(5)))
+    
+    assert results == ["Q"] * 5
+    slow.execute.assert_awaited_once()
+    assert tool.metrics()["coalesced"] == 4
+
+
+@pytest.mark.asyncio
+async def test_cancelled_first_caller_does_not_cancel_the_others():
+    """The call outlives the caller that started it while others still wait"""
+    slow = SlowTool(0.05)
+    tool = memoize(slow)
+    
+    first = asyncio.create_task(tool.execute({"query": "q"}))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(tool.execute({"query": "q"}))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    
+    assert await second == "Q"
+    assert first.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_single_flight_cancels_the_call_when_nobody_waits():
+    """Once every caller has gone, the shared call is cancelled too"""
+    started, cancelled = asyncio.Event(), asyncio.Event()
+    
+    async def call():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+    
+    flight = SingleFlight({"coalesced": 0})
+    callers = [asyncio.create_task(flight.ado("key", call)) for _ in range(2)]
+    await started.wait()
+    for caller in callers:
+        caller.cancel()
+    
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+
+def test_cache_metrics_endpoint():
+    """GET /metrics/cache reports per-tool statistics"""
+    mock_search = Mock(spec=SearchTool)
+    mock_search.execute.return_value = "result"
+    search = memoize(mock_search)
+    search.execute({"query": "a"})
+    search.execute({"query": "a"})
+    
+    response = TestClient(create_metrics_app({"search": search})).get("/metrics/cache")
+    
+    assert response.status_code == 200
+    assert response.json()["tools"]["search"] == {
+        "hits": 1, "misses": 1, "coalesced": 0, "size": 1, "hit_rate": 0.5
+    }
@@ -6,6 +6,8 @@ Hypothesis generates test cases automatically to find edge cases.
 Run tests with:
     uv add --dev hypothesis
     uv run pytest test_property_based.py -v
+    HYPOTHESIS_PROFILE=dev uv run pytest test_property_based.py      # quick
+    HYPOTHESIS_PROFILE=nightly uv run pytest test_property_based.py
 """
 
 import pytest
@@ -177,7 +179,9 @@ def test_max_is_max(lst):
 # 8. HYPOTHESIS SETTINGS
 # ============================================================================
 
-@settings(max_examples=1000)  # Run 1000 examples instead of default 100
+# Run 10x the examples of the active profile (see conftest.py):
+# 1000 by default, 200 in the quick "dev" profile, 20000 in "nightly"
+@settings(max_examples=10 * settings.default.max_examples)
 @given(st.integers(min_value=0, max_value=100))
 def test_with_custom_settings(n):
     """Test with custom Hypothesis settings"""
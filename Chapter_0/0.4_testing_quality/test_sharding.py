@@ -0,0 +1,61 @@
+"""
+Tests for the Sharding Plugin
+
+Each test runs pytest in a subprocess on a small throwaway suite, with
+sharding.py loaded the same way conftest.py loads it here.
+
+Run tests with:
+    uv run pytest test_sharding.py -v
+"""
+
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+HERE = Path(__file__).parent
+
+SUITE = '''
+import pytest
+
+def test_passes():
+    pass
+
+def test_fails():
+    assert 1 == 2
+
+def test_skipped():
+    pytest.skip("not ready")
+
+@pytest.mark.xfail(reason="known bug")
+def test_xfails():
+    assert False
+'''
+
+
+def run_pytest(tmp_path: Path, *args: str) -> subprocess.CompletedProcess:
+    """Run pytest with the sharding plugin on the SUITE above"""
+    (tmp_path / "conftest.py").write_text('pytest_plugins = ["sharding"]\n')
+    (tmp_path / "test_suite.py").write_text(textwrap.dedent(SUITE))
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([str(HERE), os.environ.get("PYTHONPATH", "")])}
+    return subprocess.run(
+        [sys.executable, "-m", "pytest", "-p", "no:cacheprovider", *args],
+        cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120
+    )
+
+
+@pytest.mark.slow
+def test_workers_report_like_a_normal_run(tmp_path):
+    """-ra summarises worker results (skips included) without an INTERNALERROR"""
+    result = run_pytest(tmp_path, "--workers", "2", "-ra")
+    output = result.stdout + result.stderr
+
+    assert "INTERNALERROR" not in output
+    assert result.returncode == pytest.ExitCode.TESTS_FAILED
+    assert "1 failed, 1 passed, 1 skipped, 1 xfailed" in output
+    assert "SKIPPED [1] test_suite.py:11: not ready" in output
+    assert "XFAIL test_suite.py::test_xfails - known bug" in output
+    assert "FAILED test_suite.py::test_fails - assert 1 == 2" in output